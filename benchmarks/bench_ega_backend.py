@@ -0,0 +1,87 @@
+"""
+Throughput of the EGA service layer against a local stand-in server.
+
+Registers and validates a number of sample objects through
+egasub.ega.services, once serially and then with the 'threaded' and
+'pipelined' submission backends. Then against a server throttling beyond
+--capacity concurrent requests, with fixed and with adaptive concurrency.
+
+    python benchmarks/bench_ega_backend.py --objects 500 --jobs 16 --latency 0.02 --capacity 6
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from egasub.ega.entities import Sample
+from egasub.ega.services import login, logout, prepare_submission, register_obj, validate_obj
+from egasub.ega.entities import Submission, SubmissionSubsetData
+from egasub.utils import run_parallel, run_pipelined
+from ega_stub import EgaStubServer
+
+
+class BenchContext(object):
+    def __init__(self, api_url, settings):
+        self.obj = {
+            'SETTINGS': dict(settings, apiUrl=api_url, ega_submitter_account='bench',
+                             ega_submitter_password='bench'),
+            'LOGGER': logging.getLogger('ega_submission')
+        }
+
+
+def make_sample(i):
+    return Sample('sample_%s' % i, None, None, 1, 1, None, None, None, 'phenotype',
+                  'donor_%s' % i, None, None, None, None, [], None)
+
+
+def run(name, server, objects, jobs, settings, runner):
+    ctx = BenchContext(server.url, settings)
+    ctx.obj['JOBS'] = jobs
+    login(ctx)
+    prepare_submission(ctx, Submission('title', 'bench', SubmissionSubsetData.create_empty()))
+
+    def process(sample):
+        register_obj(ctx, sample, 'sample')
+        validate_obj(ctx, sample, 'sample')
+
+    throttled = server.throttled
+    start = time.time()
+    runner(process, (make_sample(i) for i in xrange(objects)), jobs)
+    elapsed = time.time() - start
+    logout(ctx)
+
+    print '%-10s jobs=%-3s %6d objects in %6.2fs  %8.1f objects/s  %5d throttled' % \
+                (name, jobs, objects, elapsed, objects / elapsed, server.throttled - throttled)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=500)
+    parser.add_argument('--jobs', type=int, default=16)
+    parser.add_argument('--max-inflight', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--capacity', type=int, default=6)
+    args = parser.parse_args()
+
+    server = EgaStubServer(latency=args.latency).start()
+
+    run('serial', server, args.objects, 1, {}, run_parallel)
+    run('threaded', server, args.objects, args.jobs, {}, run_parallel)
+    run('pipelined', server, args.objects, args.jobs,
+        {'ega_max_inflight_requests': args.max_inflight}, run_pipelined)
+
+    server.shutdown()
+
+    server = EgaStubServer(latency=args.latency, capacity=args.capacity).start()
+
+    run('fixed', server, args.objects, args.jobs, {'ega_adaptive_concurrency': False, 'ega_retries': 20, 'ega_backoff': 0.05}, run_parallel)
+    run('adaptive', server, args.objects, args.jobs, {'ega_retries': 20, 'ega_backoff': 0.05}, run_parallel)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Time to load and index all EGA enums, from the JSON files and from the
+prebuilt snapshot (built first if missing).
+
+    python benchmarks/bench_enums.py --repeat 200
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from egasub.ega.entities.ega_enums import EgaEnums, ENUMS_DIR, SNAPSHOT_FILE, build_snapshot
+
+
+def load_all(snapshot_file, names):
+    ega_enums = EgaEnums(snapshot_file)
+    for name in names:
+        ega_enums.lookup(name)
+
+
+def bench(label, snapshot_file, names, repeat):
+    start = time.time()
+    for _ in xrange(repeat):
+        load_all(snapshot_file, names)
+    elapsed = (time.time() - start) / repeat
+    print '%-10s %8.2f ms per start' % (label, elapsed * 1000)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    if not os.path.isfile(SNAPSHOT_FILE):
+        build_snapshot()
+
+    names = [os.path.splitext(n)[0] for n in os.listdir(ENUMS_DIR) if n.endswith('.json')]
+
+    json_time = bench('json', None, names, args.repeat)
+    snapshot_time = bench('snapshot', SNAPSHOT_FILE, names, args.repeat)
+    print 'snapshot is %.1fx faster' % (json_time / snapshot_time)
+
+
+if __name__ == '__main__':
+    main()
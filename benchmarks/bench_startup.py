@@ -0,0 +1,114 @@
+"""
+Cold start time of the egasub CLI.
+
+Runs 'egasub --help' (and 'egasub status' from a scratch workspace) in fresh
+interpreters and reports the median wall-clock time, exiting with status 1
+when it is above the budget. With --profile, prints the slowest imports
+(a stand-in for 'python -X importtime', which Python 2 does not have).
+
+    python benchmarks/bench_startup.py --repeat 20 --budget-ms 250
+    python benchmarks/bench_startup.py --profile
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HEAVY_MODULES = ('requests', 'ftplib', 'sqlite3', 'multiprocessing')
+
+RUN_CLI = r"""
+import sys
+from egasub.cli import main
+try:
+    main(sys.argv[1:], standalone_mode=False)
+except SystemExit:
+    pass
+sys.stderr.write('\nloaded: ' + ' '.join(m for m in %r if m in sys.modules))
+""" % (HEAVY_MODULES,)
+
+
+def make_workspace():
+    workspace = tempfile.mkdtemp()
+    os.mkdir(os.path.join(workspace, '.egasub'))
+    with open(os.path.join(workspace, '.egasub', 'config.yaml'), 'w') as f:
+        f.write('ega_submitter_account: bench\n')
+    os.mkdir(os.path.join(workspace, 'unaligned.bench'))
+    return workspace
+
+
+def run_cli(args, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.time()
+    p = subprocess.Popen([sys.executable, '-c', RUN_CLI] + args, cwd=cwd, env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = p.communicate()
+    if not 'loaded:' in err:
+        raise RuntimeError(err)
+    loaded = err.rsplit('loaded:', 1)[-1].split()
+    return time.time() - start, loaded
+
+
+def bench(label, args, cwd, repeat):
+    times = []
+    for _ in xrange(repeat):
+        elapsed, loaded = run_cli(args, cwd)
+        times.append(elapsed)
+    median = sorted(times)[len(times) / 2] * 1000
+    print '%-16s median %7.1f ms   heavy modules loaded: %s' % (label, median, ' '.join(loaded) or 'none')
+    return median
+
+
+def profile():
+    import __builtin__
+    timings = {}
+    original_import = __builtin__.__import__
+
+    def timed_import(name, *args, **kwargs):
+        start = time.time()
+        try:
+            return original_import(name, *args, **kwargs)
+        finally:
+            if not name in timings:
+                timings[name] = time.time() - start
+
+    __builtin__.__import__ = timed_import
+    sys.path.insert(0, ROOT)
+    from egasub.cli import main
+    __builtin__.__import__ = original_import
+
+    print 'cumulative ms  module'
+    for name, elapsed in sorted(timings.items(), key=lambda t: -t[1])[:25]:
+        print '%13.2f  %s' % (elapsed * 1000, name)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=250)
+    parser.add_argument('--profile', action='store_true')
+    args = parser.parse_args()
+
+    if args.profile:
+        return profile()
+
+    workspace = make_workspace()
+    try:
+        medians = [
+            bench('egasub --help', ['--help'], ROOT, args.repeat),
+            bench('egasub status', ['status'], os.path.join(workspace, 'unaligned.bench'), args.repeat)
+        ]
+    finally:
+        shutil.rmtree(workspace)
+
+    if max(medians) > args.budget_ms:
+        print 'over the start-up budget of %s ms' % args.budget_ms
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
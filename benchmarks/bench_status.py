@@ -0,0 +1,75 @@
+"""
+Time of 'egasub status' over a workspace of many submission directories with
+.status logs, from the state store (first run imports the logs) and from the
+.status logs directly.
+
+    python benchmarks/bench_status.py --dirs 10000
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from egasub.submission.status import generate_report
+
+
+class BenchCtx(object):
+    def __init__(self, workspace, settings):
+        self.obj = {
+            'WORKSPACE_PATH': workspace,
+            'CURRENT_DIR': workspace,
+            'CURRENT_DIR_TYPE': None,
+            'SETTINGS': settings,
+            'LOGGER': logging.getLogger('ega_submission')
+        }
+
+
+def make_workspace(dirs):
+    workspace = tempfile.mkdtemp()
+    os.mkdir(os.path.join(workspace, '.egasub'))
+    batch_dir = os.path.join(workspace, 'unaligned.bench')
+    for i in xrange(dirs):
+        status_dir = os.path.join(batch_dir, 'sample_%s' % i, '.status')
+        os.makedirs(status_dir)
+        for obj_type in ('sample', 'experiment', 'run'):
+            with open(os.path.join(status_dir, '%s.log' % obj_type), 'w') as f:
+                f.write('EGA%s\tsample_%s\tVALIDATED\t1\n' % (i, i))
+                f.write('EGA%s\tsample_%s\t%s\t2\n' % (i, i, 'SUBMITTED' if i % 3 else 'VALIDATED'))
+    return workspace
+
+
+def bench(label, workspace, settings, jobs=1):
+    devnull = open(os.devnull, 'w')
+    stdout, sys.stdout = sys.stdout, devnull
+    start = time.time()
+    try:
+        generate_report(BenchCtx(workspace, settings), [], output_format='table', jobs=jobs)
+    finally:
+        sys.stdout = stdout
+    elapsed = time.time() - start
+    print '%-28s %8.1f ms' % (label, elapsed * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dirs', type=int, default=10000)
+    parser.add_argument('--jobs', type=int, default=8)
+    args = parser.parse_args()
+
+    workspace = make_workspace(args.dirs)
+    try:
+        bench('status logs', workspace, {'state_store': False})
+        bench('status logs, %s jobs' % args.jobs, workspace, {'state_store': False}, args.jobs)
+        bench('state store, first run', workspace, {})
+        bench('state store', workspace, {})
+    finally:
+        shutil.rmtree(workspace)
+
+
+if __name__ == '__main__':
+    main()
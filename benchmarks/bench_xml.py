@@ -0,0 +1,82 @@
+"""
+Memory and throughput of serializing XML drop-box documents.
+
+Serializes synthetic samples into a SAMPLE_SET document, once by building the
+whole element tree before writing it ('tree') and once with the streaming
+XmlBatchWriter, reading the request body back as it would be sent ('stream').
+Each size runs in a fresh interpreter, so the peak RSS reported is that of
+the run alone.
+
+    python benchmarks/bench_xml.py --sizes 1000,10000,100000
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+MODES = ('tree', 'stream')
+
+
+def make_sample(i):
+    from egasub.ega.entities import Sample, Attribute
+    return Sample('sample_%s' % i, 'Sample %s' % i, 'A synthetic sample', 1, 1, 'blood', None, 'Navarre',
+                  'phenotype', 'donor_%s' % i, None, None, 40, None,
+                  [Attribute('submitter_sample_id', 'SA%s' % i), Attribute('tissue', 'Primary tumour')], None)
+
+
+def run_tree(samples):
+    from egasub.ega.entities.xml_utils import ET
+    document = ET.Element('SAMPLE_SET')
+    for sample in samples:
+        document.append(sample.to_xml())
+    with tempfile.TemporaryFile() as f:
+        ET.ElementTree(document).write(f, encoding='UTF-8')
+        return f.tell()
+
+
+def run_stream(samples):
+    from egasub.ega.services.xml_dropbox import XmlBatchWriter, MultipartBody
+    with XmlBatchWriter() as batch:
+        for sample in samples:
+            batch.add('sample', sample)
+        body = MultipartBody([('SAMPLE', 'sample.xml', f) for _, f in batch.close()])
+        return sum(len(chunk) for chunk in iter(lambda: body.read(8192), ''))
+
+
+def child(mode, size):
+    run = run_tree if mode == 'tree' else run_stream
+    start = time.time()
+    written = run(make_sample(i) for i in xrange(size))
+    elapsed = time.time() - start
+    # ru_maxrss is in kilobytes on Linux
+    print elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, written
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for mode in args.modes.split(','):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', mode, str(size)])
+            elapsed, max_rss, written = output.split()
+            elapsed = float(elapsed)
+            print '%-7s %7d samples in %6.2fs  %8.0f samples/s  peak RSS %7.1f MB  %7.1f MB written' % \
+                    (mode, size, elapsed, size / elapsed, int(max_rss) / 1024.0, int(written) / 1024.0 / 1024)
+
+
+if __name__ == '__main__':
+    main()
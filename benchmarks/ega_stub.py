@@ -0,0 +1,107 @@
+"""
+Minimal local stand-in for the EGA submission REST API, used by the benchmarks.
+
+It answers login/logout, submission creation, object registration, validate/submit,
+queries and deletes with canned JSON after an artificial delay that mimics the
+network round trip to EGA. With a capacity, requests beyond that many in
+flight are answered with 429 Too Many Requests, like a throttling server.
+"""
+import re
+import json
+import time
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+
+def _response(result, code="200", message="OK"):
+    return json.dumps({"header": {"code": code, "userMessage": message}, "response": {"result": result}})
+
+
+class EgaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real service
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def _reply(self, body):
+        with self.server.lock:
+            self.server.inflight += 1
+            throttled = self.server.capacity and self.server.inflight > self.server.capacity
+        try:
+            if throttled:
+                with self.server.lock:
+                    self.server.throttled += 1
+                self._send(429, _response([], "429", "Too Many Requests"))
+                return
+            time.sleep(self.server.latency)
+            with self.server.lock:
+                self.server.requests += 1
+            self._send(200, body)
+        finally:
+            with self.server.lock:
+                self.server.inflight -= 1
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        return self.rfile.read(length) if length else ''
+
+    def _next_id(self):
+        with self.server.lock:
+            self.server.last_id += 1
+            return 'EGA%08d' % self.server.last_id
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith('/login'):
+            self._reply(_response([{"session": {"sessionToken": "stub-token"}}]))
+        elif re.search(r'/submissions/[^/]+/\w+$', self.path):
+            obj = json.loads(body) if body else {}
+            self._reply(_response([{"id": self._next_id(), "alias": obj.get('alias'), "status": "DRAFT"}]))
+        else:
+            self._reply(_response([{"id": self._next_id()}]))
+
+    def do_PUT(self):
+        self._read_body()
+        m = re.search(r'/\w+/([^/?]+)\?action=(\w+)', self.path)
+        status = {'VALIDATE': 'VALIDATED', 'SUBMIT': 'SUBMITTED'}.get(m.group(2) if m else '', 'DRAFT')
+        self._reply(_response([{"id": m.group(1) if m else None, "status": status}]))
+
+    def do_GET(self):
+        self._reply(_response([]))
+
+    def do_DELETE(self):
+        self._reply(_response([]))
+
+    def log_message(self, *args):
+        pass
+
+
+class EgaStubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.02, capacity=None):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), EgaStubHandler)
+        self.latency = latency
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.throttled = 0
+        self.requests = 0
+        self.last_id = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s/' % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
@@ -0,0 +1,154 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from multiprocessing import Pool, cpu_count
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def md5sum(path, chunk_size=CHUNK_SIZE):
+    """ md5 hex digest of a file, read in large chunks to keep the disk busy """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _md5sum_worker(path):
+    try:
+        return path, md5sum(path), None
+    except (IOError, OSError), err:
+        return path, None, str(err)
+
+
+def md5sums(paths, jobs=None, errors=None):
+    """
+    md5 hex digests of many files, returns {path: checksum}. Files are hashed
+    by a pool of 'jobs' processes, by default one per CPU.
+
+    A file that cannot be read raises IOError, or with an 'errors' dict given,
+    is left out and its error message put in errors[path].
+    """
+    paths = list(paths)
+    jobs = min(jobs or cpu_count(), len(paths))
+    if jobs <= 1:
+        results = map(_md5sum_worker, paths)
+    else:
+        pool = Pool(jobs)
+        try:
+            results = list(pool.imap_unordered(_md5sum_worker, paths))
+        finally:
+            pool.close()
+            pool.join()
+
+    checksums = {}
+    for path, checksum, error in results:
+        if error is None:
+            checksums[path] = checksum
+        elif errors is None:
+            raise IOError(error)
+        else:
+            errors[path] = error
+    return checksums
+
+
+def md5sum_file(data_file):
+    """ md5sum file holding the checksum of data_file """
+    return data_file + '.md5'
+
+
+def write_md5sum_file(data_file, checksum):
+    with open(md5sum_file(data_file), 'w') as f:
+        f.write("%s\n" % checksum)
+
+
+class ChecksumCache(object):
+    """
+    Persistent md5 cache keyed by file identity (path, size, mtime, inode), so
+    files that have not changed since they were last hashed are not read again.
+    A file moved to another path keeps its inode and mtime and is still found.
+    """
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_file, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute("""CREATE TABLE IF NOT EXISTS checksums (
+                                path TEXT PRIMARY KEY,
+                                device INTEGER,
+                                inode INTEGER,
+                                size INTEGER,
+                                mtime REAL,
+                                md5 TEXT,
+                                hashed_at INTEGER
+                            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS checksums_identity ON checksums (inode, device, size, mtime)")
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, path):
+        """ Cached md5 of the file at path, None if not hashed since it last changed """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._db.execute("""SELECT md5 FROM checksums WHERE path = ? AND
+                                        device = ? AND inode = ? AND size = ? AND mtime = ?""",
+                                   (path, st.st_dev, st.st_ino, st.st_size, st.st_mtime)).fetchone()
+            if row:
+                return row[0]
+
+            # the same file may have been hashed under another path before it was moved
+            row = self._db.execute("""SELECT md5 FROM checksums WHERE
+                                        inode = ? AND device = ? AND size = ? AND mtime = ?""",
+                                   (st.st_ino, st.st_dev, st.st_size, st.st_mtime)).fetchone()
+            if row:
+                self._put(path, st, row[0])
+                return row[0]
+
+    def put(self, path, md5):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            self._put(path, st, md5)
+
+    def _put(self, path, st, md5):
+        self._db.execute("DELETE FROM checksums WHERE inode = ? AND device = ? AND NOT path = ?",
+                         (st.st_ino, st.st_dev, path))
+        self._db.execute("INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (path, st.st_dev, st.st_ino, st.st_size, st.st_mtime, md5, int(time.time())))
+        self._db.commit()
+
+    def prune(self):
+        """ Remove entries of files that no longer exist or have changed, returns the number removed """
+        with self._lock:
+            stale = []
+            for path, device, inode, size, mtime in self._db.execute(
+                                        "SELECT path, device, inode, size, mtime FROM checksums"):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    stale.append(path)
+                    continue
+                if not (st.st_dev, st.st_ino, st.st_size, st.st_mtime) == (device, inode, size, mtime):
+                    stale.append(path)
+
+            self._db.executemany("DELETE FROM checksums WHERE path = ?", [(p,) for p in stale])
+            self._db.commit()
+            return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
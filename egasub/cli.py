@@ -2,8 +2,9 @@ import os
 import click
 import utils
 from click import echo
-from submission import init_workspace, perform_submission, init_submission_dir, generate_report, submit_dataset
-from egasub.ega.entities import EgaEnums
+
+# Subcommand implementations are imported inside the commands, so that commands
+# like 'new' or 'status' and '--help' do not load the HTTP and FTP stacks.
 
 
 @click.group()
@@ -22,8 +23,9 @@ def main(ctx, debug, info):
 
 @main.command()
 @click.argument('submission_dir', type=click.Path(exists=True), nargs=-1)
+@click.option('--jobs', '-j', default=1, type=click.IntRange(1, None), help='Number of submission directories processed in parallel.')
 @click.pass_context
-def submit(ctx, submission_dir):
+def submit(ctx, submission_dir, jobs):
     """
     Perform submission on submission folder(s).
     """
@@ -41,12 +43,14 @@ def submit(ctx, submission_dir):
         ctx.obj['LOGGER'].critical('You must specify at least one submission directory.')
         ctx.abort()
 
-    perform_submission(ctx, submission_dir, dry_run=False)
+    from submission.submit import perform_submission
+    perform_submission(ctx, submission_dir, dry_run=False, jobs=jobs)
 
 @main.command()
 @click.argument('submission_dir', type=click.Path(exists=True), nargs=-1)
+@click.option('--jobs', '-j', default=1, type=click.IntRange(1, None), help='Number of submission directories processed in parallel.')
 @click.pass_context
-def dry_run(ctx, submission_dir):
+def dry_run(ctx, submission_dir, jobs):
     """
     Test submission on submission folder(s).
     """
@@ -60,23 +64,87 @@ def dry_run(ctx, submission_dir):
         ctx.obj['LOGGER'].critical('You must specify at least one submission directory.')
         ctx.abort()
 
-    perform_submission(ctx, submission_dir, dry_run=True)
+    from submission.submit import perform_submission
+    perform_submission(ctx, submission_dir, dry_run=True, jobs=jobs)
+
+
+@main.command()
+@click.argument('submission_dir', type=click.Path(exists=True), nargs=-1)
+@click.option('--format', 'output_format', default='table', type=click.Choice(['table', 'json', 'tsv']), help='Output format.')
+@click.option('--summary', is_flag=True, help='Only report the number of submission folders per type and status.')
+@click.option('--jobs', '-j', default=1, type=click.IntRange(1, None), help='Number of submission directories read in parallel.')
+@click.pass_context
+def status(ctx, submission_dir, output_format, summary, jobs):
+    """
+    Report status of submission folder(s), by default all folders of the
+    current submission batch, or run in the workspace, of all batches.
+    """
+    if '.' in submission_dir or '..' in submission_dir:
+        ctx.obj['LOGGER'].critical("Submission dir can not be '.' or '..'")
+        ctx.abort()
+
+    utils.initialize_app(ctx, require_dir_type=False)
+
+    from submission.status import generate_report
+    generate_report(ctx, submission_dir, output_format, summary, jobs)
 
 
 @main.command()
 @click.argument('submission_dir', type=click.Path(exists=True), nargs=-1)
+@click.option('--verify', is_flag=True, help='Verify existing md5sum files instead of writing missing ones.')
+@click.option('--force', is_flag=True, help='Overwrite existing md5sum files and rehash files found in the checksum cache.')
+@click.option('--prune', is_flag=True, help='Remove entries of removed or changed files from the checksum cache.')
+@click.option('--jobs', '-j', default=None, type=click.IntRange(1, None), help='Number of files hashed in parallel, defaults to the number of CPUs.')
 @click.pass_context
-def status(ctx, submission_dir):
+def checksum(ctx, submission_dir, verify, force, prune, jobs):
     """
-    Report status of submission folder(s).
+    Write or verify md5sum files of submission folder(s).
     """
     if '.' in submission_dir or '..' in submission_dir:
         ctx.obj['LOGGER'].critical("Submission dir can not be '.' or '..'")
         ctx.abort()
 
+    from submission.checksum import perform_checksum, prune_checksum_cache
+
+    if prune:
+        if not ctx.obj['WORKSPACE_PATH']:
+            ctx.obj['LOGGER'].critical('Not in an EGA submission workspace! Please run "egasub init" to initiate an EGA workspace.')
+            ctx.abort()
+        prune_checksum_cache(ctx)
+        if not submission_dir:
+            return
+
     utils.initialize_app(ctx)
 
-    generate_report(ctx, submission_dir)
+    if not submission_dir:
+        ctx.obj['LOGGER'].critical('You must specify at least one submission directory.')
+        ctx.abort()
+
+    if perform_checksum(ctx, submission_dir, verify=verify, force=force, jobs=jobs):
+        ctx.abort()
+
+
+@main.command('icgc-ids')
+@click.argument('submission_dir', type=click.Path(exists=True), nargs=-1)
+@click.option('--jobs', '-j', default=4, type=click.IntRange(1, None), help='Number of concurrent requests to the ICGC ID service.')
+@click.pass_context
+def icgc_ids(ctx, submission_dir, jobs):
+    """
+    Obtain and cache ICGC IDs of submission folder(s) ahead of submission.
+    """
+    if '.' in submission_dir or '..' in submission_dir:
+        ctx.obj['LOGGER'].critical("Submission dir can not be '.' or '..'")
+        ctx.abort()
+
+    utils.initialize_app(ctx)
+
+    if not submission_dir:
+        ctx.obj['LOGGER'].critical('You must specify at least one submission directory.')
+        ctx.abort()
+
+    from submission.icgc_ids import perform_icgc_ids
+    if perform_icgc_ids(ctx, submission_dir, jobs=jobs):
+        ctx.abort()
 
 
 @main.command()
@@ -94,6 +162,9 @@ def init(ctx,ega_submitter_account,ega_submitter_password,icgc_id_service_token,
         ctx.obj['LOGGER'].critical('Already in an EGA submission workspace %s' % ctx.obj['WORKSPACE_PATH'])
         ctx.abort()
 
+    from egasub.ega.entities import EgaEnums
+    from submission.init import init_workspace
+
     ctx.obj['EGA_ENUMS'] = EgaEnums()
     init_workspace(ctx,ega_submitter_account,ega_submitter_password,icgc_id_service_token,icgc_project_code )
     
@@ -112,6 +183,7 @@ def new(ctx,submission_dir):
 
     utils.initialize_app(ctx)
     
+    from submission.init_submission_dir import init_submission_dir
     init_submission_dir(ctx, submission_dir)
     
 @main.command()
@@ -123,6 +195,8 @@ def dataset(ctx,submit,dry_run):
     Submit or test a dataset submissoin.
     """
     utils.initialize_app(ctx)
+
+    from submission.submit import submit_dataset
     
     if submit:
         submit_dataset(ctx, dry_run=False)
@@ -3,6 +3,15 @@ from file import File
 from sample_reference import SampleReference
 from attribute import Attribute
 from chromosome_reference import ChromosomeReference
+from xml_utils import sub_element, reference, attributes, enum_value, analysis_file_type
+
+
+# SRA analysis type elements by EGA analysis type
+ANALYSIS_TYPE_ELEMENTS = {
+    'Reference Alignment (BAM)': 'REFERENCE_ALIGNMENT',
+    'Sequence variation (VCF)': 'SEQUENCE_VARIATION',
+    'Sample Phenotype': 'SAMPLE_PHENOTYPE'
+}
 
 class Analysis(object):
     def __init__(self, alias, title, description, study_id, sample_references, analysis_center, analysis_date,
@@ -43,8 +52,34 @@ class Analysis(object):
             'status': self.status
             }
 
-    def to_xml(self):
-        pass
+    def to_xml(self, enums=None):
+        element = sub_element(None, 'ANALYSIS', alias=self.alias, accession=self.id,
+                              center_name=self.analysis_center, analysis_date=self.analysis_date)
+        sub_element(element, 'TITLE', self.title)
+        sub_element(element, 'DESCRIPTION', self.description or '')
+        reference(element, 'STUDY_REF', self.study_id)
+        for ref in self.sample_references:
+            element.append(ref.to_xml())
+
+        analysis_type = sub_element(element, 'ANALYSIS_TYPE')
+        type_element = sub_element(analysis_type, ANALYSIS_TYPE_ELEMENTS.get(
+                                        enum_value(enums, 'analysis_types', self.analysis_type_id), 'REFERENCE_ALIGNMENT'))
+        if not type_element.tag == 'SAMPLE_PHENOTYPE':
+            assembly = sub_element(type_element, 'ASSEMBLY')
+            sub_element(assembly, 'STANDARD', refname=enum_value(enums, 'reference_genomes', self.genome_id))
+            for ref in self.chromosome_references:
+                type_element.append(ref.to_xml(enums))
+        if type_element.tag == 'SEQUENCE_VARIATION':
+            for experiment_type in self.experiment_type_id or []:
+                sub_element(type_element, 'EXPERIMENT_TYPE', enum_value(enums, 'experiment_types', experiment_type))
+
+        files = sub_element(element, 'FILES')
+        for f in self.files:
+            files.append(f.to_xml(analysis_file_type(f.file_name)))
+
+        attributes(element, 'ANALYSIS_ATTRIBUTE',
+                   ([Attribute('platform', self.platform)] if self.platform else []) + list(self.attributes or []))
+        return element
     
     @staticmethod
     def from_dict(analysis_dict):
@@ -1,4 +1,5 @@
 import yaml
+from xml_utils import ET, sub_element
 
 class Attribute(object):
     def __init__(self, tag, value="", unit=None):
@@ -15,11 +16,13 @@ class Attribute(object):
         }
 
 
-    def to_xml(self):
-        xml_string = "<TAG>%s</TAG>\n<VALUE>%s</VALUE>\n" % (self.tag, self.value)
+    def to_xml(self, tag='SAMPLE_ATTRIBUTE'):
+        element = ET.Element(tag)
+        sub_element(element, 'TAG', self.tag)
+        sub_element(element, 'VALUE', self.value)
         if self.unit is not None:
-            xml_string += "<UNIT>%s</UNIT>\n" % (self.unit)
-        return xml_string
+            sub_element(element, 'UNIT', self.unit)
+        return element
 
     
     @staticmethod
@@ -1,3 +1,5 @@
+from xml_utils import sub_element, enum_value
+
 
 class ChromosomeReference(object):
     def __init__(self,value,label=None):
@@ -10,5 +12,6 @@ class ChromosomeReference(object):
             'label' : self.label
             }
         
-    def to_xml(self):
-        pass
\ No newline at end of file
+    def to_xml(self, enums=None):
+        return sub_element(None, 'SEQUENCE', accession=enum_value(enums, 'reference_chromosomes', self.value),
+                           label=self.label)
\ No newline at end of file
@@ -1,3 +1,5 @@
+from xml_utils import sub_element, reference, attributes, enum_value
+
 
 class Dataset(object):
     
@@ -26,5 +28,19 @@ class Dataset(object):
         }
 
         
-    def to_xml(self):
-        pass
\ No newline at end of file
+    def to_xml(self, enums=None):
+        element = sub_element(None, 'DATASET', alias=self.alias)
+        sub_element(element, 'TITLE', self.title)
+        for dataset_type_id in self.dataset_type_ids or []:
+            sub_element(element, 'DATASET_TYPE', enum_value(enums, 'dataset_types', dataset_type_id))
+        for run in self.runs_references or []:
+            reference(element, 'RUN_REF', run)
+        for analysis in self.analysis_references or []:
+            reference(element, 'ANALYSIS_REF', analysis)
+        reference(element, 'POLICY_REF', self.policy_id)
+        if self.dataset_links:
+            links = sub_element(element, 'DATASET_LINKS')
+            for link in self.dataset_links:
+                links.append(link.to_xml())
+        attributes(element, 'DATASET_ATTRIBUTE', self.attributes or [])
+        return element
\ No newline at end of file
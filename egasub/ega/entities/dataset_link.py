@@ -1,3 +1,5 @@
+from xml_utils import sub_element
+
 
 class DatasetLink(object):
     def __init__(self,label,url):
@@ -11,5 +13,9 @@ class DatasetLink(object):
             }
         
     def to_xml(self):
-        pass
+        element = sub_element(None, 'DATASET_LINK')
+        url_link = sub_element(element, 'URL_LINK')
+        sub_element(url_link, 'LABEL', self.label)
+        sub_element(url_link, 'URL', self.url)
+        return element
     
\ No newline at end of file
@@ -1,21 +1,103 @@
-
-import requests
 import json
 import os
+import zlib
+import marshal
+import threading
+
+
+ENUMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'enums')
+
+# all enums parsed and indexed, written by 'python setup.py build_enums' and on install
+SNAPSHOT_FILE = os.path.join(ENUMS_DIR, '..', 'enums.snapshot')
+
 
 class EgaEnums(object):
-    def __init__(self):
-        self._enums = self._load_enums()
-        
-    def _load_enums(self):
-        enums = {}
-        full_path = os.path.dirname(os.path.abspath(__file__))+"/../data/enums/"
-        for file in  os.listdir(full_path):
-            file_path = full_path+file
-            if file_path.endswith(".json"):
-                with open(file_path) as data_file:
-                    enums[os.path.splitext(file)[0]] = json.load(data_file)
-        return enums
-    
+    """
+    EGA enumerations (genders, file types, instrument models, ...) shipped in
+    ega/data/enums. An enum file is only loaded the first time it is used, it is
+    then indexed by tag and by value so that lookups do not scan the enum.
+
+    Enums are taken from the prebuilt snapshot when there is one, an enum whose
+    JSON file changed since the snapshot was built is parsed from the JSON.
+    """
+    def __init__(self, snapshot_file=SNAPSHOT_FILE):
+        self._enums = {}
+        self._lock = threading.Lock()
+        self._snapshot_file = snapshot_file
+        self._snapshot = None
+
+    def _enum(self, field):
+        enum = self._enums.get(field)
+        if enum is None:
+            with self._lock:
+                if not field in self._enums:
+                    self._enums[field] = self._load_enum(field)
+                enum = self._enums[field]
+        return enum
+
+    def _load_enum(self, field):
+        enum_file = os.path.join(ENUMS_DIR, '%s.json' % field)
+        if not os.path.isfile(enum_file):
+            raise KeyError(field)
+
+        with open(enum_file, 'rb') as data_file:
+            data = data_file.read()
+
+        if self._snapshot is None:
+            self._snapshot = _load_snapshot(self._snapshot_file)
+
+        enum = self._snapshot.get(field)
+        if enum and enum['signature'] == _signature(data):
+            return enum
+
+        return _index(json.loads(data)['response']['result'])
+
     def lookup(self, field):
-        return self._enums[field]['response']['result']
\ No newline at end of file
+        return self._enum(field)['result']
+
+    def has_tag(self, field, tag):
+        return str(tag) in self._enum(field)['values']
+
+    def value_of(self, field, tag):
+        return self._enum(field)['values'].get(str(tag))
+
+    def tag_of(self, field, value):
+        return self._enum(field)['tags'].get(value)
+
+
+def _index(result):
+    return {
+        'result': result,
+        'values': dict((e['tag'], e['value']) for e in result),
+        'tags': dict((e['value'], e['tag']) for e in result)
+    }
+
+
+def _signature(data):
+    return (len(data), zlib.crc32(data))
+
+
+def _load_snapshot(snapshot_file):
+    if not snapshot_file:
+        return {}
+    try:
+        with open(snapshot_file, 'rb') as f:
+            return marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return {}
+
+
+def build_snapshot(enums_dir=ENUMS_DIR, snapshot_file=SNAPSHOT_FILE):
+    """ Parse and index all enum JSON files into one marshal file """
+    enums = {}
+    for name in sorted(os.listdir(enums_dir)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(enums_dir, name), 'rb') as data_file:
+            data = data_file.read()
+        enum = _index(json.loads(data)['response']['result'])
+        enum['signature'] = _signature(data)
+        enums[os.path.splitext(name)[0]] = enum
+
+    with open(snapshot_file, 'wb') as f:
+        marshal.dump(enums, f, 2)
@@ -1,4 +1,5 @@
 import yaml
+from .xml_utils import sub_element, reference, enum_value, platform_of
 
 class Experiment(object):
     def __init__(self, alias, title, instrument_model_id, library_source_id, library_selection_id,
@@ -44,8 +45,32 @@ class Experiment(object):
             }
 
 
-    def to_xml(self):
-        pass
+    def to_xml(self, enums=None):
+        element = sub_element(None, 'EXPERIMENT', alias=self.alias, accession=self.id)
+        sub_element(element, 'TITLE', self.title)
+        reference(element, 'STUDY_REF', self.study_id)
+
+        design = sub_element(element, 'DESIGN')
+        sub_element(design, 'DESIGN_DESCRIPTION', self.design_description or '')
+        reference(design, 'SAMPLE_DESCRIPTOR', self.sample_id)
+        library = sub_element(design, 'LIBRARY_DESCRIPTOR')
+        if self.library_name:
+            sub_element(library, 'LIBRARY_NAME', self.library_name)
+        sub_element(library, 'LIBRARY_STRATEGY', enum_value(enums, 'library_strategies', self.library_strategy_id))
+        sub_element(library, 'LIBRARY_SOURCE', enum_value(enums, 'library_sources', self.library_source_id))
+        sub_element(library, 'LIBRARY_SELECTION', enum_value(enums, 'library_selections', self.library_selection_id))
+        layout = sub_element(library, 'LIBRARY_LAYOUT')
+        if enum_value(enums, 'library_layouts', self.library_layout_id) in ('SINGLE', '1', 1):
+            sub_element(layout, 'SINGLE')
+        else:
+            sub_element(layout, 'PAIRED', NOMINAL_LENGTH=self.paired_nominal_length, NOMINAL_SDEV=self.paired_nominal_sdev)
+        if self.library_construction_protocol:
+            sub_element(library, 'LIBRARY_CONSTRUCTION_PROTOCOL', self.library_construction_protocol)
+
+        platform = sub_element(element, 'PLATFORM')
+        instrument = sub_element(platform, platform_of(enums, self.instrument_model_id))
+        sub_element(instrument, 'INSTRUMENT_MODEL', enum_value(enums, 'instrument_models', self.instrument_model_id))
+        return element
 
 
     @staticmethod
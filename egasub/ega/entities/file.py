@@ -1,5 +1,6 @@
 import yaml
 import os
+from xml_utils import ET, unicode_text
 
 class File(object):
     def __init__(self,file_id,file_name,checksum,unencrypted_checksum,checksum_method):
@@ -18,8 +19,14 @@ class File(object):
             'checksumMethod' : self.checksum_method
         }
     
-    def to_xml(self):
-        pass
+    def to_xml(self, filetype=None):
+        element = ET.Element('FILE')
+        for name, value in (('filename', self.file_name), ('filetype', filetype),
+                            ('checksum_method', self.checksum_method or 'MD5'),
+                            ('checksum', self.checksum), ('unencrypted_checksum', self.unencrypted_checksum)):
+            if value is not None:
+                element.set(name, unicode_text(value))
+        return element
 
     @staticmethod
     def from_dict(file_dict):
@@ -1,5 +1,6 @@
 import yaml
 from file import File
+from xml_utils import sub_element, reference, enum_value, RUN_FILE_TYPES
 
 class Run(object):
     def __init__(self,alias,sample_id,run_file_type_id,experiment_id,files,id, status=None):
@@ -24,8 +25,14 @@ class Run(object):
             }
 
 
-    def to_xml(self):
-        pass
+    def to_xml(self, enums=None):
+        element = sub_element(None, 'RUN', alias=self.alias, accession=self.id)
+        reference(element, 'EXPERIMENT_REF', self.experiment_id)
+        files = sub_element(sub_element(element, 'DATA_BLOCK'), 'FILES')
+        filetype = RUN_FILE_TYPES.get(enum_value(enums, 'file_types', self.run_file_type_id))
+        for f in self.files:
+            files.append(f.to_xml(filetype))
+        return element
 
 
     @staticmethod
@@ -1,5 +1,9 @@
 import yaml
 from .attribute import Attribute
+from .xml_utils import sub_element, attributes, enum_value
+
+
+HUMAN_TAXON_ID = 9606
 
 
 class Sample(object):
@@ -47,8 +51,29 @@ class Sample(object):
             }
 
 
-    def to_xml(self):
-        pass
+    def to_xml(self, enums=None):
+        element = sub_element(None, 'SAMPLE', alias=self.alias, accession=self.id)
+        sub_element(element, 'TITLE', self.title)
+        sample_name = sub_element(element, 'SAMPLE_NAME')
+        sub_element(sample_name, 'TAXON_ID', HUMAN_TAXON_ID)
+        if self.description:
+            sub_element(element, 'DESCRIPTION', self.description)
+
+        attrs = [
+            Attribute('gender', enum_value(enums, 'genders', self.gender_id)),
+            Attribute('case_or_control', enum_value(enums, 'case_control', self.case_or_control_id)),
+            Attribute('phenotype', self.phenotype),
+            Attribute('subject_id', self.subject_id),
+            Attribute('organism_part', self.organism_part),
+            Attribute('cell_line', self.cell_line),
+            Attribute('region', self.region),
+            Attribute('anonymized_name', self.anonymized_name),
+            Attribute('bio_sample_id', self.bio_sample_id),
+            Attribute('sample_age', self.sample_age),
+            Attribute('sample_detail', self.sample_detail)
+        ]
+        attributes(element, 'SAMPLE_ATTRIBUTE', attrs + list(self.attributes or []))
+        return element
 
 
     @staticmethod
@@ -1,4 +1,5 @@
 import yaml
+from xml_utils import reference
 
 
 class SampleReference(object):
@@ -13,5 +14,5 @@ class SampleReference(object):
             }
         
     def to_xml(self):
-        pass
+        return reference(None, 'SAMPLE_REF', self.value, self.label)
 
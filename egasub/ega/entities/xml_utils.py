@@ -0,0 +1,97 @@
+import re
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+
+# EGA and ENA accessions, objects not submitted yet are referred to by alias instead
+ACCESSION_PATTERN = re.compile(r'^(EGA|ER|SR|DR)[A-Z]\d+$')
+
+# SRA file types of run files by EGA file type
+RUN_FILE_TYPES = {
+    'BAM': 'bam',
+    'CRAM': 'cram',
+    'Complete Genomics': 'CompleteGenomics_native',
+    'Fasta': 'fasta',
+    'One Fastq file (Single)': 'fastq',
+    'Two Fastq files (Paired)': 'fastq',
+    'PacBio HDF5': 'PacBio_HDF5',
+    'SFF': 'sff',
+    'SRF': 'srf'
+}
+
+# SRA file types of analysis files by file extension
+ANALYSIS_FILE_TYPES = {
+    'bam': 'bam',
+    'bai': 'bai',
+    'cram': 'cram',
+    'crai': 'crai',
+    'vcf': 'vcf',
+    'tbi': 'tabix',
+    'bed': 'bed',
+    'txt': 'other'
+}
+
+
+def sub_element(parent, tag, text=None, **attrib):
+    """ Add a child element, or without parent create one, None text and attributes are left out """
+    attrib = dict((k, unicode_text(v)) for k, v in attrib.items() if v is not None)
+    element = ET.Element(tag, attrib) if parent is None else ET.SubElement(parent, tag, attrib)
+    if text is not None:
+        element.text = unicode_text(text)
+    return element
+
+
+def unicode_text(value):
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+def reference(parent, tag, value, label=None):
+    """ Reference to another object, by accession once it has one, otherwise by alias """
+    if value is None:
+        return None
+    if ACCESSION_PATTERN.match(str(value)):
+        return sub_element(parent, tag, accession=value, label=label)
+    return sub_element(parent, tag, refname=value, label=label)
+
+
+def attributes(parent, tag, attrs):
+    """ <TAG>S with one <TAG> per Attribute, nothing when there are none """
+    attrs = [a for a in attrs if a.value is not None]
+    if attrs:
+        container = sub_element(parent, '%sS' % tag)
+        for attr in attrs:
+            container.append(attr.to_xml(tag))
+
+
+def enum_value(enums, field, tag):
+    """ EGA enum value of tag, or tag itself without enums to look it up """
+    if enums is None or tag is None:
+        return tag
+    value = enums.value_of(field, tag)
+    return value if value is not None else tag
+
+
+def platform_of(enums, instrument_model_id):
+    """ SRA platform of an instrument model, e.g. ILLUMINA for the 'ILLUMINA Models' """
+    if enums is None:
+        return 'ILLUMINA'
+    for model in enums.lookup('instrument_models'):
+        if model['tag'] == str(instrument_model_id) and model.get('label'):
+            return model['label'].replace(' Models', '').replace(' ', '_')
+    return 'ILLUMINA'
+
+
+def analysis_file_type(file_name):
+    """ SRA file type of an analysis file by its extension, encryption and compression suffixes aside """
+    parts = [p.lower() for p in (file_name or '').split('.')[1:]]
+    while parts and parts[-1] in ('gpg', 'gz', 'bgz'):
+        parts.pop()
+    return ANALYSIS_FILE_TYPES.get(parts[-1], 'other') if parts else 'other'
+
@@ -1,10 +1,12 @@
-import requests
 import json
 from ..entities import sample
 from ..entities import analysis
 from egasub.exceptions import CredentialsError
 import os
 from egasub.icgc.services import id_service
+from egasub.utils import run_parallel
+from .session import get_session, TokenCache
+from .alias_index import AliasIndex, EGA_OBJECT_STATUSES
 
 
 XML_EGA_SUB_URL_TEST = "https://www-test.ebi.ac.uk/ena/submit/drop-box/submit/"
@@ -16,6 +18,10 @@ EGA_SUB_URL_PROD = "https://ega.crg.eu/submitterportal/v1/"
 EGA_ACCESS_URL = "https://ega.ebi.ac.uk/ega/rest/access/v2/"
 EGA_DOWNLOAD_URL = "http://ega.ebi.ac.uk/ega/rest/download/v2/"
 
+# object types listed in a submission subset, as '<type>_ids'
+SUBSET_OBJECT_TYPES = ('analysis', 'dac', 'dataset', 'experiment', 'policy', 'run', 'sample', 'study')
+
+
 def api_url(ctx):
     if 'apiUrl' in ctx.obj['SETTINGS']:
         api_url = ctx.obj['SETTINGS']['apiUrl']
@@ -29,8 +35,6 @@ def login(ctx):
     Documentation: https://ega-archive.org/submission/programmatic_submissions/how-to-use-the-api#Login
     """
         
-    url = "%slogin" % api_url(ctx)
-    
     #Check for the ega_submitter account
     if not ctx.obj['SETTINGS'].get('ega_submitter_account'):
         raise CredentialsError(Exception("Your 'ega_submitter_account' is missing."))
@@ -39,21 +43,55 @@ def login(ctx):
     if not ctx.obj['SETTINGS'].get('ega_submitter_password'):
         raise CredentialsError(Exception("Your 'ega_submitter_password' is missing."))
     
+    # calls rejected for an expired token log in again and are retried
+    get_session(ctx).relogin = lambda: _refresh_session_token(ctx)
+
+    token_cache = _token_cache(ctx)
+    if token_cache:
+        cached = token_cache.get(ctx.obj['SETTINGS']['ega_submitter_account'], api_url(ctx))
+        if cached and _session_valid(ctx, cached):
+            ctx.obj['LOGGER'].debug("Reusing cached session token")
+            ctx.obj['SUBMISSION'] = cached
+            get_session(ctx).token = cached['sessionToken']
+            return
+
+    ctx.obj['SUBMISSION'] = {}
+    ctx.obj['SUBMISSION']['sessionToken'] = _new_session_token(ctx)
+    get_session(ctx).token = ctx.obj['SUBMISSION']['sessionToken']
+    if token_cache:
+        token_cache.put(ctx.obj['SETTINGS']['ega_submitter_account'], api_url(ctx), ctx.obj['SUBMISSION'])
+
+
+def _new_session_token(ctx):
+    url = "%slogin" % api_url(ctx)
+
     payload = {
         "username": ctx.obj['SETTINGS'].get('ega_submitter_account'),
         "password": ctx.obj['SETTINGS'].get('ega_submitter_password'),
         "loginType": "submitter"
     }
 
-    r = requests.post(url, data=payload)
+    # login takes a form encoded payload, drop the session's JSON content type and any old token
+    r = get_session(ctx).post(url, data=payload, headers={'Content-Type': None, 'X-Token': None})
     r_data = json.loads(r.text)
     
     #Check if the credentials are accepted
     if r_data["header"]['code'] != '200':
         raise CredentialsError(Exception('Your credentials are invalid. Verify your EGA submitter username and password.'))
 
-    ctx.obj['SUBMISSION'] = {}
-    ctx.obj['SUBMISSION']['sessionToken'] = r_data['response']['result'][0]['session']['sessionToken']
+    return r_data['response']['result'][0]['session']['sessionToken']
+
+
+def _refresh_session_token(ctx):
+    """ Replace the expired session token of a running submission, keeping its submission id """
+    ctx.obj['LOGGER'].info("Session token expired, login again ...")
+    token = _new_session_token(ctx)
+    ctx.obj['SUBMISSION']['sessionToken'] = token
+    get_session(ctx).token = token
+
+    token_cache = _token_cache(ctx)
+    if token_cache:
+        token_cache.put(ctx.obj['SETTINGS']['ega_submitter_account'], api_url(ctx), ctx.obj['SUBMISSION'])
 
 
 def logout(ctx):
@@ -61,36 +99,115 @@ def logout(ctx):
         
     url = "%slogout" % api_url(ctx)
     
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token': ctx.obj['SUBMISSION']['sessionToken']
-        }
-    r = requests.delete(url,headers=headers)
+    # no point in logging in again only to log out
+    get_session(ctx).relogin = None
+
+    # a cached token is kept alive on EGA side for the next run
+    if not _token_cache(ctx):
+        r = get_session(ctx).delete(url)
     ctx.obj['SUBMISSION'].clear()
+    get_session(ctx).token = None
 
 
-def prepare_submission(ctx, submission):
-    """ This function checks if the submission has an ega id and requests one if not """
+def prepare_submission(ctx, submission, fresh=False):
+    """
+    This function checks if the submission has an ega id and requests one if not,
+    with fresh, a new one is requested even for a submission id reused from the session cache
+    """
     
-    if 'id' in ctx.obj['SUBMISSION']:
+    if 'id' in ctx.obj['SUBMISSION'] and not fresh:
         return
     
     url = "%ssubmissions" % api_url(ctx)
 
     
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
-    r = requests.post(url,data=json.dumps(submission.to_dict()), headers=headers)
+    r = get_session(ctx).post(url,data=json.dumps(submission.to_dict()))
     r_data = json.loads(r.text)
     
     ctx.obj['SUBMISSION']['id'] = r_data['response']['result'][0]['id']
 
+    token_cache = _token_cache(ctx)
+    if token_cache:
+        token_cache.put(ctx.obj['SETTINGS']['ega_submitter_account'], api_url(ctx), ctx.obj['SUBMISSION'])
+
+
+def _token_cache(ctx):
+    """ Workspace session token cache, None unless enabled by the 'session_cache' setting """
+    if not (ctx.obj['SETTINGS'].get('session_cache') and ctx.obj.get('WORKSPACE_PATH')):
+        return None
+    return TokenCache(os.path.join(ctx.obj['WORKSPACE_PATH'], '.egasub', 'session.json'),
+                      ctx.obj['SETTINGS'].get('session_cache_ttl', 3600))
+
+
+def _session_valid(ctx, submission):
+    """ Cheap check that EGA still accepts a cached token by fetching its submission """
+    if not submission.get('sessionToken') or not submission.get('id'):
+        return False
 
-def object_submission(ctx, obj, obj_type, dry_run=True):
+    url = "%ssubmissions/%s" % (api_url(ctx), submission['id'])
+    r = get_session(ctx).get(url, headers={'X-Token': submission['sessionToken']})
+    try:
+        return r.status_code == 200 and json.loads(r.text)['header']['code'] == '200'
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def prefetch_aliases(ctx, obj_types, page_size=500, jobs=1):
+    """
+    Load aliases of all existing objects of the given types into an AliasIndex
+    kept in ctx.obj['ALIAS_INDEX'], object_submission then looks up existing
+    objects there instead of querying EGA once per object.
+    """
+    queries = [(obj_type, obj_status) for obj_type in obj_types for obj_status in EGA_OBJECT_STATUSES]
+    results = run_parallel(lambda q: query_all_by_type(ctx, q[0], q[1], page_size), queries, jobs)
+
+    index = AliasIndex()
+    for (obj_type, _), objects in zip(queries, results):
+        index.load(obj_type, objects)
+
+    ctx.obj['ALIAS_INDEX'] = index
+    return index
+
+
+def _existing_objects(ctx, obj_type, alias):
+    index = ctx.obj.get('ALIAS_INDEX')
+    if index and index.covers(obj_type):
+        return index.lookup(obj_type, alias)
+    return query_by_id(ctx, obj_type, alias, 'ALIAS')
+
+
+def submitted_object(ctx, obj_type, obj):
+    """
+    EGA record, with 'id', 'status' and 'egaAccessionId', of the submitted object
+    with the alias of obj, the one with the id of obj first. None when there is none.
+    """
+    if not obj.alias:
+        return None
+    records = [o for o in _existing_objects(ctx, obj_type, obj.alias) if o.get('status') == 'SUBMITTED']
+    records.sort(key=lambda o: not (obj.id and o.get('id') == obj.id))
+    return records[0] if records else None
+
+
+def object_submission(ctx, obj, obj_type, dry_run=True, deletions=None):
+    """
+    Register and validate, or submit, obj unless an object with its alias has
+    been submitted already. Other existing objects with the alias are deleted,
+    or with a 'deletions' list given, appended to it as (obj_type, id) to be
+    deleted later.
+    """
+    if object_registration(ctx, obj, obj_type, deletions):
+        object_completion(ctx, obj, obj_type, dry_run)
+    return obj
+
+
+def object_registration(ctx, obj, obj_type, deletions=None):
+    """
+    First half of object_submission(), gives obj an id. Returns True when obj
+    has been registered and still needs object_completion(), False when an
+    object with its alias has been submitted already.
+    """
     if obj.alias:  # only lookup for existing object when alias is available
-        existing_objects = query_by_id(ctx, obj_type, obj.alias, 'ALIAS')
+        existing_objects = _existing_objects(ctx, obj_type, obj.alias)
         for o in existing_objects:
             if o.get('status') == 'SUBMITTED':
                 if not obj.id == o.get('id'):
@@ -101,15 +218,22 @@ def object_submission(ctx, obj, obj_type, dry_run=True):
             else:
                 ctx.obj['LOGGER'].debug("%s with alias '%s' already exists in '%s' status, deleting it." \
                                          % (obj_type, obj.alias, o.get('status')))
-                delete_obj(ctx, obj_type, o.get('id'))
+                if deletions is None:
+                    delete_obj(ctx, obj_type, o.get('id'))
+                else:
+                    deletions.append((obj_type, o.get('id')))
         if obj.id:
-            return obj
+            return False
 
     try:
         register_obj(ctx, obj, obj_type)
     except Exception, err:
         raise Exception("Error occurred while creating '%s': \n%s" % (obj_type, err))
+    return True
+
 
+def object_completion(ctx, obj, obj_type, dry_run=True):
+    """ Second half of object_submission(), validates or submits a registered obj """
     if dry_run:
         try:
             validate_obj(ctx, obj, obj_type)
@@ -121,8 +245,6 @@ def object_submission(ctx, obj, obj_type, dry_run=True):
         except Exception, err:
             raise Exception("Error occurred while submitting '%s': \n%s" % (obj_type, err))
 
-    return obj
-
 
 def register_obj(ctx, obj, obj_type):
     ctx.obj['LOGGER'].info("Registering '%s' ..." % obj_type)
@@ -132,20 +254,18 @@ def register_obj(ctx, obj, obj_type):
                                         ctx.obj['SUBMISSION']['id'],
                                         _obj_type_to_endpoint(obj_type)
                                     )
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
 
     ctx.obj['LOGGER'].debug("Registering '%s': \n%s" % (obj_type, json.dumps(obj.to_dict()))) # for debug
-    r = requests.post(url,data=json.dumps(obj.to_dict()), headers=headers)
+    r = get_session(ctx).post(url,data=json.dumps(obj.to_dict()))
     ctx.obj['LOGGER'].debug("Response after registering: \n%s" % r.text)  # for debug
     r_data = json.loads(r.text)
 
     if r_data['header']['code'] == "200":
         obj.id = r_data['response']['result'][0]['id']
         obj.alias = r_data['response']['result'][0]['alias']
+        if ctx.obj.get('ALIAS_INDEX'):
+            ctx.obj['ALIAS_INDEX'].add(obj_type, obj.alias, obj.id,
+                                        r_data['response']['result'][0].get('status', 'DRAFT'))
     else:
         raise Exception(r_data['header']['userMessage'])
 
@@ -174,11 +294,8 @@ def _validate_submit_obj(ctx, obj, obj_type, op_type):
                                         op_type.upper()
                                     )
 
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
-    r = requests.put(url,headers=headers)
+    # validating can be repeated safely, submitting is not retried
+    r = get_session(ctx).put(url, idempotent=(op_type == 'validate'))
     ctx.obj['LOGGER'].debug("Response after '%s': \n%s" % (op_type, r.text))  # for debug
     r_data = json.loads(r.text)
 
@@ -198,6 +315,8 @@ def _validate_submit_obj(ctx, obj, obj_type, op_type):
         ctx.obj['LOGGER'].warning("Validation exception ('sample not found' error will disappear when perform 'submit' instead of 'dry_run'): \n%s" % '\n'.join(errors))
 
     obj.status = r_data.get('response').get('result')[0].get('status')
+    if ctx.obj.get('ALIAS_INDEX'):
+        ctx.obj['ALIAS_INDEX'].update_status(obj_type, obj.id, obj.status)
 
     ctx.obj['LOGGER'].info("%s '%s' completed." % (op_type.capitalize(), obj_type))
 
@@ -209,12 +328,7 @@ def update_obj(ctx, obj, obj_type):
                                         obj.id
                                     )
 
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
-
-    r = requests.put(url, headers=headers, data=json.dumps(obj.to_dict()))
+    r = get_session(ctx).put(url, data=json.dumps(obj.to_dict()))
     ctx.obj['LOGGER'].debug("Response after updating: \n%s" % r.text)  # for debug
     r_data = json.loads(r.text)
 
@@ -243,12 +357,7 @@ def _obj_type_to_endpoint(obj_type):
 def query_by_id(ctx, obj_type, obj_id, id_type):
     url = "%s%s/%s?idType=%s&skip=0&limit=0" % (api_url(ctx), _obj_type_to_endpoint(obj_type), obj_id, id_type)
 
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
-
-    r = requests.get(url, headers=headers)
+    r = get_session(ctx).get(url)
     ctx.obj['LOGGER'].debug("Response after querying '%s' by '%s' (%s): \n%s" % (obj_type, obj_id, id_type, r.text))  # for debug
     r_data = json.loads(r.text)
     if r_data.get('response'):
@@ -257,15 +366,10 @@ def query_by_id(ctx, obj_type, obj_id, id_type):
         return []
 
 
-def query_by_type(ctx, obj_type, obj_status="SUBMITTED"):
-    url = "%s%s?status=%s&skip=0&limit=0" % (api_url(ctx), _obj_type_to_endpoint(obj_type), obj_status)
-
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
+def query_by_type(ctx, obj_type, obj_status="SUBMITTED", skip=0, limit=0):
+    url = "%s%s?status=%s&skip=%s&limit=%s" % (api_url(ctx), _obj_type_to_endpoint(obj_type), obj_status, skip, limit)
 
-    r = requests.get(url, headers=headers)
+    r = get_session(ctx).get(url)
     ctx.obj['LOGGER'].debug("Response after querying '%s' by status '%s': \n%s" % (obj_type, obj_status, r.text))  # for debug
     r_data = json.loads(r.text)
     if r_data.get('response'):
@@ -274,28 +378,80 @@ def query_by_type(ctx, obj_type, obj_status="SUBMITTED"):
         return []
 
 
+def query_all_by_type(ctx, obj_type, obj_status="SUBMITTED", page_size=500):
+    """ All objects of a type in a status, requested page by page """
+    objects = []
+    skip = 0
+    while True:
+        page = query_by_type(ctx, obj_type, obj_status, skip=skip, limit=page_size)
+        objects.extend(page)
+        if len(page) < page_size:
+            return objects
+        skip += page_size
+
+
 def delete_obj(ctx, obj_type, obj_id):
-    url = "%s%s/%s" % (EGA_SUB_URL_PROD, _obj_type_to_endpoint(obj_type), obj_id)
+    url = "%s%s/%s" % (api_url(ctx), _obj_type_to_endpoint(obj_type), obj_id)
 
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
-    r = requests.delete(url, headers=headers)
+    r = get_session(ctx).delete(url)
     ctx.obj['LOGGER'].debug("Response after deleting '%s' with ID '%s': \n%s" % (obj_type, obj_id, r.text))  # for debug
     r_data = json.loads(r.text)
 
     if r_data['header']['code'] == "200":
         ctx.obj['LOGGER'].debug('Deleted: %s %s' % (obj_type, obj_id))  # for debug
+        if ctx.obj.get('ALIAS_INDEX'):
+            ctx.obj['ALIAS_INDEX'].remove(obj_type, obj_id)
 
 
-def submit_submission(ctx,submission):
-    url = "%ssubmissions/%s?action=SUBMIT" % (EGA_SUB_URL_PROD,ctx.obj['SUBMISSION']['id'])
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Token' : ctx.obj['SUBMISSION']['sessionToken']
-    }
+def submit_submission(ctx, submission):
+    """
+    Submit the objects listed in the submission subset of submission at once,
+    with a single SUBMIT of the submission prepared by prepare_submission().
+    Returns {object id: status} of the listed objects. Objects EGA does not
+    report on in its response are looked up among the submitted objects of
+    their type, which takes a request per page instead of one per object.
+    """
+    url = "%ssubmissions/%s?action=SUBMIT" % (api_url(ctx), ctx.obj['SUBMISSION']['id'])
 
-    r = requests.put(url,data=json.dumps(submission.to_dict()), headers=headers)
+    r = get_session(ctx).put(url, data=json.dumps(submission.to_dict()))
+    ctx.obj['LOGGER'].debug("Response after submitting submission: \n%s" % r.text)  # for debug
     r_data = json.loads(r.text)
+
+    if r_data.get('header', {}).get('code') != "200":
+        raise Exception("Error message: %s" % r_data.get('header', {}).get('userMessage'))
+
+    # a submitted submission takes no more objects, later runs must not reuse its id
+    del ctx.obj['SUBMISSION']['id']
+    token_cache = _token_cache(ctx)
+    if token_cache:
+        token_cache.put(ctx.obj['SETTINGS']['ega_submitter_account'], api_url(ctx), ctx.obj['SUBMISSION'])
+
+    reported = {}
+    _collect_statuses(r_data.get('response', {}).get('result'), reported)
+
+    statuses = {}
+    for obj_type in SUBSET_OBJECT_TYPES:
+        ids = getattr(submission.submission_subset, '%s_ids' % obj_type) or []
+        unreported = [i for i in ids if not i in reported]
+        if unreported:
+            submitted = set(o.get('id') for o in query_all_by_type(ctx, obj_type, 'SUBMITTED'))
+            reported.update((i, 'SUBMITTED') for i in unreported if i in submitted)
+        for i in ids:
+            if i in reported:
+                statuses[i] = reported[i]
+                if ctx.obj.get('ALIAS_INDEX'):
+                    ctx.obj['ALIAS_INDEX'].update_status(obj_type, i, reported[i])
+    return statuses
+
+
+def _collect_statuses(data, statuses):
+    """ Find {'id': ..., 'status': ...} objects anywhere in a response """
+    if isinstance(data, list):
+        for d in data:
+            _collect_statuses(d, statuses)
+    elif isinstance(data, dict):
+        if data.get('id') and data.get('status'):
+            statuses[data['id']] = data['status']
+        for d in data.values():
+            if isinstance(d, (list, dict)):
+                _collect_statuses(d, statuses)
@@ -0,0 +1,67 @@
+import threading
+
+
+EGA_OBJECT_STATUSES = ('DRAFT', 'VALIDATED', 'VALIDATED_WITH_ERRORS', 'SUBMITTED')
+
+
+class AliasIndex(object):
+    """
+    In-memory alias -> [{'id': ..., 'status': ...}] index of existing EGA objects,
+    one per object type, entries of objects with an EGA accession also have its
+    'egaAccessionId'. Only object types that have been loaded are covered,
+    lookups of other types must go to EGA.
+    """
+    def __init__(self):
+        self._index = {}
+        self._aliases = {}  # obj_type -> {id: alias}
+        self._lock = threading.Lock()
+
+    def covers(self, obj_type):
+        return obj_type in self._index
+
+    def load(self, obj_type, objects):
+        with self._lock:
+            self._index.setdefault(obj_type, {})
+            self._aliases.setdefault(obj_type, {})
+            for o in objects:
+                self._add(obj_type, o.get('alias'), o.get('id'), o.get('status'), o.get('egaAccessionId'))
+
+    def lookup(self, obj_type, alias):
+        with self._lock:
+            return [dict(o) for o in self._index.get(obj_type, {}).get(alias, [])]
+
+    def add(self, obj_type, alias, obj_id, status):
+        with self._lock:
+            if self.covers(obj_type):
+                self._add(obj_type, alias, obj_id, status)
+
+    def update_status(self, obj_type, obj_id, status):
+        with self._lock:
+            for o in self._objects_with_id(obj_type, obj_id):
+                o['status'] = status
+
+    def remove(self, obj_type, obj_id):
+        with self._lock:
+            alias = self._aliases.get(obj_type, {}).pop(obj_id, None)
+            if alias is None:
+                return
+            objects = [o for o in self._index[obj_type][alias] if not o['id'] == obj_id]
+            if objects:
+                self._index[obj_type][alias] = objects
+            else:
+                del self._index[obj_type][alias]
+
+    def _add(self, obj_type, alias, obj_id, status, accession=None):
+        if not alias:
+            return
+        entry = {'id': obj_id, 'status': status}
+        if accession:
+            entry['egaAccessionId'] = accession
+        self._index[obj_type].setdefault(alias, []).append(entry)
+        self._aliases[obj_type][obj_id] = alias
+
+    def _objects_with_id(self, obj_type, obj_id):
+        alias = self._aliases.get(obj_type, {}).get(obj_id)
+        if alias is None:
+            return []
+        return [o for o in self._index[obj_type][alias] if o['id'] == obj_id]
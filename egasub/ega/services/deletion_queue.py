@@ -0,0 +1,99 @@
+import Queue
+import threading
+
+from . import delete_obj
+from ...utils import run_parallel
+
+
+# objects referencing others are deleted first, a run before its experiment
+DELETE_ORDER = ('run', 'analysis', 'experiment', 'sample')
+
+# 'inline' deletes during submission as objects are found unneeded, without a queue
+CLEANUP_MODES = ('background', 'deferred', 'inline')
+
+
+def deletion_chain(deletions):
+    """ (obj_type, obj_id) deletions of one submission directory in the order EGA accepts them """
+    rank = lambda d: DELETE_ORDER.index(d[0]) if d[0] in DELETE_ORDER else len(DELETE_ORDER)
+    return sorted(deletions, key=rank)
+
+
+class DeletionQueue(object):
+    """
+    Deletes unneeded EGA draft objects off the submission path.
+
+    Each call to delete() queues the deletions of one submission directory as
+    a chain, deleted one after the other in DELETE_ORDER. Chains do not depend
+    on each other and are deleted by up to 'jobs' threads, in the 'background'
+    mode while submission goes on, in the 'deferred' mode all at once by flush()
+    at the end of the run.
+
+    Failed deletions are logged, drafts left over are deleted by a later run.
+    """
+    def __init__(self, ctx, jobs=1, mode='background'):
+        self.ctx = ctx
+        self.jobs = max(1, jobs)
+        self.mode = mode
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._chains = []
+        self._queue = None
+        self._workers = []
+
+        if mode == 'background':
+            self._queue = Queue.Queue()
+            for i in range(self.jobs):
+                w = threading.Thread(target=self._worker, name='Cleanup-%s' % (i + 1))
+                w.daemon = True
+                w.start()
+                self._workers.append(w)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def delete(self, deletions):
+        chain = deletion_chain(d for d in deletions if d[1])
+        if not chain:
+            return
+        if self._queue is not None:
+            self._queue.put(chain)
+        else:
+            with self._lock:
+                self._chains.append(chain)
+
+    def flush(self):
+        """ Wait for all queued deletions, returns the number of failed ones """
+        if self._workers:
+            for w in self._workers:
+                self._queue.put(None)
+            for w in self._workers:
+                w.join()
+            self._workers = []
+            self._queue = None  # deletions queued from now on wait for the next flush()
+
+        with self._lock:
+            chains, self._chains = self._chains, []
+        if chains:
+            self.ctx.obj['LOGGER'].info("Deleting unneeded objects of %s submission dir(s) ..." % len(chains))
+            run_parallel(self._delete_chain, chains, self.jobs)
+
+        return self.failed
+
+    def _worker(self):
+        while True:
+            chain = self._queue.get()
+            if chain is None:
+                return
+            self._delete_chain(chain)
+
+    def _delete_chain(self, chain):
+        for obj_type, obj_id in chain:
+            try:
+                delete_obj(self.ctx, obj_type, obj_id)
+            except Exception, err:
+                self.ctx.obj['LOGGER'].warning("Could not delete %s '%s': %s" % (obj_type, obj_id, err))
+                with self._lock:
+                    self.failed += 1
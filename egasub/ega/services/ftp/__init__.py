@@ -1,13 +1,187 @@
-
-from ftplib import FTP
+import os
+import json
+import time
+import socket
+import posixpath
+import threading
+from ftplib import FTP, error_temp, error_perm
 from click import echo
 
+
+EGA_FTP_SERVER = 'ftp.ega.ebi.ac.uk'
+
+
+class FtpSession(object):
+    """
+    A logged in FTP control connection reused for many commands.
+
+    The connection is opened on first use. When the server has dropped it,
+    for example after an idle timeout, the session logs in again and retries
+    the command once. Commands are serialized, so one session can be shared
+    by several submission workers.
+
+        with FtpSession(host, username, password) as ftp:
+            ftp.file_exists('unaligned.20170110/sample_x/reads.fq.gz.gpg')
+    """
+    def __init__(self, host, username, password, timeout=60):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._ftp = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self):
+        ftp = FTP(self.host, timeout=self.timeout)
+        ftp.login(self.username, self.password)
+        self._ftp = ftp
+
+    def _disconnect(self):
+        ftp, self._ftp = self._ftp, None
+        if ftp is None:
+            return
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
+
+    def call(self, command, *args):
+        """ Run an ftplib.FTP method on the shared connection, e.g. call('size', path) """
+        with self._lock:
+            for attempt in (1, 2):
+                if self._ftp is None:
+                    self._connect()
+                try:
+                    return getattr(self._ftp, command)(*args)
+                except (error_temp, EOFError, socket.error):
+                    # 421 or connection reset, most likely dropped while idle
+                    self._disconnect()
+                    if attempt == 2:
+                        raise
+
+    def size(self, file_path):
+        return self.call('size', file_path)
+
+    def file_exists(self, file_path):
+        try:
+            return self.size(file_path) is not None
+        except error_perm:  # 550, no such file
+            return False
+
+    def listdir(self, path):
+        """
+        List a remote directory, returns {name: {'size': ..., 'modify': ...}} for
+        its files. Uses MLSD and falls back to NLST (without size and modify time)
+        on servers not supporting it. A missing directory lists as empty.
+        """
+        files = {}
+
+        def parse_mlsd(line):
+            facts, _, name = line.partition(' ')
+            facts = dict(f.split('=', 1) for f in facts.lower().split(';') if '=' in f)
+            if facts.get('type') == 'file':
+                files[name] = {
+                    'size': int(facts['size']) if 'size' in facts else None,
+                    'modify': facts.get('modify')
+                }
+
+        args = [path] if path else []  # no path lists the login directory
+        try:
+            self.call('retrlines', ' '.join(['MLSD'] + args), parse_mlsd)
+            return files
+        except error_perm, err:
+            if str(err).startswith('550'):
+                return files
+
+        try:
+            for name in self.call('nlst', *args):
+                files[posixpath.basename(name)] = {'size': None, 'modify': None}
+        except error_perm:
+            pass
+        return files
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+class FtpInventory(object):
+    """
+    Index of remote files built from directory listings, so existence of many
+    files is checked with one listing per directory instead of one SIZE each.
+
+    Each directory is listed at most once per run. Listings are also kept in
+    cache_file (JSON) for ttl seconds, so checks of files in a directory listed
+    by an earlier run within the ttl do not touch the FTP server at all. A file
+    missing from a listing of an earlier run may have been uploaded since, the
+    directory is then listed again before the file is reported missing.
+    """
+    def __init__(self, ftp, cache_file=None, ttl=3600):
+        self.ftp = ftp
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self._dirs = {}  # dir -> {'listed': timestamp, 'files': {name: {'size':..., 'modify':...}}}
+        self._listed = set()  # dirs listed by this run
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+    def _load(self):
+        if not (self.cache_file and self.ttl and os.path.isfile(self.cache_file)):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                dirs = json.load(f)
+        except ValueError:
+            return
+
+        now = time.time()
+        self._dirs = dict((d, l) for d, l in dirs.items() if now - l['listed'] < self.ttl)
+
+    def save(self):
+        if not (self.cache_file and self.ttl and self._dirty):
+            return
+        with self._lock:
+            with open(self.cache_file, 'w') as f:
+                json.dump(self._dirs, f)
+            self._dirty = False
+
+    def files(self, path, refresh=False):
+        """
+        Return {name: {'size':..., 'modify':...}} for a remote directory, with
+        refresh, listed again unless it was listed by this run already
+        """
+        path = path.strip('/')
+        with self._lock:
+            if not path in self._dirs or (refresh and not path in self._listed):
+                self._dirs[path] = {'listed': time.time(), 'files': self.ftp.listdir(path)}
+                self._listed.add(path)
+                self._dirty = True
+            return self._dirs[path]['files']
+
+    def stat(self, file_path):
+        dirname, name = posixpath.split(file_path.strip('/'))
+        stat = self.files(dirname).get(name)
+        if stat is None:
+            stat = self.files(dirname, refresh=True).get(name)
+        return stat
+
+    def file_exists(self, file_path):
+        return self.stat(file_path) is not None
+
+
 def file_exists(host, username, password,file_path):
-    ftp = FTP(host)
-    ftp.login(username, password)    
-    
-    file_size = None
-    file_size = ftp.size(file_path)
-    ftp.quit()
-    
-    return file_size is not None
\ No newline at end of file
+    with FtpSession(host, username, password) as ftp:
+        return ftp.file_exists(file_path)
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import threading
+import urlparse
+from requests.adapters import HTTPAdapter
+from egasub.ratelimit import RetryingSession, session_options
+
+
+DEFAULT_POOL_SIZE = 10
+
+DEFAULT_TOKEN_TTL = 3600
+
+# EGA answers calls with an expired or invalid session token with this code,
+# either as the HTTP status or as the code of the JSON response header
+TOKEN_REJECTED_CODE = 401
+
+
+class EgaSession(RetryingSession):
+    """
+    HTTP client shared by all calls to the EGA submission API during one run.
+
+    Connections are pooled and kept alive, so the TCP/TLS handshake is paid once
+    per connection instead of once per object operation. The session token is
+    carried as a default header once the user has logged in.
+
+    When max_inflight is set, no more than that many requests are sent to the
+    same host at once, extra callers block until a slot frees up.
+
+    When relogin is set, a call rejected because the session token expired is
+    retried once after relogin() has set a new token. Only the first of several
+    workers hitting the expired token logs in, the others wait for it and retry
+    with the new token. Calls passing their own X-Token header are left alone.
+
+    Timeouts, retries and adaptive concurrency are those of RetryingSession,
+    configured by the remaining keyword arguments.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, max_inflight=None, **options):
+        super(EgaSession, self).__init__(**options)
+        self.max_inflight = max_inflight
+        self.relogin = None
+        self._relogin_lock = threading.Lock()
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        self.headers.update({'Content-Type': 'application/json'})
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+    def _host_slot(self, url):
+        host = urlparse.urlparse(url).netloc
+        with self._host_slots_lock:
+            if not host in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_inflight)
+            return self._host_slots[host]
+
+    def _send(self, method, url, *args, **kwargs):
+        if not self.max_inflight:
+            return super(EgaSession, self).request(method, url, *args, **kwargs)
+
+        with self._host_slot(url):
+            return super(EgaSession, self).request(method, url, *args, **kwargs)
+
+    def request(self, method, url, *args, **kwargs):
+        token = self.token
+        r = self._send(method, url, *args, **kwargs)
+
+        if self.relogin and token and not 'X-Token' in (kwargs.get('headers') or {}) \
+                and _token_rejected(r) and self._refresh_token(token):
+            r = self._send(method, url, *args, **kwargs)
+        return r
+
+    def _refresh_token(self, rejected_token):
+        """ Log in again unless another worker already replaced rejected_token, returns True with a new token """
+        with self._relogin_lock:
+            if self.token == rejected_token:
+                self.relogin()
+            return bool(self.token) and not self.token == rejected_token
+
+    @property
+    def token(self):
+        return self.headers.get('X-Token')
+
+    @token.setter
+    def token(self, token):
+        if token:
+            self.headers['X-Token'] = token
+        else:
+            self.headers.pop('X-Token', None)
+
+
+def _token_rejected(response):
+    if response.status_code == TOKEN_REJECTED_CODE:
+        return True
+    if not str(TOKEN_REJECTED_CODE) in response.text[:200]:  # spares parsing most responses
+        return False
+    try:
+        header = response.json().get('header') or {}
+    except (ValueError, AttributeError):  # not a JSON object
+        return False
+    return str(header.get('code')) == str(TOKEN_REJECTED_CODE)
+
+
+def get_session(ctx):
+    """ Return the EGA session of the current run, creating it on first use. """
+    session = ctx.obj.get('EGA_SESSION')
+    if session is None:
+        settings = ctx.obj.get('SETTINGS') or {}
+        # every submission worker should be able to hold a connection
+        pool_size = max(int(settings.get('http_pool_size', DEFAULT_POOL_SIZE)), ctx.obj.get('JOBS', 1))
+        session = EgaSession(
+                        pool_size=pool_size,
+                        keep_alive=settings.get('http_keep_alive', True),
+                        max_inflight=settings.get('ega_max_inflight_requests'),
+                        **session_options(settings, 'ega', ctx.obj.get('JOBS', 1))
+                    )
+        ctx.obj['EGA_SESSION'] = session
+    return session
+
+
+class TokenCache(object):
+    """
+    Session token and submission id of the last run, kept in a file readable by
+    the owner only, so that runs following each other within ttl seconds reuse
+    them instead of logging in and creating a submission every time.
+
+    Entries are per account and API URL, a cached token for another account or
+    server is never returned.
+    """
+    def __init__(self, cache_file, ttl=DEFAULT_TOKEN_TTL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+
+    def _read(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        # created with owner only permissions, then moved in place
+        tmp_file = '%s.%s.tmp' % (self.cache_file, os.getpid())
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.chmod(tmp_file, 0600)
+        os.rename(tmp_file, self.cache_file)
+
+    def _key(self, account, api_url):
+        return '%s %s' % (account, api_url)
+
+    def get(self, account, api_url):
+        """ Return {'sessionToken': ..., 'id': ...} cached for the account, None when missing or expired """
+        entry = self._read().get(self._key(account, api_url))
+        if not entry or time.time() - entry.get('saved', 0) >= self.ttl:
+            return None
+        return dict((k, v) for k, v in entry.items() if not k == 'saved')
+
+    def put(self, account, api_url, submission):
+        entries = self._read()
+        entry = dict(submission)
+        entry['saved'] = time.time()
+        entries[self._key(account, api_url)] = entry
+        self._write(entries)
+
+    def remove(self, account, api_url):
+        entries = self._read()
+        if entries.pop(self._key(account, api_url), None) is not None:
+            self._write(entries)
@@ -0,0 +1,224 @@
+"""
+Submission through the EGA XML drop-box: a whole batch of objects is sent as
+SRA XML documents, one per object type, plus a SUBMISSION manifest in a single
+multipart request. The receipt lists the accession EGA gave each object by alias.
+
+Documents are never held in memory as a whole: each object is serialized on
+its own and written to a temporary file, and the request body is streamed
+from those files in chunks.
+"""
+import uuid
+import tempfile
+from StringIO import StringIO
+
+from . import XML_EGA_SUB_URL_PROD
+from .session import get_session
+from ..entities.xml_utils import ET, sub_element
+
+
+# object type, document root and multipart field, in the order EGA processes them
+XML_DOCUMENTS = (
+    ('sample', 'SAMPLE_SET', 'SAMPLE'),
+    ('experiment', 'EXPERIMENT_SET', 'EXPERIMENT'),
+    ('run', 'RUN_SET', 'RUN'),
+    ('analysis', 'ANALYSIS_SET', 'ANALYSIS'),
+    ('dataset', 'DATASETS', 'DATASET')
+)
+
+# uploading and processing a large batch takes a while
+XML_TIMEOUT = 600
+
+CHUNK_SIZE = 64 * 1024
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def xml_api_url(ctx):
+    return ctx.obj['SETTINGS'].get('xmlApiUrl', XML_EGA_SUB_URL_PROD)
+
+
+def iter_document(root, elements):
+    """
+    Chunks of an XML document with the given root element and children, taken
+    one at a time from the elements iterable and dropped once serialized.
+    """
+    yield '%s<%s>\n' % (XML_DECLARATION, root)
+    for element in elements:
+        # ASCII with character references needs no declaration of its own
+        yield ET.tostring(element)
+        yield '\n'
+    yield '</%s>\n' % root
+
+
+class XmlBatchWriter(object):
+    """
+    Writes the objects of a batch to one temporary XML document per object
+    type as they are added, memory use does not grow with the batch size.
+    """
+    def __init__(self, enums=None):
+        self.enums = enums
+        self.counts = {}
+        self._files = {}
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.discard()
+
+    def add(self, obj_type, obj):
+        f = self._files.get(obj_type)
+        if f is None:
+            f = self._files[obj_type] = tempfile.TemporaryFile(prefix='egasub_%s_' % obj_type, suffix='.xml')
+            f.write('%s<%s>\n' % (XML_DECLARATION, _document_root(obj_type)))
+        f.write(ET.tostring(obj.to_xml(self.enums)))
+        f.write('\n')
+        self.counts[obj_type] = self.counts.get(obj_type, 0) + 1
+
+    def close(self):
+        """ Finish the documents, returns [(obj_type, file)] in the order EGA processes them """
+        if not self._closed:
+            for obj_type, f in self._files.items():
+                f.write('</%s>\n' % _document_root(obj_type))
+                f.flush()
+            self._closed = True
+        return [(obj_type, self._files[obj_type]) for obj_type, _, _ in XML_DOCUMENTS if obj_type in self._files]
+
+    def discard(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def _document_root(obj_type):
+    return dict((t, root) for t, root, _ in XML_DOCUMENTS)[obj_type]
+
+
+class MultipartBody(object):
+    """
+    multipart/form-data body of (field name, file name, file) parts, read from
+    the files in chunks while it is sent. Once read to the end it reads from
+    the start again, so a throttled request can be retried.
+    """
+    def __init__(self, parts):
+        self.parts = parts
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=%s' % self.boundary
+        self._chunks = None
+        self._buffer = ''
+
+    def _part_header(self, name, filename):
+        return '--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n' \
+               'Content-Type: application/xml\r\n\r\n' % (self.boundary, name, filename)
+
+    def _closing(self):
+        return '--%s--\r\n' % self.boundary
+
+    def __len__(self):
+        length = len(self._closing())
+        for name, filename, f in self.parts:
+            f.seek(0, 2)
+            length += len(self._part_header(name, filename)) + f.tell() + 2
+        return length
+
+    def __iter__(self):
+        for name, filename, f in self.parts:
+            yield self._part_header(name, filename)
+            f.seek(0)
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            yield '\r\n'
+        yield self._closing()
+
+    def read(self, size=-1):
+        if self._chunks is None:
+            self._chunks = iter(self)
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                if not self._buffer:  # end of the body, the next read starts over
+                    self._chunks = None
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def submission_manifest(obj_types, dry_run=True, alias=None):
+    """ SUBMISSION adding, or only validating, the documents of obj_types """
+    submission = sub_element(None, 'SUBMISSION', alias=alias)
+    actions = sub_element(submission, 'ACTIONS')
+    for obj_type in obj_types:
+        sub_element(sub_element(actions, 'ACTION'), 'VALIDATE' if dry_run else 'ADD',
+                    source='%s.xml' % obj_type, schema=obj_type)
+    if not dry_run:
+        sub_element(sub_element(actions, 'ACTION'), 'PROTECT')
+    return submission
+
+
+class Receipt(object):
+    """ Outcome of an XML submission, accessions by (obj_type, alias) and the messages of EGA """
+    def __init__(self, success, accessions, errors, infos):
+        self.success = success
+        self.accessions = accessions
+        self.errors = errors
+        self.infos = infos
+
+    def accession(self, obj_type, alias):
+        return self.accessions.get((obj_type, alias))
+
+    @staticmethod
+    def from_xml(text):
+        try:
+            root = ET.fromstring(text)
+        except SyntaxError:  # ParseError of ElementTree and cElementTree
+            raise Exception("Not a submission receipt: %s" % text[:200])
+        if not root.tag == 'RECEIPT':
+            raise Exception("Not a submission receipt: %s" % text[:200])
+
+        accessions = {}
+        for _, _, field in XML_DOCUMENTS:
+            for element in root.findall(field):
+                if element.get('accession'):
+                    accessions[(field.lower(), element.get('alias'))] = element.get('accession')
+
+        return Receipt(
+                    root.get('success') == 'true',
+                    accessions,
+                    [e.text for e in root.findall('MESSAGES/ERROR')],
+                    [e.text for e in root.findall('MESSAGES/INFO')]
+                )
+
+
+def xml_submission(ctx, batch, dry_run=True, alias=None):
+    """
+    Send the documents of an XmlBatchWriter to the XML drop-box in one request,
+    validating the objects or with dry_run False, submitting them. Returns the Receipt.
+    """
+    documents = batch.close()
+    manifest = StringIO(''.join(iter_document('SUBMISSION_SET',
+                                              [submission_manifest([t for t, _ in documents], dry_run, alias)])))
+    fields = dict((obj_type, field) for obj_type, _, field in XML_DOCUMENTS)
+    body = MultipartBody([('SUBMISSION', 'submission.xml', manifest)] +
+                         [(fields[obj_type], '%s.xml' % obj_type, f) for obj_type, f in documents])
+
+    ctx.obj['LOGGER'].info("%s %s object(s) through the XML drop-box ..." % \
+                                ('Validating' if dry_run else 'Submitting', sum(batch.counts.values())))
+    r = get_session(ctx).post(
+                xml_api_url(ctx),
+                params={'auth': 'EGA %s %s' % (ctx.obj['SETTINGS']['ega_submitter_account'],
+                                               ctx.obj['SETTINGS']['ega_submitter_password'])},
+                data=body,  # sent while it is read from the documents
+                # the drop-box authenticates by the auth parameter
+                headers={'Content-Type': body.content_type, 'X-Token': None},
+                timeout=ctx.obj['SETTINGS'].get('xml_timeout', XML_TIMEOUT)
+            )
+    ctx.obj['LOGGER'].debug("Receipt of the XML submission: \n%s" % r.text)  # for debug
+    return Receipt.from_xml(r.content)
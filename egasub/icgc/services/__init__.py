@@ -1,5 +1,7 @@
-import requests
 import json
+from requests.adapters import HTTPAdapter
+from egasub.utils import run_parallel
+from egasub.ratelimit import RetryingSession, session_options
 
 ICGC_ID_SERVICE_URL_TEST = "http://hetl2-dcc.res.oicr.on.ca:8000"
 ICGC_ID_SERVICE_URL_PROD = "http://hetl2-dcc.res.oicr.on.ca:8000"
@@ -22,11 +24,7 @@ ICGC_ID_SERVICE_ENDPOINTS = {
 }
 
 
-def id_service(ctx, type_, project_code, submitter_id, create=True, is_test=False):
-    """
-    ICGC ID Service
-    """
-
+def _id_request(ctx, type_, project_code, submitter_id, create=True, is_test=False):
     if not type_ in ('donor', 'specimen', 'sample'):
         raise Exception('Unsupported entity type: %s' % type_)
 
@@ -47,19 +45,85 @@ def id_service(ctx, type_, project_code, submitter_id, create=True, is_test=Fals
     create_param = '='.join(['create', 'true' if create else 'false'])
 
 
-    r = requests.get("%s/%s?%s&%s&%s" % (url, path, project_param,
-                                            submitter_id_param, create_param),
-                       headers={
-                                'Content-Type': 'application/json',
-                                'Authorization': 'Bearer %s' % ctx.obj['SETTINGS'].get('icgc_id_service_token')
-                                }
-                    )
-    
+    return get_icgc_session(ctx).get("%s/%s?%s&%s&%s" % (url, path, project_param,
+                                                            submitter_id_param, create_param),
+                                       headers={
+                                                'Content-Type': 'application/json',
+                                                'Authorization': 'Bearer %s' % ctx.obj['SETTINGS'].get('icgc_id_service_token')
+                                                }
+                                    )
+
+
+def get_icgc_session(ctx):
+    """
+    HTTP session to the ICGC ID service of the current run, with a connection
+    per worker, timeouts, retries and adaptive concurrency
+    """
+    session = ctx.obj.get('ICGC_SESSION')
+    if session is None:
+        pool_size = max(int(ctx.obj['SETTINGS'].get('http_pool_size', 10)), ctx.obj.get('JOBS', 1))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session = RetryingSession(**session_options(ctx.obj['SETTINGS'], 'icgc', ctx.obj.get('JOBS', 1)))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        ctx.obj['ICGC_SESSION'] = session
+    return session
+
+
+def _parse_id_response(text):
     try:
-        r_data = json.loads(r.text)
+        r_data = json.loads(text)
         if "error" in r_data:
             raise Exception("Invalid ICGC credentials. Check your ICGC service Token - Server error: %s" % (r_data["error"]))
         return r_data
     except Exception:
-        return r.text
+        return text
+
+
+def id_service(ctx, type_, project_code, submitter_id, create=True, is_test=False):
+    """
+    ICGC ID Service
+    """
+    r = _id_request(ctx, type_, project_code, submitter_id, create, is_test)
+    return _parse_id_response(r.text)
+
+
+def icgc_id(ctx, type_, project_code, submitter_id, create=True, is_test=False):
+    """
+    ICGC ID Service through the ICGC ID cache of the run in ctx.obj['ICGC_ID_CACHE']
+    when there is one. Only IDs returned successfully are cached.
+    """
+    cache = ctx.obj.get('ICGC_ID_CACHE')
+    if cache is None:
+        return id_service(ctx, type_, project_code, submitter_id, create, is_test)
+
+    def fetch():
+        r = _id_request(ctx, type_, project_code, submitter_id, create, is_test)
+        try:
+            error = 'error' in json.loads(r.text)
+        except (ValueError, TypeError):
+            error = False
+        return r.text, r.status_code == 200 and bool(r.text.strip()) and not error
+
+    return _parse_id_response(cache.get((type_, project_code, submitter_id, bool(is_test)), fetch))
+
+
+def resolve_icgc_ids(ctx, keys, jobs=1, create=True):
+    """
+    Look up ICGC IDs of (entity type, project code, submitter id, is_test) keys
+    missing from ctx.obj['ICGC_ID_CACHE'] with up to 'jobs' concurrent requests,
+    so later icgc_id() calls are answered from the cache. Returns the keys that
+    could not be resolved.
+    """
+    cache = ctx.obj['ICGC_ID_CACHE']
+    todo = sorted(set(k for k in keys if not k in cache))
+
+    def resolve(key):
+        type_, project_code, submitter_id, is_test = key
+        try:
+            icgc_id(ctx, type_, project_code, submitter_id, create, is_test)
+        except Exception, err:
+            ctx.obj['LOGGER'].debug("ICGC ID lookup of %s failed: %s" % (key, err))
 
+    run_parallel(resolve, todo, jobs)
+    return [k for k in todo if not k in cache]
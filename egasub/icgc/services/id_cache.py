@@ -0,0 +1,99 @@
+import time
+import sqlite3
+import threading
+
+
+class _Lookup(object):
+    """ A lookup in flight, other callers asking for the same key wait for it """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class IcgcIdCache(object):
+    """
+    ICGC IDs by (entity type, project code, submitter id, is_test), kept in a
+    SQLite file as IDs never change once assigned. IDs of the test and the
+    production ID service are kept apart. All cached IDs are loaded on open,
+    so lookups during a run do not touch the database.
+
+    get() looks up a key at most once at a time: callers asking for a key that
+    is already being fetched wait for that fetch instead of starting another,
+    so the samples of one donor trigger a single donor lookup.
+    """
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._db = sqlite3.connect(db_file, check_same_thread=False)
+        self._db.text_factory = str
+        columns = [c[1] for c in self._db.execute("PRAGMA table_info(icgc_ids)")]
+        if columns and not 'is_test' in columns:
+            # IDs cached before test and production IDs were told apart
+            self._db.execute("DROP TABLE icgc_ids")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS icgc_ids (
+                                entity_type TEXT,
+                                project_code TEXT,
+                                submitter_id TEXT,
+                                is_test INTEGER,
+                                response TEXT,
+                                fetched_at INTEGER,
+                                PRIMARY KEY (entity_type, project_code, submitter_id, is_test)
+                            )""")
+        self._db.commit()
+        self._memo = dict(((t, p, s, bool(i)), r) for t, p, s, i, r in
+                            self._db.execute("SELECT entity_type, project_code, submitter_id, is_test, response FROM icgc_ids"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self._memo
+
+    def get(self, key, fetch):
+        """
+        Cached value of key, (entity type, project code, submitter id, is_test), otherwise
+        calls fetch() which returns (value, cacheable) and caches value if cacheable.
+        """
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+            lookup = self._inflight.get(key)
+            leader = lookup is None
+            if leader:
+                lookup = self._inflight[key] = _Lookup()
+
+        if not leader:
+            lookup.done.wait()
+            if lookup.error:
+                raise lookup.error
+            return lookup.value
+
+        try:
+            value, cacheable = fetch()
+            lookup.value = value
+            if cacheable:
+                self._put(key, value)
+            return value
+        except Exception, err:
+            lookup.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            lookup.done.set()
+
+    def _put(self, key, value):
+        with self._lock:
+            self._memo[key] = value
+            self._db.execute("INSERT OR REPLACE INTO icgc_ids VALUES (?, ?, ?, ?, ?, ?)",
+                             tuple(key[:3]) + (int(key[3]), value, int(time.time())))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
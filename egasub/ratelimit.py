@@ -0,0 +1,170 @@
+import time
+import random
+import threading
+import requests
+
+
+DEFAULT_TIMEOUT = 60
+
+DEFAULT_RETRIES = 3
+
+DEFAULT_BACKOFF = 0.5
+
+MAX_BACKOFF = 30
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+
+# responses worth another try of an idempotent call
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# responses telling that the server did not take the call, safe to retry any call
+THROTTLE_STATUS = (429, 503)
+
+
+def backoff_delay(attempt, backoff=DEFAULT_BACKOFF, max_backoff=MAX_BACKOFF):
+    """ Full jitter exponential backoff: random delay up to backoff * 2^attempt seconds """
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+class AimdLimiter(object):
+    """
+    Concurrency limit adapting to the server, additive increase and
+    multiplicative decrease (AIMD) as in TCP congestion control.
+
+    Each successful call raises the limit by 1/limit, so about one more call
+    in flight per round of calls. A throttled call (429/503), or a call taking
+    more than latency_factor times the usual latency, halves the limit, at
+    most once per cooldown seconds so a burst of failures counts once. The
+    cooldown defaults to the usual latency, i.e. once per round of calls.
+    """
+    def __init__(self, initial=4, minimum=1, maximum=64, latency_factor=3.0, cooldown=None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.inflight = 0
+        self._latency = None  # moving average of successful calls
+        self._decreased_at = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, latency=None, throttled=False):
+        """ Free a slot, latency of a successful call or throttled=True adjust the limit """
+        with self._cond:
+            self.inflight -= 1
+            if throttled or self._latency_spike(latency):
+                now = time.time()
+                cooldown = self.cooldown if self.cooldown is not None else self._latency or 0
+                if now - self._decreased_at >= cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased_at = now
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+            self._cond.notify_all()
+
+    def _latency_spike(self, latency):
+        return latency is not None and self._latency is not None and latency > self.latency_factor * self._latency
+
+
+class RetryingSession(requests.Session):
+    """
+    HTTP session giving every call a timeout, retrying failed idempotent calls
+    with jittered exponential backoff and, with a limiter, holding the number
+    of calls in flight to what the server sustains.
+
+    timeouts maps URL parts to a timeout in seconds for calls to URLs
+    containing them, the longest matching part wins, other calls get
+    'timeout'. Calls are idempotent by HTTP method, callers can pass
+    idempotent=True for other safe calls, e.g. a PUT that only validates.
+    Throttled calls (429/503) are retried whatever the method.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, timeouts=None, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, limiter=None):
+        super(RetryingSession, self).__init__()
+        self.timeout = timeout
+        self.timeouts = sorted((timeouts or {}).items(), key=lambda t: -len(t[0]))
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = limiter
+
+    def _timeout_for(self, url):
+        for part, timeout in self.timeouts:
+            if part in url:
+                return timeout
+        return self.timeout
+
+    def request(self, method, url, *args, **kwargs):
+        idempotent = kwargs.pop('idempotent', None)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self._timeout_for(url))
+
+        attempt = 0
+        while True:
+            r, error = self._send_limited(method, url, *args, **kwargs)
+
+            throttled = r is not None and r.status_code in THROTTLE_STATUS
+            failed = error is not None or r.status_code in RETRY_STATUS
+            if not (throttled or failed and idempotent) or attempt >= self.retries:
+                if error is not None:
+                    raise error
+                return r
+
+            time.sleep(self._retry_delay(r, attempt))
+            attempt += 1
+
+    def _send_limited(self, method, url, *args, **kwargs):
+        """ Send one call within the limiter, returns (response, None) or (None, connection error) """
+        if not self.limiter:
+            try:
+                return super(RetryingSession, self).request(method, url, *args, **kwargs), None
+            except (requests.ConnectionError, requests.Timeout), err:
+                return None, err
+
+        self.limiter.acquire()
+        start = time.time()
+        r = None
+        try:
+            r = super(RetryingSession, self).request(method, url, *args, **kwargs)
+            return r, None
+        except (requests.ConnectionError, requests.Timeout), err:
+            return None, err
+        finally:
+            if r is None:  # connection failed or timed out, most likely overloaded
+                self.limiter.release(throttled=True)
+            elif r.status_code in THROTTLE_STATUS:
+                self.limiter.release(throttled=True)
+            elif r.status_code >= 500:
+                self.limiter.release()
+            else:
+                self.limiter.release(latency=time.time() - start)
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(MAX_BACKOFF, int(retry_after))
+        return backoff_delay(attempt, self.backoff)
+
+
+def session_options(settings, prefix, jobs=1):
+    """
+    RetryingSession keyword arguments from the '<prefix>_timeout',
+    '<prefix>_endpoint_timeouts', '<prefix>_retries' and '<prefix>_adaptive_concurrency'
+    settings, e.g. 'ega_timeout'. The adaptive limiter may grow to four times 'jobs'.
+    """
+    options = {
+        'timeout': settings.get('%s_timeout' % prefix, DEFAULT_TIMEOUT),
+        'timeouts': settings.get('%s_endpoint_timeouts' % prefix),
+        'retries': settings.get('%s_retries' % prefix, DEFAULT_RETRIES),
+        'backoff': settings.get('%s_backoff' % prefix, DEFAULT_BACKOFF)
+    }
+    if settings.get('%s_adaptive_concurrency' % prefix, True):
+        options['limiter'] = AimdLimiter(initial=min(4, jobs), maximum=max(4 * jobs, 4))
+    return options
@@ -1,4 +1,3 @@
-from init import init_workspace
-from submit import perform_submission, submit_dataset
-from status import generate_report
-from init_submission_dir import init_submission_dir
\ No newline at end of file
+# Subcommand modules are deliberately not imported here, importing one of them
+# (e.g. egasub.submission.status) must not pull in the HTTP and FTP stacks
+# needed by the others.
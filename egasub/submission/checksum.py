@@ -0,0 +1,113 @@
+import os
+import re
+
+from ..checksum import md5sums, md5sum_file, write_md5sum_file, ChecksumCache
+from ..exceptions import Md5sumFileError
+from ..utils import load_yaml
+from .submittable import _get_md5sum
+
+
+# metadata file of each submission data type
+METADATA_FILES = {
+    'unaligned': 'experiment.yaml',
+    'alignment': 'analysis.yaml',
+    'variation': 'analysis.yaml'
+}
+
+
+def checksum_cache_file(ctx):
+    return os.path.join(ctx.obj['WORKSPACE_PATH'], '.egasub', 'checksum_cache.db')
+
+
+def perform_checksum(ctx, submission_dirs, verify=False, force=False, jobs=None):
+    """
+    Write missing md5sum files of the encrypted data files and their unencrypted
+    originals in the submission directories, or with verify, check existing
+    md5sum files against the data files. Data files unchanged since they were
+    last hashed take their md5 from the workspace checksum cache.
+    """
+    data_files = []
+    for submission_dir in submission_dirs:
+        try:
+            data_files.extend(_data_files(ctx, submission_dir.rstrip('/')))
+        except Exception, err:
+            ctx.obj['LOGGER'].error("Skip '%s' as it appears to be not a well formed submission directory. Error: %s" % (submission_dir, err))
+
+    errors = 0
+    todo = []
+    for data_file in data_files:
+        has_md5sum_file = os.path.isfile(md5sum_file(data_file))
+        if not os.path.isfile(data_file):
+            if not has_md5sum_file:
+                errors += 1
+                ctx.obj['LOGGER'].error("Data file '%s' and its md5sum file are both missing." % data_file)
+            elif verify:
+                errors += 1
+                ctx.obj['LOGGER'].error("Data file '%s' of md5sum file '%s' is missing." % (data_file, md5sum_file(data_file)))
+        elif verify and has_md5sum_file:
+            todo.append(data_file)
+        elif verify:
+            errors += 1
+            ctx.obj['LOGGER'].error("md5sum file '%s' is missing." % md5sum_file(data_file))
+        elif not verify and (force or not has_md5sum_file):
+            todo.append(data_file)
+
+    with ChecksumCache(checksum_cache_file(ctx)) as cache:
+        checksums = dict((f, cache.get(f)) for f in todo)
+        to_hash = [f for f in todo if force or not checksums[f]]
+
+        ctx.obj['LOGGER'].info("Computing md5sum of %s file(s), %s unchanged file(s) taken from cache ..." % \
+                                    (len(to_hash), len(todo) - len(to_hash)))
+        unreadable = {}
+        for data_file, checksum in md5sums(to_hash, jobs, unreadable).items():
+            cache.put(data_file, checksum)
+            checksums[data_file] = checksum
+
+    for data_file, error in sorted(unreadable.items()):
+        errors += 1
+        ctx.obj['LOGGER'].error("Could not read data file '%s': %s" % (data_file, error))
+
+    for data_file in todo:
+        if data_file in unreadable:
+            continue
+        if not verify:
+            write_md5sum_file(data_file, checksums[data_file])
+            ctx.obj['LOGGER'].info("Wrote '%s'" % md5sum_file(data_file))
+            continue
+
+        try:
+            expected = _get_md5sum(md5sum_file(data_file))
+        except Md5sumFileError, err:
+            expected = None
+        if expected == checksums[data_file]:
+            ctx.obj['LOGGER'].info("OK '%s'" % data_file)
+        else:
+            errors += 1
+            ctx.obj['LOGGER'].error("md5sum mismatch for '%s': md5sum file has '%s', data file is '%s'" % \
+                                        (data_file, expected, checksums[data_file]))
+
+    return errors
+
+
+def prune_checksum_cache(ctx):
+    """ Drop cache entries of data files that were removed or changed """
+    with ChecksumCache(checksum_cache_file(ctx)) as cache:
+        removed = cache.prune()
+    ctx.obj['LOGGER'].info("Removed %s stale entries from the checksum cache." % removed)
+
+
+def _data_files(ctx, submission_dir):
+    """ Local paths of the data files listed in the submission directory's metadata """
+    metadata_file = os.path.join(submission_dir, METADATA_FILES[ctx.obj['CURRENT_DIR_TYPE']])
+    with open(metadata_file, 'r') as f:
+        metadata = load_yaml(f)
+
+    data_files = []
+    for f in metadata.get('files') or []:
+        if not f.get('fileName'):
+            continue
+        encrypted_file = os.path.join(submission_dir, os.path.basename(f.get('fileName')))
+        data_files.append(encrypted_file)
+        data_files.append(re.sub(r'\.gpg$', '', encrypted_file))
+
+    return sorted(set(data_files))
@@ -0,0 +1,79 @@
+import os
+
+from ..icgc.services import icgc_id, resolve_icgc_ids
+from ..icgc.services.id_cache import IcgcIdCache
+from ..utils import load_yaml
+from .checksum import METADATA_FILES
+
+
+# submitted samples get IDs of the ICGC ID test service, created when missing,
+# the same ones whether looked up ahead or while submitting
+ICGC_ID_CREATE = True
+ICGC_ID_IS_TEST = True
+
+
+def icgc_id_cache_file(ctx):
+    return os.path.join(ctx.obj['WORKSPACE_PATH'], '.egasub', 'icgc_ids.db')
+
+
+def icgc_id_keys(project_code, alias, subject_id):
+    """ ICGC ID cache keys of a sample and its donor """
+    return [('sample', project_code, alias, ICGC_ID_IS_TEST), ('donor', project_code, subject_id, ICGC_ID_IS_TEST)]
+
+
+def submission_icgc_id(ctx, type_, submitter_id):
+    """ ICGC ID of a sample or donor of the submission """
+    return icgc_id(ctx, type_, ctx.obj['SETTINGS']['icgc_project_code'], submitter_id,
+                   ICGC_ID_CREATE, ICGC_ID_IS_TEST)
+
+
+def preresolve_icgc_ids(ctx, submittables, jobs=1):
+    """
+    Resolve the ICGC sample and donor IDs of all submittables before any of
+    them is submitted, returns the submittables whose IDs are all known.
+    """
+    project_code = ctx.obj['SETTINGS'].get('icgc_project_code')
+    keys = dict((s, icgc_id_keys(project_code, s.sample.alias, s.sample.subject_id)) for s in submittables)
+
+    ctx.obj['LOGGER'].info("Resolving ICGC IDs ...")
+    failed = set(resolve_icgc_ids(ctx, [k for ks in keys.values() for k in ks], jobs, ICGC_ID_CREATE))
+
+    resolved = []
+    for submittable in submittables:
+        missing = [k for k in keys[submittable] if k in failed]
+        if missing:
+            ctx.obj['LOGGER'].error("Skip '%s' as ICGC ID(s) could not be obtained for: %s" % \
+                                        (submittable.submission_dir, ', '.join('%s %s' % (k[0], k[2]) for k in missing)))
+        else:
+            resolved.append(submittable)
+    return resolved
+
+
+def perform_icgc_ids(ctx, submission_dirs, jobs=1):
+    """
+    Resolve and cache the ICGC sample and donor IDs of the submission
+    directories ahead of submission, returns the number of failed lookups.
+    """
+    project_code = ctx.obj['SETTINGS'].get('icgc_project_code')
+    keys = []
+    for submission_dir in submission_dirs:
+        metadata_file = os.path.join(submission_dir.rstrip('/'), METADATA_FILES[ctx.obj['CURRENT_DIR_TYPE']])
+        try:
+            with open(metadata_file, 'r') as f:
+                sample = load_yaml(f).get('sample') or {}
+        except Exception, err:
+            ctx.obj['LOGGER'].error("Skip '%s' as it appears to be not a well formed submission directory. Error: %s" % (submission_dir, err))
+            continue
+        keys.extend(icgc_id_keys(project_code, sample.get('alias'), sample.get('subjectId')))
+
+    ctx.obj['JOBS'] = jobs
+    with IcgcIdCache(icgc_id_cache_file(ctx)) as cache:
+        ctx.obj['ICGC_ID_CACHE'] = cache
+        todo = len(set(k for k in keys if not k in cache))
+        ctx.obj['LOGGER'].info("Resolving %s ICGC ID(s), %s already cached ..." % (todo, len(set(keys)) - todo))
+        failed = resolve_icgc_ids(ctx, keys, jobs, ICGC_ID_CREATE)
+        del ctx.obj['ICGC_ID_CACHE']
+
+    for type_, _, submitter_id, _ in failed:
+        ctx.obj['LOGGER'].error("Could not obtain ICGC %s ID for '%s'" % (type_, submitter_id))
+    return len(failed)
@@ -0,0 +1,121 @@
+import heapq
+import Queue
+import threading
+
+
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+CANCELLED = 'CANCELLED'
+
+
+class Task(object):
+    """ A step of the graph, runs once all tasks it requires are done """
+    def __init__(self, index, name, func, requires, always):
+        self.index = index
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.always = always
+        self.dependents = []
+        self.state = PENDING
+        self.error = None
+
+    def __repr__(self):
+        return '<Task %s %s>' % (self.name, self.state)
+
+
+class DagScheduler(object):
+    """
+    Runs tasks of a dependency graph with up to 'jobs' tasks at a time, each
+    task as soon as all tasks it requires are done.
+
+    A task that fails cancels the tasks depending on it, directly or not, other
+    tasks go on. Tasks added with always=True run once the tasks they require
+    have finished, whether they succeeded or not, e.g. to clean up.
+
+    Tasks can only require tasks added before them, so the graph has no cycles.
+    Among ready tasks the earliest added runs first, so work already started
+    is finished before new work is taken up.
+    """
+    def __init__(self, jobs=1):
+        self.jobs = max(1, jobs)
+        self.tasks = []
+
+    def add(self, name, func, requires=(), always=False):
+        for r in requires:
+            if not (r.index < len(self.tasks) and self.tasks[r.index] is r):
+                raise ValueError("Task '%s' requires '%s' which is not in the graph" % (name, r.name))
+        task = Task(len(self.tasks), name, func, tuple(requires), always)
+        for r in task.requires:
+            r.dependents.append(task)
+        self.tasks.append(task)
+        return task
+
+    def run(self):
+        """ Run all tasks, returns the ones that failed """
+        waiting = dict((t, len(t.requires)) for t in self.tasks)
+        ready = [(t.index, t) for t in self.tasks if not t.requires]
+        heapq.heapify(ready)
+
+        work = Queue.Queue()
+        results = Queue.Queue()
+        workers = [threading.Thread(target=self._worker, args=(work, results), name='Task-%s' % (i + 1))
+                    for i in range(min(self.jobs, len(self.tasks)))]
+        for w in workers:
+            w.daemon = True
+            w.start()
+
+        finished = 0
+        running = 0
+        try:
+            while finished < len(self.tasks):
+                while ready and running < self.jobs:
+                    _, task = heapq.heappop(ready)
+                    task.state = RUNNING
+                    work.put(task)
+                    running += 1
+
+                task, error = results.get()
+                running -= 1
+                task.state, task.error = (FAILED, error) if error else (DONE, None)
+                finished += 1 + self._release(task, waiting, ready)
+        finally:
+            for w in workers:
+                work.put(None)
+            for w in workers:
+                w.join()
+
+        return [t for t in self.tasks if t.state == FAILED]
+
+    def _release(self, task, waiting, ready):
+        """
+        Make dependents of a finished task ready, or cancel them when a task
+        they require did not succeed, returns the number of tasks cancelled.
+        """
+        cancelled = 0
+        finished = [task]
+        while finished:
+            for d in finished.pop().dependents:
+                waiting[d] -= 1
+                if waiting[d]:
+                    continue
+                if d.always or all(r.state == DONE for r in d.requires):
+                    heapq.heappush(ready, (d.index, d))
+                else:
+                    d.state = CANCELLED
+                    cancelled += 1
+                    finished.append(d)
+        return cancelled
+
+    def _worker(self, work, results):
+        while True:
+            task = work.get()
+            if task is None:
+                return
+            try:
+                task.func()
+                results.put((task, None))
+            except Exception, err:
+                results.put((task, err))
@@ -0,0 +1,197 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+# object types with a status log in <submission dir>/.status
+STATUS_OBJECT_TYPES = ('sample', 'experiment', 'run', 'analysis')
+
+# EGA object types created for each submission data type, in submission order
+SUBMISSION_OBJECT_TYPES = {
+    'unaligned': ('sample', 'experiment', 'run'),
+    'alignment': ('sample', 'analysis'),
+    'variation': ('sample', 'analysis')
+}
+
+
+def state_store_file(workspace_path):
+    return os.path.join(workspace_path, '.egasub', 'state.db')
+
+
+def workspace_relpath(path, workspace_path):
+    """ Path relative to the workspace, paths under it are sliced as os.path.relpath is slow """
+    path = os.path.normpath(path)
+    prefix = os.path.normpath(workspace_path).rstrip(os.sep) + os.sep
+    if path.startswith(prefix):
+        return path[len(prefix):]
+    return os.path.relpath(os.path.abspath(path), workspace_path)
+
+
+class StateStore(object):
+    """
+    Status history of the EGA objects of all submission directories of a
+    workspace in one SQLite database, replacing the <dir>/.status/*.log files.
+
+    Every recorded status is kept in 'history', the last one per submission
+    directory and object type also in 'latest' for lookups by primary key.
+    The database runs in WAL mode so that several egasub processes can record
+    statuses while others read them. Existing .status logs of a submission
+    directory are imported the first time the directory is looked up.
+
+    Submission directories are keyed by their path relative to the workspace.
+
+    With read_only, an existing database is opened for reading only: nothing
+    is imported and record() fails, so readers never wait on writers. Lookups
+    of directories not imported yet find nothing, see migrated().
+    """
+    def __init__(self, workspace_path, db_file=None, read_only=False):
+        self.workspace_path = os.path.abspath(workspace_path)
+        self.db_file = db_file or state_store_file(workspace_path)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only and not os.path.isfile(self.db_file):
+            raise IOError("No state store at '%s'" % self.db_file)
+        self._db = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False,
+                                   isolation_level=None)  # transactions are explicit
+        self._db.text_factory = str
+        if read_only:
+            self._db.execute("PRAGMA query_only=ON")
+            self._migrated = set(r[0] for r in self._db.execute("SELECT submission_dir FROM migrated"))
+            return
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                submission_dir TEXT,
+                obj_type TEXT,
+                obj_id TEXT,
+                alias TEXT,
+                status TEXT,
+                recorded_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS history_object ON history (submission_dir, obj_type);
+            CREATE TABLE IF NOT EXISTS latest (
+                submission_dir TEXT,
+                obj_type TEXT,
+                obj_id TEXT,
+                alias TEXT,
+                status TEXT,
+                recorded_at INTEGER,
+                PRIMARY KEY (submission_dir, obj_type)
+            );
+            CREATE TABLE IF NOT EXISTS migrated (
+                submission_dir TEXT PRIMARY KEY
+            );
+        """)
+        self._migrated = set(r[0] for r in self._db.execute("SELECT submission_dir FROM migrated"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _key(self, submission_dir):
+        return workspace_relpath(submission_dir, self.workspace_path)
+
+    def _transaction(self, statements):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, args in statements:
+                self._db.execute(sql, args)
+            self._db.execute("COMMIT")
+        except:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _record_statements(self, key, obj_type, obj_id, alias, status, recorded_at):
+        row = (key, obj_type, obj_id, alias, status, recorded_at)
+        return [
+            ("INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)", row),
+            ("INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?)", row)
+        ]
+
+    def _migrate(self, submission_dir):
+        self._migrate_all([(self._key(submission_dir), submission_dir)])
+
+    def migrated(self, submission_dir):
+        """ Whether the .status logs of submission_dir have been imported """
+        return self._key(submission_dir) in self._migrated
+
+    def _migrate_all(self, keyed_dirs):
+        """ Import the .status logs of the (key, submission dir)s, once, in one transaction """
+        todo = [(key, d) for key, d in keyed_dirs if not key in self._migrated]
+        if not todo or self.read_only:
+            return
+
+        statements = {}
+        for key, submission_dir in todo:
+            statements[key] = []
+            for obj_type in STATUS_OBJECT_TYPES:
+                status_file = os.path.join(submission_dir, '.status', '%s.log' % obj_type)
+                try:
+                    with open(status_file, 'r') as f:
+                        lines = f.readlines()
+                except IOError:
+                    continue
+                for line in lines:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 4:
+                        obj_id, alias, status, recorded_at = fields
+                        statements[key].extend(self._record_statements(key, obj_type, obj_id, alias, status,
+                                                                       int(recorded_at) if recorded_at.isdigit() else None))
+
+        # INSERT OR IGNORE tells whether another process imported them meanwhile
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            for key, _ in todo:
+                if self._db.execute("INSERT OR IGNORE INTO migrated VALUES (?)", (key,)).rowcount:
+                    for sql, args in statements[key]:
+                        self._db.execute(sql, args)
+            self._db.execute("COMMIT")
+        except:
+            self._db.execute("ROLLBACK")
+            raise
+        self._migrated.update(key for key, _ in todo)
+
+    def record(self, submission_dir, obj_type, obj_id, alias, status, recorded_at=None):
+        with self._lock:
+            self._migrate(submission_dir)
+            self._transaction(self._record_statements(self._key(submission_dir), obj_type,
+                                                      str(obj_id), str(alias), str(status),
+                                                      recorded_at or int(time.time())))
+
+    def latest(self, submission_dir, obj_type):
+        """ Last recorded (id, alias, status, timestamp) of an object, None if nothing recorded """
+        with self._lock:
+            self._migrate(submission_dir)
+            return self._db.execute("""SELECT obj_id, alias, status, recorded_at FROM latest
+                                        WHERE submission_dir = ? AND obj_type = ?""",
+                                    (self._key(submission_dir), obj_type)).fetchone()
+
+    def history(self, submission_dir, obj_type):
+        """ All recorded (id, alias, status, timestamp) of an object, oldest first """
+        with self._lock:
+            self._migrate(submission_dir)
+            return self._db.execute("""SELECT obj_id, alias, status, recorded_at FROM history
+                                        WHERE submission_dir = ? AND obj_type = ? ORDER BY rowid""",
+                                    (self._key(submission_dir), obj_type)).fetchall()
+
+    def latest_all(self, submission_dirs):
+        """
+        Last recorded (id, alias, status, timestamp) of all objects of many
+        submission directories at once, returns {submission_dir: {obj_type: ...}}
+        """
+        with self._lock:
+            keys = dict((self._key(d), d) for d in submission_dirs)
+            self._migrate_all(keys.items())
+            latest = dict((d, {}) for d in submission_dirs)
+            for row in self._db.execute("SELECT submission_dir, obj_type, obj_id, alias, status, recorded_at FROM latest"):
+                if row[0] in keys:
+                    latest[keys[row[0]]][row[1]] = row[2:]
+            return latest
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,5 +1,176 @@
+import os
+import re
+import json
 from click import echo
 
+from ..utils import run_parallel
+from .state_store import StateStore, STATUS_OBJECT_TYPES, SUBMISSION_OBJECT_TYPES, workspace_relpath, \
+                         state_store_file
 
-def generate_report(ctx, submission_dirs):
-    echo('Not implemented yet.')
\ No newline at end of file
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+BATCH_DIR_PATTERN = re.compile(r'^(unaligned|alignment|variation)\.')
+
+# status of a submission directory nothing has been submitted from
+NEW_STATUS = 'NEW'
+
+
+def generate_report(ctx, submission_dirs, output_format='table', summary_only=False, jobs=1):
+    """
+    Report the status of each EGA object of the given submission directories,
+    or of all submission directories under the current directory, followed by
+    the number of submission directories per data type and status.
+
+    Statuses come from the workspace state store, opened read-only, or for
+    directories not in it and with the 'state_store' setting off, from the
+    last line of the .status logs. Metadata files are not read.
+    """
+    dirs = find_submission_dirs(ctx, submission_dirs)
+    statuses = _read_statuses(ctx, [path for _, path in dirs], jobs)
+
+    rows = []
+    summary = {}
+    for submission_type, path in dirs:
+        objects = dict((obj_type, statuses[path][obj_type][2] if obj_type in statuses[path] else None)
+                        for obj_type in SUBMISSION_OBJECT_TYPES[submission_type])
+        # the last object submitted tells whether the whole directory has been submitted
+        status = objects[SUBMISSION_OBJECT_TYPES[submission_type][-1]] or NEW_STATUS
+        rows.append({
+            'submission_dir': workspace_relpath(path, ctx.obj['WORKSPACE_PATH']),
+            'type': submission_type,
+            'status': status,
+            'objects': objects
+        })
+        summary.setdefault(submission_type, {})
+        summary[submission_type][status] = summary[submission_type].get(status, 0) + 1
+
+    if output_format == 'json':
+        report = {'summary': summary}
+        if not summary_only:
+            report['submissions'] = rows
+        echo(json.dumps(report, indent=2, sort_keys=True))
+    elif output_format == 'tsv':
+        echo(_format_tsv(rows, summary, summary_only))
+    else:
+        echo(_format_table(rows, summary, summary_only))
+
+    return summary
+
+
+def find_submission_dirs(ctx, submission_dirs=None):
+    """
+    Return (data type, absolute path) of the given submission directories, or
+    when none are given, of all submission directories in the current batch
+    directory or with the workspace as current directory, in all batch directories.
+    """
+    if submission_dirs:
+        paths = [os.path.abspath(d.rstrip('/')) for d in submission_dirs]
+    elif ctx.obj.get('CURRENT_DIR_TYPE'):
+        paths = [os.path.join(ctx.obj['CURRENT_DIR'], d) for d in _subdirs(ctx.obj['CURRENT_DIR'])]
+    else:
+        workspace = ctx.obj['WORKSPACE_PATH']
+        paths = []
+        for batch_dir in _subdirs(workspace):
+            if BATCH_DIR_PATTERN.match(batch_dir):
+                paths.extend(os.path.join(workspace, batch_dir, d) for d in _subdirs(os.path.join(workspace, batch_dir)))
+
+    dirs = []
+    for path in paths:
+        m = BATCH_DIR_PATTERN.match(os.path.basename(os.path.dirname(path)))
+        if m:
+            dirs.append((m.group(1), path))
+        else:
+            ctx.obj['LOGGER'].warning("Skip '%s' as it is not in an unaligned, alignment or variation directory." % path)
+    return dirs
+
+
+def _subdirs(path):
+    """ Sorted names of the subdirectories of path, hidden ones excluded """
+    if scandir:
+        names = [e.name for e in scandir(path) if e.is_dir() and not e.name.startswith('.')]
+    else:
+        names = [n for n in os.listdir(path) if not n.startswith('.') and os.path.isdir(os.path.join(path, n))]
+    return sorted(names)
+
+
+def _read_statuses(ctx, paths, jobs=1):
+    """ Return {path: {obj_type: (id, alias, status, timestamp)}} """
+    statuses = {}
+    # reporting never creates nor writes the store, so it does not get in the way of a running submit
+    if ctx.obj['SETTINGS'].get('state_store', True) and os.path.isfile(state_store_file(ctx.obj['WORKSPACE_PATH'])):
+        with StateStore(ctx.obj['WORKSPACE_PATH'], read_only=True) as store:
+            statuses = store.latest_all([p for p in paths if store.migrated(p)])
+        paths = [p for p in paths if not p in statuses]
+
+    def read(path):
+        statuses = {}
+        for obj_type in STATUS_OBJECT_TYPES:
+            line = _last_line(os.path.join(path, '.status', '%s.log' % obj_type))
+            fields = line.rstrip('\n').split('\t') if line else []
+            if len(fields) == 4:
+                statuses[obj_type] = tuple(fields)
+        return statuses
+
+    statuses.update(zip(paths, run_parallel(read, paths, jobs)))
+    return statuses
+
+
+def _last_line(path, block_size=1024):
+    """ Last line of a file, read from its end, None when the file is missing or empty """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            data = ''
+            while end > 0:
+                start = max(0, end - block_size)
+                f.seek(start)
+                data = f.read(end - start) + data
+                end = start
+                if data.rstrip('\n').count('\n'):
+                    break
+    except IOError:
+        return None
+    lines = data.rstrip('\n').split('\n')
+    return lines[-1] if lines[-1] else None
+
+
+def _format_table(rows, summary, summary_only=False):
+    lines = []
+    if not summary_only:
+        header = ['Submission directory', 'Type', 'Status', 'Objects']
+        table = [header] + [[r['submission_dir'], r['type'], r['status'],
+                             ', '.join('%s: %s' % (t, r['objects'][t] or '-') for t in SUBMISSION_OBJECT_TYPES[r['type']])]
+                            for r in rows]
+        widths = [max(len(row[i]) for row in table) for i in range(len(header) - 1)]
+        for row in table:
+            lines.append('  '.join([c.ljust(w) for c, w in zip(row, widths)] + [row[-1]]))
+        lines.append('')
+
+    lines.append('Summary')
+    for submission_type in sorted(summary):
+        for status in sorted(summary[submission_type]):
+            lines.append('%-10s %-22s %s' % (submission_type, status, summary[submission_type][status]))
+    return '\n'.join(lines)
+
+
+def _format_tsv(rows, summary, summary_only=False):
+    if summary_only:
+        lines = ['type\tstatus\tcount']
+        for submission_type in sorted(summary):
+            for status in sorted(summary[submission_type]):
+                lines.append('%s\t%s\t%s' % (submission_type, status, summary[submission_type][status]))
+        return '\n'.join(lines)
+
+    lines = ['\t'.join(('submission_dir', 'type', 'status') + STATUS_OBJECT_TYPES)]
+    for r in rows:
+        lines.append('\t'.join([r['submission_dir'], r['type'], r['status']] +
+                               [r['objects'].get(t) or '' for t in STATUS_OBJECT_TYPES]))
+    return '\n'.join(lines)
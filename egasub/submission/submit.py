@@ -1,16 +1,35 @@
 import os
 import sys
+from itertools import imap
+from contextlib import closing
 from click import echo, prompt
 
 from ..ega.entities import Study, Submission, SubmissionSubsetData, Dataset
+from ..ega.services.ftp import FtpSession, FtpInventory, EGA_FTP_SERVER
+from ..icgc.services.id_cache import IcgcIdCache
+from ..ega.services.deletion_queue import DeletionQueue, CLEANUP_MODES
+from .icgc_ids import preresolve_icgc_ids, icgc_id_cache_file
 from ..ega.services import login, logout, object_submission, query_by_id, \
-                            prepare_submission, submit_submission
+                            prepare_submission, submit_submission, prefetch_aliases
 from ..exceptions import ImproperlyConfigured, EgaSubmissionError, EgaObjectExistsError, CredentialsError
 from .submittable import Unaligned, Alignment, Variation
 from .submitter import Submitter
+from .checksum import checksum_cache_file
+from .state_store import StateStore, SUBMISSION_OBJECT_TYPES
+from ..checksum import ChecksumCache
+from ..utils import run_parallel, MetadataCache
 
 
-def perform_submission(ctx, submission_dirs, dry_run=True):
+def perform_submission(ctx, submission_dirs, dry_run=True, jobs=1):
+    ctx.obj['JOBS'] = jobs
+
+    try:
+        submitter = Submitter(ctx)
+        cleanup = _cleanup_mode(ctx)
+    except ImproperlyConfigured as error:
+        ctx.obj['LOGGER'].critical(str(error))
+        ctx.abort()
+
     ctx.obj['LOGGER'].info("Login ...")
     
     try:
@@ -20,61 +39,153 @@ def perform_submission(ctx, submission_dirs, dry_run=True):
         ctx.abort()
 
     ctx.obj['LOGGER'].info("Login success")
-    submission = Submission('title', 'a description',SubmissionSubsetData.create_empty())
-    prepare_submission(ctx, submission)
+    checksum_cache = state_store = None
 
-    # get class by string
-    submission_type = ctx.obj['CURRENT_DIR_TYPE']
-    Submittable_class = eval(submission_type.capitalize())
-
-    submittables = []
-    for submission_dir in submission_dirs:
-        submission_dir = submission_dir.rstrip('/')
-        ctx.obj['LOGGER'].info("Start processing '%s'" % submission_dir)
-        try:
-            submittable = Submittable_class(submission_dir)
-        except Exception, err:
-            ctx.obj['LOGGER'].error("Skip '%s' as it appears to be not a well formed submission directory. Error: %s" % (submission_dir, err))
-            continue
-
-        ctx.obj['LOGGER'].info("Perform local validation.")
-        submittable.local_validate(ctx.obj['EGA_ENUMS'])
-
-        try:
-            submittable.ftp_files_remote_validate('ftp.ega.ebi.ac.uk',ctx.obj['SETTINGS']['ega_submitter_account'],ctx.obj['SETTINGS']['ega_submitter_password'])
-        except Exception, e:
-            ctx.obj['LOGGER'].error("FTP file check error, please make sure data files uploaded to the EGA FTP server already.")
-            continue
-
-        for err in submittable.local_validation_errors:
-            ctx.obj['LOGGER'].error("Local validation error(s) for submission dir '%s': %s" % (submittable.submission_dir,err))
-            
-        for err in submittable.ftp_file_validation_errors:
-            ctx.obj['LOGGER'].error("FTP files remote validation error(s) for submission dir '%s': %s" % (submittable.submission_dir,err))
-
-        # only process submittables at certain states and no local
-        # validation error
-        if not submittable.status == 'SUBMITTED' \
-                and not submittable.local_validation_errors:
-            submittables.append(submittable)
-        elif submittable.status == 'SUBMITTED':
-            ctx.obj['LOGGER'].info("Skip '%s' as it has already been submitted." % submittable.submission_dir)
-        else:
-            ctx.obj['LOGGER'].info("Skip '%s' as it failed validation, please check log for details." % submittable.submission_dir)
+    # caches, deletion queue and the login are closed however the submission ends
+    try:
+        submission = Submission('title', 'a description',SubmissionSubsetData.create_empty())
+        # a batch is submitted with its own submission, never one cached by an earlier run
+        prepare_submission(ctx, submission, fresh=submitter.batch and not dry_run)
+
+        # unneeded draft objects are deleted off the submission path
+        if not cleanup == 'inline':
+            ctx.obj['DELETION_QUEUE'] = DeletionQueue(ctx, ctx.obj['SETTINGS'].get('cleanup_jobs', jobs), cleanup)
+
+        submission_type = ctx.obj['CURRENT_DIR_TYPE']
+
+        if ctx.obj['SETTINGS'].get('prefetch_aliases', True):
+            ctx.obj['LOGGER'].info("Loading existing EGA objects ...")
+            prefetch_aliases(ctx, SUBMISSION_OBJECT_TYPES[submission_type],
+                                ctx.obj['SETTINGS'].get('prefetch_page_size', 500), jobs)
+
+        # get class by string
+        Submittable_class = eval(submission_type.capitalize())
+
+        # md5sums of data files hashed by 'egasub checksum' when there is no md5sum file
+        checksum_cache = ChecksumCache(checksum_cache_file(ctx)) if os.path.isfile(checksum_cache_file(ctx)) else None
+
+        # parsed metadata of submission directories unchanged since an earlier run
+        metadata_cache = MetadataCache(os.path.join(ctx.obj['WORKSPACE_PATH'], '.egasub', 'cache')) \
+                            if ctx.obj['SETTINGS'].get('metadata_cache', True) else None
+
+        state_store = _state_store(ctx)
+
+        # ICGC IDs never change once assigned, they are looked up once per workspace
+        if ctx.obj['SETTINGS'].get('icgc_id_cache', True):
+            ctx.obj['ICGC_ID_CACHE'] = IcgcIdCache(icgc_id_cache_file(ctx))
+
+        # one FTP login for all data file checks of the batch
+        with FtpSession(ctx.obj['SETTINGS'].get('ftp_server', EGA_FTP_SERVER),
+                        ctx.obj['SETTINGS']['ega_submitter_account'],
+                        ctx.obj['SETTINGS']['ega_submitter_password']) as ftp_session, \
+             _ftp_inventory(ctx, ftp_session) as ftp:
+            prepare = lambda submission_dir: _prepare_submittable(ctx, Submittable_class, submission_dir,
+                                                                    ftp, checksum_cache, metadata_cache, state_store)
+
+            if submitter.backend == 'pipelined':
+                # directories are loaded and validated while earlier ones are being submitted
+                submittables = (s for s in imap(prepare, submission_dirs) if s)
+            else:
+                submittables = [s for s in run_parallel(prepare, submission_dirs, jobs) if s]
+                # all ICGC IDs are looked up at once, submission never waits on the ID service
+                if ctx.obj.get('ICGC_ID_CACHE'):
+                    submittables = preresolve_icgc_ids(ctx, submittables, jobs)
+
+            # submission directories are independent of each other, objects
+            # within one directory are still submitted in order by the submitter
+            if not submitter.submit_all(submittables, dry_run, jobs):
+                ctx.obj['LOGGER'].warning('Nothing to submit.')
+
+            # with 'batch_submit' validated objects are submitted together with the submission
+            if submitter.batch and not dry_run:
+                submitter.submit_batch(submission)
+    finally:
+        if checksum_cache:
+            checksum_cache.close()
+        if state_store:
+            state_store.close()
+        if ctx.obj.get('ICGC_ID_CACHE'):
+            ctx.obj.pop('ICGC_ID_CACHE').close()
+        if ctx.obj.get('DELETION_QUEUE'):
+            if ctx.obj.pop('DELETION_QUEUE').flush():
+                ctx.obj['LOGGER'].warning("Some unneeded objects could not be deleted, they will be deleted by a later run.")
+
+        ctx.obj['LOGGER'].info("Logging out the session")
+        logout(ctx)
 
-    if not submittables:
-        ctx.obj['LOGGER'].warning('Nothing to submit.')
+
+def _ftp_inventory(ctx, ftp_session):
+    """
+    Data file checks go through a cached listing of remote directories unless
+    disabled by the 'ftp_inventory' setting, then each file is checked by SIZE.
+    """
+    if not ctx.obj['SETTINGS'].get('ftp_inventory', True):
+        return closing(ftp_session)
+
+    return FtpInventory(ftp_session,
+                        os.path.join(ctx.obj['WORKSPACE_PATH'], '.egasub', 'ftp_index.json'),
+                        ctx.obj['SETTINGS'].get('ftp_index_ttl', 3600))
+
+
+def _cleanup_mode(ctx):
+    """ How unneeded draft objects are deleted, by the 'cleanup' setting """
+    mode = ctx.obj['SETTINGS'].get('cleanup', 'background')
+    if not mode in CLEANUP_MODES:
+        raise ImproperlyConfigured("Unknown cleanup '%s', must be one of: %s" % (mode, ', '.join(CLEANUP_MODES)))
+    return mode
+
+
+def _state_store(ctx):
+    """ Workspace status store, None when disabled by the 'state_store' setting to keep using .status logs """
+    if not ctx.obj['SETTINGS'].get('state_store', True):
+        return None
+    return StateStore(ctx.obj['WORKSPACE_PATH'])
+
+
+def _prepare_submittable(ctx, Submittable_class, submission_dir, ftp, checksum_cache=None, metadata_cache=None,
+                            state_store=None):
+    """
+    Load and validate one submission directory, returns the submittable when it
+    is ready to be submitted, None otherwise.
+    """
+    submission_dir = submission_dir.rstrip('/')
+    ctx.obj['LOGGER'].info("Start processing '%s'" % submission_dir)
+    try:
+        submittable = Submittable_class(submission_dir, checksum_cache=checksum_cache,
+                                        metadata_cache=metadata_cache, state_store=state_store)
+    except Exception, err:
+        ctx.obj['LOGGER'].error("Skip '%s' as it appears to be not a well formed submission directory. Error: %s" % (submission_dir, err))
+        return
+
+    ctx.obj['LOGGER'].info("Perform local validation.")
+    submittable.local_validate(ctx.obj['EGA_ENUMS'])
+
+    try:
+        submittable.ftp_files_remote_validate(ftp)
+    except Exception, e:
+        ctx.obj['LOGGER'].error("FTP file check error, please make sure data files uploaded to the EGA FTP server already.")
+        return
+
+    for err in submittable.local_validation_errors:
+        ctx.obj['LOGGER'].error("Local validation error(s) for submission dir '%s': %s" % (submittable.submission_dir,err))
+        
+    for err in submittable.ftp_file_validation_errors:
+        ctx.obj['LOGGER'].error("FTP files remote validation error(s) for submission dir '%s': %s" % (submittable.submission_dir,err))
+
+    # only process submittables at certain states and no local
+    # or FTP file validation error. Directories with data files missing on
+    # the FTP server used to be skipped only because ftp.size() raised for
+    # them above; file_exists() now reports them as validation errors instead
+    if not submittable.status == 'SUBMITTED' \
+            and not submittable.local_validation_errors \
+            and not submittable.ftp_file_validation_errors:
+        return submittable
+    elif submittable.status == 'SUBMITTED':
+        ctx.obj['LOGGER'].info("Skip '%s' as it has already been submitted." % submittable.submission_dir)
     else:
-        submitter = Submitter(ctx)
-        for submittable in submittables:
-            submitter.submit(submittable, dry_run)
+        ctx.obj['LOGGER'].info("Skip '%s' as it failed validation, please check log for details." % submittable.submission_dir)
 
-    # TODO: submit submission, do we need this?
 
-    ctx.obj['LOGGER'].info("Logging out the session")
-    logout(ctx)
-    
-    
 def submit_dataset(ctx, dry_run=True):
     ctx.obj['LOGGER'].info("Login ...")
     
@@ -84,23 +195,30 @@ def submit_dataset(ctx, dry_run=True):
         ctx.obj['LOGGER'].critical(str(error))
         ctx.abort()
         
-    dataset_types = ctx.obj['EGA_ENUMS'].__dict__['_enums']['dataset_types']['response']['result']
+    dataset_types = ctx.obj['EGA_ENUMS'].lookup('dataset_types')
     ids = [dataset['tag'] for dataset in dataset_types]
     values = [dataset['value'] for dataset in dataset_types]
     
     policy_id = ctx.obj['SETTINGS']['ega_policy_id']
     
+    state_store = _state_store(ctx)
     run_references = []
     not_submitted = []
     for sub_folder in os.listdir(ctx.obj['CURRENT_DIR']):
         sub_folder_path = os.path.join(ctx.obj['CURRENT_DIR'],sub_folder)
-        run_file_log = os.path.join(sub_folder_path,'.status','run.log')
-        status = submittable_status(run_file_log)
+        if state_store:
+            status = state_store.latest(sub_folder_path, 'run') or [None, None, None, None]
+        else:
+            run_file_log = os.path.join(sub_folder_path,'.status','run.log')
+            status = submittable_status(run_file_log)
         if status[2] == 'SUBMITTED':
             run_references.append(status[1])  # 1 is alias, 0 is id
         else:
             not_submitted.append(sub_folder)
 
+    if state_store:
+        state_store.close()
+
     if not_submitted:
         ctx.obj['LOGGER'].error("These samples have not been submitted yet: %s" % ','.join(not_submitted))
         logout(ctx)
@@ -1,18 +1,21 @@
 import os
 import re
-import yaml
 import time
+import threading
 from click import echo
 from abc import ABCMeta, abstractmethod, abstractproperty
 
 from egasub.exceptions import Md5sumFileError
+from egasub.utils import load_yaml
 from egasub.ega.entities import Sample, Attribute, \
                                 File as EFile, \
                                 Analysis as EAnalysis, \
                                 Experiment as EExperiment
-from egasub.ega.services.ftp import file_exists
 
 
+# status files may be written by several submission workers at once
+_status_lock = threading.Lock()
+
 
 def _get_md5sum(md5sum_file):
     try:
@@ -73,8 +76,11 @@ class Submittable(object):
     def _parse_meta(self):
         yaml_file = os.path.join(self.path, '.'.join([self.type, 'yaml']))
         try:
-            with open(yaml_file, 'r') as yaml_stream:
-                self._metadata = yaml.load(yaml_stream)
+            if self._metadata_cache:
+                self._metadata = self._metadata_cache.load(yaml_file)
+            else:
+                with open(yaml_file, 'r') as yaml_stream:
+                    self._metadata = load_yaml(yaml_stream)
 
             # some basic validation of the YAML
             if self.type == 'experiment':
@@ -102,28 +108,43 @@ class Submittable(object):
                 # echo('Skip file entry without fileName specified.')  # for debug
                 continue
             data_file_name = os.path.basename(f.get('fileName'))
-            md5sum_file = os.path.join(self.path, data_file_name + '.md5')
             f['checksumMethod'] = 'md5'
-            f['checksum'] = _get_md5sum(md5sum_file)
-            f['checksum'] = _get_md5sum(md5sum_file)
+            f['checksum'] = self._get_md5sum(os.path.join(self.path, data_file_name))
+
+            unencrypt_data_file_name = re.sub(r'\.gpg$', '', data_file_name)
+            f['unencryptedChecksum'] = self._get_md5sum(os.path.join(self.path, unencrypt_data_file_name))
 
-            unencrypt_md5sum_file = os.path.join(self.path, re.sub(r'\.gpg$', '', data_file_name) + '.md5')
-            f['unencryptedChecksum'] = _get_md5sum(unencrypt_md5sum_file)
+    def _get_md5sum(self, data_file):
+        """
+        md5sum of a data file from its md5sum file, falls back to the workspace
+        checksum cache when there is no md5sum file but the data file has been hashed
+        """
+        md5sum_file = data_file + '.md5'
+        if self._checksum_cache and not os.path.isfile(md5sum_file):
+            checksum = self._checksum_cache.get(data_file)
+            if checksum:
+                return checksum
+        return _get_md5sum(md5sum_file)
 
     @abstractmethod
     def local_validate(self):
         pass
     
-    @abstractmethod
-    def ftp_files_remote_validate(self):
-        pass
-
     def restore_latest_object_status(self, obj_type):
         if not obj_type in ('sample', 'analysis', 'experiment', 'run'):
             return
 
         obj = getattr(self, obj_type)
 
+        if self._state_store:
+            latest = self._state_store.latest(self.path, obj_type)
+            if latest:
+                id_, alias, status, timestamp = latest
+                if not obj.alias or obj.alias == alias:  # status of a changed alias is ignored, as below
+                    obj.alias = alias
+                    obj.status = status
+            return
+
         status_file = os.path.join(self.path, '.status', '%s.log' % obj_type)
 
         try:
@@ -144,17 +165,23 @@ class Submittable(object):
         if not obj_type in ('sample', 'analysis', 'experiment', 'run'):
             return
 
-        status_dir = os.path.join(self.path, '.status')
+        obj = getattr(self, obj_type)
 
-        if not os.path.exists(status_dir):
-            os.makedirs(status_dir)
+        if self._state_store:
+            self._state_store.record(self.path, obj_type, obj.id, obj.alias, obj.status)
+            return
 
+        status_dir = os.path.join(self.path, '.status')
         status_file = os.path.join(status_dir, '%s.log' % obj_type)
 
-        obj = getattr(self, obj_type)
+        line = "%s\n" % '\t'.join([str(obj.id), str(obj.alias), str(obj.status), str(int(time.time()))])
+
+        with _status_lock:
+            if not os.path.exists(status_dir):
+                os.makedirs(status_dir)
 
-        with open(status_file, 'a') as f:
-            f.write("%s\n" % '\t'.join([str(obj.id), str(obj.alias), str(obj.status), str(int(time.time()))]))
+            with open(status_file, 'a') as f:
+                f.write(line)
 
     def local_validate(self, ega_enums):
         # Alias validation
@@ -166,11 +193,11 @@ class Submittable(object):
             self._add_local_validation_error("sample",self.sample.alias,"subjectId","Invalid value, sample's subjectId must be set.")
 
         # Gender validation
-        if not any(gender['tag'] == str(self.sample.gender_id) for gender in ega_enums.lookup("genders")):
+        if not ega_enums.has_tag("genders", self.sample.gender_id):
             self._add_local_validation_error("sample",self.sample.alias,"gender","Invalid value '%s'" % self.sample.gender_id)
 
         # Case or control validation
-        if not any(cc['tag'] == str(self.sample.case_or_control_id) for cc in ega_enums.lookup("case_control")):
+        if not ega_enums.has_tag("case_control", self.sample.case_or_control_id):
             self._add_local_validation_error("sample",self.sample.alias,"caseOrControl","Invalid value '%s'" % self.sample.case_or_control_id)
 
         # phenotype validation
@@ -178,9 +205,10 @@ class Submittable(object):
             self._add_local_validation_error("sample",self.sample.phenotype,"phenotype","Invalid value, sample's phenotype must be set.")
 
 
-    def ftp_files_remote_validate(self,host,username, password):
-        for _file in self._analysis.files:
-            if not file_exists(host,username,password,_file.file_name):
+    def ftp_files_remote_validate(self, ftp):
+        """ Check data files exist on the EGA FTP server, ftp is an open FtpSession """
+        for _file in self.files:
+            if not ftp.file_exists(_file.file_name):
                 self._add_ftp_file_validation_error("fileName","File missing on FTP ega server: %s" % _file.file_name)
 
 
@@ -202,35 +230,38 @@ class Experiment(Submittable):
         super(Experiment, self).local_validate(ega_enums)
 
         # Instrument model validation
-        if not any(model['tag'] == str(self.experiment.instrument_model_id) for model in ega_enums.lookup("instrument_models")):
+        if not ega_enums.has_tag("instrument_models", self.experiment.instrument_model_id):
             self._add_local_validation_error("experiment",self.experiment.alias,"instrumentModel","Invalid value '%s'" % self.experiment.instrument_model_id)
 
         # Library source validation
-        if not any(source['tag'] == str(self.experiment.library_source_id) for source in ega_enums.lookup("library_sources")):
+        if not ega_enums.has_tag("library_sources", self.experiment.library_source_id):
             self._add_local_validation_error("experiment",self.experiment.alias,"librarySources","Invalid value '%s'" % self.experiment.library_source_id)
 
         # Library selection validation
-        if not any(selection['tag'] == str(self.experiment.library_selection_id) for selection in ega_enums.lookup("library_selections")):
+        if not ega_enums.has_tag("library_selections", self.experiment.library_selection_id):
             self._add_local_validation_error("experiment",self.experiment.alias,"librarySelection","Invalid value '%s'" % self.experiment.library_selection_id)
 
         # Library strategy validation
-        if not any(strategy['tag'] == str(self.experiment.library_strategy_id) for strategy in ega_enums.lookup("library_strategies")):
+        if not ega_enums.has_tag("library_strategies", self.experiment.library_strategy_id):
             self._add_local_validation_error("experiment",self.experiment.alias,"libraryStrategies","Invalid value '%s'" % self.experiment.library_strategy_id)
 
         # Library layout validation
-        if not any(layout['tag'] == str(self.experiment.library_layout_id) for layout in ega_enums.lookup("library_layouts")):
+        if not ega_enums.has_tag("library_layouts", self.experiment.library_layout_id):
             self._add_local_validation_error("experiment",self.experiment.alias,"libraryLayoutId","Invalid value '%s'" % self.experiment.library_layout_id)
 
         # Run file type validation
-        if not any(file_type['tag'] == str(self.run.run_file_type_id) for file_type in ega_enums.lookup("file_types")):
+        if not ega_enums.has_tag("file_types", self.run.run_file_type_id):
             self._add_local_validation_error("run",self.run.alias,"runFileTypeId","Invalid value '%s'" % self.run.run_file_type_id)
 
 
 class Analysis(Submittable):
-    def __init__(self, path):
+    def __init__(self, path, checksum_cache=None, metadata_cache=None, state_store=None):
         self._local_validation_errors = []
         self._ftp_file_validation_errors = []
         self._path = path
+        self._checksum_cache = checksum_cache
+        self._metadata_cache = metadata_cache
+        self._state_store = state_store
 
         try:
             self._parse_meta()
@@ -277,7 +308,7 @@ class Analysis(Submittable):
     def local_validate(self, ega_enums):
         super(Analysis, self).local_validate(ega_enums)
         # Reference genomes type validation
-        if not any(cc['tag'] == str(self.analysis.genome_id) for cc in ega_enums.lookup("reference_genomes")):
+        if not ega_enums.has_tag("reference_genomes", self.analysis.genome_id):
             self._add_local_validation_error("analysis",self.analysis.alias,"referenceGenomes","Invalid value '%s'" % self.analysis.genome_id)
 
         # experimentTypeId type validation
@@ -285,7 +316,7 @@ class Analysis(Submittable):
             self._add_local_validation_error("analysis",self.analysis.alias,"experimentTypes","Invalid value: experimentTypeId must be a list.")
 
         for e_type in self.analysis.experiment_type_id:
-            if not any(cc['tag'] == str(e_type) for cc in ega_enums.lookup("experiment_types")):
+            if not ega_enums.has_tag("experiment_types", e_type):
                 self._add_local_validation_error("analysis",self.analysis.alias,"experimentTypes","Invalid value '%s' in experimentTypeId" % e_type)
 
         # Chromosome references validation
@@ -293,6 +324,6 @@ class Analysis(Submittable):
             self._add_local_validation_error("analysis",self.analysis.alias,"chromosomeReferences","Invalid value: chromosomeReferences must be a list.")
 
         for chr_ref in self.analysis.chromosome_references:
-            if not any(cc['tag'] == str(chr_ref.value) for cc in ega_enums.lookup("reference_chromosomes")):
+            if not ega_enums.has_tag("reference_chromosomes", chr_ref.value):
                 self._add_local_validation_error("analysis",self.analysis.alias,"chromosomeReferences","Invalid value '%s' in chromosomeReferences" % chr_ref.value)
 
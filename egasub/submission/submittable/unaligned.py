@@ -3,14 +3,16 @@ from egasub.ega.entities import Sample, \
                                 Run as ERun, \
                                 File as EFile, \
                                 Experiment as EExperiment
-from egasub.ega.services.ftp import file_exists
 
 
 class Unaligned(Experiment):
-    def __init__(self, path):
+    def __init__(self, path, checksum_cache=None, metadata_cache=None, state_store=None):
         self._local_validation_errors = []
         self._ftp_file_validation_errors = []
         self._path = path
+        self._checksum_cache = checksum_cache
+        self._metadata_cache = metadata_cache
+        self._state_store = state_store
 
         try:
             self._parse_meta()
@@ -42,8 +44,3 @@ class Unaligned(Experiment):
     @property
     def type(self):
         return self.__class__.__bases__[0].__name__.lower()
-
-    def ftp_files_remote_validate(self,host,username, password):
-        for _file in self._run.files:
-            if not file_exists(host,username,password,_file.file_name):
-                self._add_ftp_file_validation_error("fileName","File missing on FTP ega server: %s" % _file.file_name)
\ No newline at end of file
@@ -1,57 +1,125 @@
+import threading
+from functools import partial
 from click import echo
 
-from ..icgc.services import id_service
-from ..ega.services import login, logout, object_submission, delete_obj
-from ..ega.entities import Attribute, SampleReference
+from ..ega.services import login, logout, object_submission, object_registration, object_completion, \
+                            delete_obj, submit_submission, submitted_object
+from ..ega.services.deletion_queue import deletion_chain
+from ..ega.services.xml_dropbox import XmlBatchWriter, xml_submission
+from ..ega.entities import Attribute, SampleReference, SubmissionSubsetData
+from ..exceptions import ImproperlyConfigured
+from ..utils import run_parallel, run_pipelined
+from .scheduler import DagScheduler, FAILED
+from .state_store import SUBMISSION_OBJECT_TYPES
+from .icgc_ids import submission_icgc_id
+
+
+SUBMISSION_BACKENDS = ('threaded', 'pipelined', 'dag', 'xml')
+
+# submission directories sent per XML drop-box request
+DEFAULT_XML_BATCH_SIZE = 1000
+
+# objects whose ids an object refers to
+OBJECT_REFERENCES = {
+    'sample': (),
+    'experiment': ('sample',),
+    'run': ('sample', 'experiment'),
+    'analysis': ('sample',)
+}
 
 
 class Submitter(object):
     def __init__(self, ctx):
         self.ctx = ctx
+        self.backend = ctx.obj['SETTINGS'].get('submission_backend', 'threaded')
+        if not self.backend in SUBMISSION_BACKENDS:
+            raise ImproperlyConfigured("Unknown submission_backend '%s', must be one of: %s" % \
+                                            (self.backend, ', '.join(SUBMISSION_BACKENDS)))
+        self.two_phase = ctx.obj['SETTINGS'].get('two_phase_submission', True)
+        self.batch = ctx.obj['SETTINGS'].get('batch_submit', False)
+        self._held = None  # (submittable, deletions) of directories waiting for submit_batch()
+        self._held_lock = threading.Lock()
 
-    def submit(self, submittable, dry_run=True):
-        if self.ctx.obj['CURRENT_DIR_TYPE'] == 'unaligned':
-            self.ctx.obj['LOGGER'].info("Processing '%s'" % submittable.sample.alias)
+    def submit_all(self, submittables, dry_run=True, jobs=1):
+        """
+        Submit submittables with up to 'jobs' directories in flight, returns the
+        number of submittables processed. The 'pipelined' backend consumes
+        submittables lazily, so they may still be produced while submission runs.
+        The 'dag' backend has up to 'jobs' objects in flight instead, of any directories.
 
-            try:
-                self.set_icgc_ids(submittable.sample)
-                object_submission(self.ctx, submittable.sample, 'sample', dry_run)
-                submittable.record_object_status('sample')
+        With 'batch_submit' objects are validated and left for submit_batch().
+        The 'xml' backend sends the objects of many directories in one request.
+        """
+        if self.backend == 'xml':
+            submittables = list(submittables)
+            self.submit_xml(submittables, dry_run, jobs)
+            return len(submittables)
 
-                submittable.experiment.sample_id = submittable.sample.id
-                submittable.experiment.study_id = self.ctx.obj['SETTINGS']['ega_study_id']
+        if self.batch and not dry_run:
+            # objects are only validated here, submit_batch() submits them all at once
+            self._held = []
+            dry_run = True
 
-                object_submission(self.ctx, submittable.experiment, 'experiment', dry_run)
-                submittable.record_object_status('experiment')
+        submit = lambda submittable: self.submit(submittable, dry_run)
 
-                submittable.run.sample_id = submittable.sample.id
-                submittable.run.experiment_id = submittable.experiment.id
+        if self.backend == 'pipelined':
+            return run_pipelined(submit, submittables, jobs,
+                                    self.ctx.obj['SETTINGS'].get('submission_queue_size'))
 
-                object_submission(self.ctx, submittable.run, 'run', dry_run)
-                submittable.record_object_status('run')
+        submittables = list(submittables)
+        if self.backend == 'dag':
+            self.submit_graph(submittables, dry_run, jobs)
+        else:
+            run_parallel(submit, submittables, jobs)
+        return len(submittables)
 
-                self.ctx.obj['LOGGER'].info('Finished processing %s' % submittable.sample.alias)
-            except Exception as error:
-                self.ctx.obj['LOGGER'].error('Failed processing %s: %s' % (submittable.sample.alias, error))
+    def submit(self, submittable, dry_run=True):
+        if self.ctx.obj['CURRENT_DIR_TYPE'] == 'unaligned':
+            self.ctx.obj['LOGGER'].info("Processing '%s'" % submittable.sample.alias)
 
-            # now remove all created object that is not in SUBMITTED status
-            self.ctx.obj['LOGGER'].info('Clean up unneeded objects ...')
-            if not submittable.sample.status == 'SUBMITTED' and submittable.sample.id:
-                delete_obj(self.ctx, 'sample', submittable.sample.id)
+        if self.two_phase:
+            # objects of the directory are validated, or submitted, concurrently
+            scheduler = DagScheduler(len(SUBMISSION_OBJECT_TYPES[self.ctx.obj['CURRENT_DIR_TYPE']]))
+            self._add_steps(scheduler, submittable, dry_run)
+            scheduler.run()
+            return
 
-            if not submittable.run.status == 'SUBMITTED' and submittable.run.id:  # need to delete run before experiment
-                delete_obj(self.ctx, 'run', submittable.run.id)
+        # objects left unsubmitted and, with a deletion queue, stale drafts found
+        # on the way, deleted once the directory is done
+        deletions = []
+        try:
+            for _, step, _ in self.steps(submittable, dry_run, self._stale(deletions)):
+                step()
+            self.ctx.obj['LOGGER'].info('Finished processing %s' % submittable.sample.alias)
+        except Exception as error:
+            self.ctx.obj['LOGGER'].error('Failed processing %s: %s' % (submittable.sample.alias, error))
 
-            if not submittable.experiment.status == 'SUBMITTED' and submittable.experiment.id:
-                delete_obj(self.ctx, 'experiment', submittable.experiment.id)
+        self.finish(submittable, deletions)
 
+    def steps(self, submittable, dry_run=True, stale=None):
+        """
+        Steps submitting the objects of a submittable as (name, function, names
+        of the steps it depends on) in order, a step depends on the steps
+        setting the object ids it refers to.
 
-        if self.ctx.obj['CURRENT_DIR_TYPE'] in ('alignment', 'variation'):
-            try:
-                self.set_icgc_ids(submittable.sample)
-                object_submission(self.ctx, submittable.sample, 'sample', dry_run)
-                submittable.record_object_status('sample')
+        Each object is registered and validated, or submitted, by a step named
+        after its type. In two phases, 'register_<type>' steps register each
+        object as soon as the objects it refers to have an id, and '<type>'
+        steps validate each object as soon as it is registered, or submit it
+        once the objects it refers to are submitted as EGA only takes
+        references to submitted objects. Validations overlap each other and
+        the remaining registrations.
+        """
+        registered = {}
 
+        def set_references(obj_type):
+            if obj_type == 'experiment':
+                submittable.experiment.sample_id = submittable.sample.id
+                submittable.experiment.study_id = self.ctx.obj['SETTINGS']['ega_study_id']
+            elif obj_type == 'run':
+                submittable.run.sample_id = submittable.sample.id
+                submittable.run.experiment_id = submittable.experiment.id
+            elif obj_type == 'analysis':
                 submittable.analysis.study_id = self.ctx.obj['SETTINGS']['ega_study_id']
                 submittable.analysis.sample_references = [
                                                             SampleReference(
@@ -59,45 +127,250 @@ class Submitter(object):
                                                                     submittable.sample.alias
                                                                 )
                                                             ]
-                object_submission(self.ctx, submittable.analysis, 'analysis', dry_run)
-                submittable.record_object_status('analysis')
 
+        def submit_obj(obj_type):
+            set_references(obj_type)
+            object_submission(self.ctx, getattr(submittable, obj_type), obj_type, dry_run, stale)
+            submittable.record_object_status(obj_type)
+
+        def register_obj(obj_type):
+            set_references(obj_type)
+            registered[obj_type] = object_registration(self.ctx, getattr(submittable, obj_type), obj_type, stale)
+            if not registered[obj_type]:  # submitted already
+                submittable.record_object_status(obj_type)
+
+        def complete_obj(obj_type):
+            if registered[obj_type]:
+                object_completion(self.ctx, getattr(submittable, obj_type), obj_type, dry_run)
+                submittable.record_object_status(obj_type)
+
+        obj_types = SUBMISSION_OBJECT_TYPES[self.ctx.obj['CURRENT_DIR_TYPE']]
+        steps = [('icgc_ids', lambda: self.set_icgc_ids(submittable.sample), ())]
+        if not self.two_phase:
+            for obj_type in obj_types:
+                steps.append((obj_type, partial(submit_obj, obj_type), OBJECT_REFERENCES[obj_type] or ('icgc_ids',)))
+            return steps
+
+        for obj_type in obj_types:
+            steps.append(('register_%s' % obj_type, partial(register_obj, obj_type),
+                          tuple('register_%s' % r for r in OBJECT_REFERENCES[obj_type]) or ('icgc_ids',)))
+        for obj_type in obj_types:
+            steps.append((obj_type, partial(complete_obj, obj_type),
+                          ('register_%s' % obj_type,) + (() if dry_run else OBJECT_REFERENCES[obj_type])))
+        return steps
+
+    def submit_graph(self, submittables, dry_run=True, jobs=1):
+        """
+        Submit the steps of all submittables as one dependency graph, a step runs
+        as soon as the objects it refers to are submitted, whichever directory
+        the other steps belong to. A failed step cancels only the steps depending on it.
+        """
+        scheduler = DagScheduler(jobs)
+        for submittable in submittables:
+            self._add_steps(scheduler, submittable, dry_run)
+        scheduler.run()
+
+    def _add_steps(self, scheduler, submittable, dry_run):
+        deletions = []
+        tasks = []
+        by_name = {}
+        for name, step, requires in self.steps(submittable, dry_run, self._stale(deletions)):
+            task = scheduler.add('%s %s' % (submittable.submission_dir, name), step,
+                                    [by_name[r] for r in requires])
+            by_name[name] = task
+            tasks.append(task)
+
+        def finish():
+            failed = [t for t in tasks if t.state == FAILED]
+            if failed:
+                self.ctx.obj['LOGGER'].error('Failed processing %s: %s' % (submittable.sample.alias, failed[0].error))
+            else:
                 self.ctx.obj['LOGGER'].info('Finished processing %s' % submittable.sample.alias)
+            self.finish(submittable, deletions)
+
+        scheduler.add('%s finish' % submittable.submission_dir, finish, tasks, always=True)
+
+    def _stale(self, deletions):
+        """ Stale drafts go with the other deletions when there is a deletion queue, otherwise they are deleted right away """
+        return deletions if self.ctx.obj.get('DELETION_QUEUE') else None
+
+    def submit_batch(self, submission):
+        """
+        Submit the objects validated by submit_all() in the 'batch_submit' mode
+        with one SUBMIT of the whole submission, records the statuses EGA
+        reports back and cleans up as after submitting object by object. Only
+        directories whose objects are all validated are submitted.
+        """
+        with self._held_lock:
+            held, self._held = self._held or [], None
+
+        obj_types = SUBMISSION_OBJECT_TYPES[self.ctx.obj['CURRENT_DIR_TYPE']]
+        ready = [s for s, _ in held
+                    if all(getattr(s, t).status in ('VALIDATED', 'SUBMITTED') for t in obj_types)]
+
+        subset = SubmissionSubsetData.create_empty()
+        for obj_type in obj_types:
+            setattr(subset, '%s_ids' % obj_type,
+                    [getattr(s, obj_type).id for s in ready if getattr(s, obj_type).status == 'VALIDATED'])
+        submission.submission_subset = subset
+
+        count = sum(len(getattr(subset, '%s_ids' % t)) for t in obj_types)
+        if count:
+            self.ctx.obj['LOGGER'].info("Submitting %s object(s) of %s submission dir(s) at once ..." % (count, len(ready)))
+            try:
+                statuses = submit_submission(self.ctx, submission)
             except Exception as error:
-                self.ctx.obj['LOGGER'].error('Failed processing %s: %s' % (submittable.sample.alias, str(error)))
+                self.ctx.obj['LOGGER'].error('Failed submitting the submission: %s' % error)
+                statuses = {}
+
+            for submittable in ready:
+                for obj_type in obj_types:
+                    obj = getattr(submittable, obj_type)
+                    if obj.id in statuses and not obj.status == statuses[obj.id]:
+                        obj.status = statuses[obj.id]
+                        submittable.record_object_status(obj_type)
+                if all(getattr(submittable, t).status == 'SUBMITTED' for t in obj_types):
+                    self.ctx.obj['LOGGER'].info('Finished submitting %s' % submittable.sample.alias)
+                else:
+                    self.ctx.obj['LOGGER'].error('Failed submitting %s' % submittable.sample.alias)
+
+        for submittable, deletions in held:
+            self.finish(submittable, deletions)
+
+    def submit_xml(self, submittables, dry_run=True, jobs=1):
+        """
+        Validate, or submit, the objects of submittables through the XML drop-box,
+        'xml_batch_size' directories per request and up to 'jobs' requests at a
+        time. Objects submitted already are referred to and not sent again.
+        """
+        size = self.ctx.obj['SETTINGS'].get('xml_batch_size', DEFAULT_XML_BATCH_SIZE)
+        batches = [submittables[i:i + size] for i in xrange(0, len(submittables), size)]
+        run_parallel(lambda batch: self._submit_xml_batch(batch, dry_run), batches, jobs)
+
+    def _submit_xml_batch(self, submittables, dry_run=True):
+        obj_types = SUBMISSION_OBJECT_TYPES[self.ctx.obj['CURRENT_DIR_TYPE']]
+        sent = []
+        with XmlBatchWriter(self.ctx.obj.get('EGA_ENUMS')) as batch:
+            for submittable in submittables:
+                accessions = {}
+                try:
+                    self.set_icgc_ids(submittable.sample)
+                    for obj_type in obj_types:
+                        obj = getattr(submittable, obj_type)
+                        obj.alias = obj.alias or '%s_%s' % (submittable.sample.alias, obj_type)
+                        accessions[obj_type] = self._submitted_accession(obj_type, obj)
+                except Exception as error:
+                    self.ctx.obj['LOGGER'].error('Failed processing %s: %s' % (submittable.sample.alias, error))
+                    continue
+
+                sent_types = []
+                for obj_type in obj_types:
+                    obj = getattr(submittable, obj_type)
+                    if accessions[obj_type]:
+                        submittable.record_object_status(obj_type)
+                        continue
+                    # objects of the batch have no accession yet, they are referred to by alias
+                    obj.id = None
+                    sent_types.append(obj_type)
+                self._set_xml_references(submittable, accessions)
+                # serialized right away, only the documents on disk grow with the batch
+                for obj_type in sent_types:
+                    batch.add(obj_type, getattr(submittable, obj_type))
+                sent.append((submittable, sent_types))
+
+            if not batch.counts:
+                return
+
+            try:
+                receipt = xml_submission(self.ctx, batch, dry_run)
+            except Exception as error:
+                self.ctx.obj['LOGGER'].error('Failed processing %s submission dir(s) through the XML drop-box: %s' % \
+                                                (len(sent), error))
+                return
+
+        for message in receipt.errors:
+            self.ctx.obj['LOGGER'].error('XML drop-box: %s' % message)
+
+        for submittable, sent_types in sent:
+            for obj_type in sent_types:
+                obj = getattr(submittable, obj_type)
+                accession = receipt.accession(obj_type, obj.alias)
+                if receipt.success and (accession or dry_run):
+                    # the drop-box gives accessions only, obj.id is left for the REST id
+                    obj.status = 'VALIDATED' if dry_run else 'SUBMITTED'
+                    submittable.record_object_status(obj_type)
+                    if accession:
+                        self.ctx.obj['LOGGER'].info('%s %s: %s' % (obj_type.capitalize(), obj.alias, accession))
+
+            if receipt.success:
+                self.ctx.obj['LOGGER'].info('Finished processing %s' % submittable.sample.alias)
+            else:
+                self.ctx.obj['LOGGER'].error('Failed processing %s, see the XML drop-box errors' % submittable.sample.alias)
+
+    def _submitted_accession(self, obj_type, obj):
+        """
+        EGA accession of obj when it has been submitted already, None otherwise.
+        obj takes the REST id and status of the submitted object.
+        """
+        record = submitted_object(self.ctx, obj_type, obj)
+        if record is None:
+            return None
+        obj.id, obj.status = record.get('id'), record.get('status')
+        if not record.get('egaAccessionId'):
+            raise Exception("%s '%s' has been submitted but has no EGA accession to refer to yet" % (obj_type, obj.alias))
+        return record['egaAccessionId']
+
+    def _set_xml_references(self, submittable, accessions):
+        """ References by accession to submitted objects, by alias to objects sent along """
+        ref = lambda obj_type: accessions.get(obj_type) or getattr(submittable, obj_type).alias
+        study_id = self.ctx.obj['SETTINGS']['ega_study_id']
+
+        if self.ctx.obj['CURRENT_DIR_TYPE'] == 'unaligned':
+            submittable.experiment.sample_id = ref('sample')
+            submittable.experiment.study_id = study_id
+            submittable.run.sample_id = ref('sample')
+            submittable.run.experiment_id = ref('experiment')
+        else:
+            submittable.analysis.study_id = study_id
+            submittable.analysis.sample_references = [SampleReference(ref('sample'), submittable.sample.alias)]
+
+    def finish(self, submittable, deletions):
+        with self._held_lock:
+            if self._held is not None:  # objects are still to be submitted by submit_batch()
+                self._held.append((submittable, deletions))
+                return
+
+        # now remove all created object that is not in SUBMITTED status
+        for obj_type in SUBMISSION_OBJECT_TYPES[self.ctx.obj['CURRENT_DIR_TYPE']]:
+            obj = getattr(submittable, obj_type)
+            if not obj.status == 'SUBMITTED' and obj.id:
+                deletions.append((obj_type, obj.id))
 
-            # now remove all created object that is not in SUBMITTED status
-            self.ctx.obj['LOGGER'].info('Clean up unneeded objects ...')
-            if not submittable.sample.status == 'SUBMITTED' and submittable.sample.id:
-                delete_obj(self.ctx, 'sample', submittable.sample.id)
+        self.clean_up(deletions)
 
-            if not submittable.analysis.status == 'SUBMITTED' and submittable.analysis.id:
-                delete_obj(self.ctx, 'analysis', submittable.analysis.id)
+    def clean_up(self, deletions):
+        """
+        Delete unneeded objects of one submission directory, through the
+        run's deletion queue when there is one, otherwise right away.
+        """
+        if not deletions:
+            return
+        self.ctx.obj['LOGGER'].info('Clean up unneeded objects ...')
+        queue = self.ctx.obj.get('DELETION_QUEUE')
+        if queue:
+            queue.delete(deletions)
+        else:
+            for obj_type, obj_id in deletion_chain(deletions):
+                delete_obj(self.ctx, obj_type, obj_id)
 
 
     def set_icgc_ids(self, sample):
         sample.attributes.append(
-                Attribute(
-                    'icgc_sample_id',
-                    id_service(
-                        self.ctx, 'sample',
-                        self.ctx.obj['SETTINGS']['icgc_project_code'],
-                        sample.alias,
-                        True,True
-                    )
-                )
+                Attribute('icgc_sample_id', submission_icgc_id(self.ctx, 'sample', sample.alias))
             )
 
         sample.attributes.append(
-                Attribute(
-                    'icgc_donor_id',
-                    id_service(
-                        self.ctx, 'donor',
-                        self.ctx.obj['SETTINGS']['icgc_project_code'],
-                        sample.subject_id,
-                        True,True
-                    )
-                )
+                Attribute('icgc_donor_id', submission_icgc_id(self.ctx, 'donor', sample.subject_id))
             )
 
         sample.attributes.append(Attribute('submitted_using', 'egasub'))
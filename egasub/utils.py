@@ -1,17 +1,13 @@
 import os
 import re
-import yaml
-import glob
-import ftplib
 from click import echo
-from egasub.ega.entities.file import File
 import logging
 import datetime
-from egasub.ega.entities import EgaEnums
+import threading
 
 
 
-def initialize_app(ctx):
+def initialize_app(ctx, require_dir_type=True):
     if not ctx.obj['WORKSPACE_PATH']:
         ctx.obj['LOGGER'].critical('Not in an EGA submission workspace! Please run "egasub init" to initiate an EGA workspace.')
         ctx.abort()
@@ -27,10 +23,11 @@ def initialize_app(ctx):
     # figure out the current dir type, e.g., study, sample or analysis
     ctx.obj['CURRENT_DIR_TYPE'] = get_current_dir_type(ctx)
     #echo('Info: submission data type is \'%s\'' % ctx.obj['CURRENT_DIR_TYPE'])  # for debug
-    if not ctx.obj['CURRENT_DIR_TYPE']:
+    if not ctx.obj['CURRENT_DIR_TYPE'] and require_dir_type:
         ctx.obj['LOGGER'].critical('The current working directory does not associate with any supported EGA data types: unaligned|alignment|variation')
         ctx.abort()
-        
+
+    from egasub.ega.entities import EgaEnums
     ctx.obj['EGA_ENUMS'] = EgaEnums()
         
 def initialize_log(ctx, debug, info):
@@ -94,11 +91,65 @@ def get_settings(wspath):
         return None
 
     with open(config_file, 'r') as f:
-        settings = yaml.load(f)
+        settings = load_yaml(f)
 
     return settings
 
 
+def load_yaml(stream):
+    """ Parse YAML with libyaml's CSafeLoader when PyYAML was built with it, SafeLoader otherwise """
+    import yaml
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+class MetadataCache(object):
+    """
+    Parsed YAML metadata files kept in marshal form under cache_dir, one file
+    per YAML file, so unchanged metadata is loaded without parsing the YAML.
+    An entry is used only while the YAML file has the size and mtime it had
+    when it was parsed.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _cache_file(self, path):
+        import hashlib
+        return os.path.join(self.cache_dir, '%s.marshal' % hashlib.sha1(path).hexdigest())
+
+    def load(self, yaml_file):
+        """ Parsed content of yaml_file, from the cache when the file has not changed """
+        import marshal
+        path = os.path.abspath(yaml_file)
+        st = os.stat(path)
+        identity = (path, st.st_size, st.st_mtime)
+        cache_file = self._cache_file(path)
+
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_identity, data = marshal.load(f)
+            if cached_identity == identity:
+                return data
+        except (IOError, EOFError, ValueError, TypeError):
+            pass
+
+        with open(path, 'r') as f:
+            data = load_yaml(f)
+
+        # written aside and moved in place, parallel workers never read half an entry
+        tmp_file = '%s.%s.%s.tmp' % (cache_file, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp_file, 'wb') as f:
+                marshal.dump((identity, data), f, 2)
+            os.rename(tmp_file, cache_file)
+        except (ValueError, IOError, OSError):  # not marshallable (e.g. YAML timestamps) or cache not writable
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+        return data
+
+
 def get_current_dir_type(ctx):
     workplace = ctx.obj['WORKSPACE_PATH']
     current_dir = ctx.obj['CURRENT_DIR']
@@ -111,26 +162,71 @@ def get_current_dir_type(ctx):
     return None
 
 
-def file_pattern_exist(dirname, pattern):
-    files = [f for f in os.listdir(dirname) if os.path.isfile(f)]
-    for f in files:
-        if re.match(pattern, f): return True
-
-    return False
+def run_parallel(func, items, jobs=1):
+    """
+    Call func on every item using up to 'jobs' worker threads, returns the
+    results in the same order as items. Runs in the calling thread when jobs is 1.
+    """
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return map(func, items)
 
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(jobs, len(items)))
+    try:
+        return pool.map(func, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run_pipelined(func, items, jobs=1, backlog=None):
+    """
+    Call func on every item with 'jobs' worker threads while items are still
+    being produced. Items are pulled lazily from the iterable and at most
+    'backlog' of them wait for a worker, the producer blocks beyond that.
+    Returns the number of items processed.
+    """
+    import Queue
+    queue = Queue.Queue(maxsize=backlog or 2 * jobs)
+    done = object()
+    errors = []
+
+    def worker():
+        while True:
+            item = queue.get()
+            if item is done:
+                return
+            try:
+                func(item)
+            except Exception, err:
+                errors.append(err)
+
+    workers = [threading.Thread(target=worker, name='Worker-%s' % (i + 1)) for i in range(jobs)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+
+    count = 0
+    try:
+        for item in items:
+            queue.put(item)
+            count += 1
+    finally:
+        for w in workers:
+            queue.put(done)
+        for w in workers:
+            w.join()
 
-def ftp_files(path, ctx):
-    host = ctx.obj['SETTINGS']['ftp_server']
-    _, user, passwd = ctx.obj['AUTH'].split('%20') if len(ctx.obj['AUTH'].split('%20')) == 3 else ('', '', '')
+    if errors:
+        raise errors[0]
 
-    ftp = ftplib.FTP(host, user, passwd)
+    return count
 
-    files = []
-    try:
-        files = ftp.nlst(path)
-    except ftplib.error_perm, resp:
-        echo('Error: unable to connect to FTP server.', err=True)
-        ctx.abort()
 
-    return files
+def file_pattern_exist(dirname, pattern):
+    files = [f for f in os.listdir(dirname) if os.path.isfile(f)]
+    for f in files:
+        if re.match(pattern, f): return True
 
+    return False
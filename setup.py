@@ -1,7 +1,10 @@
 #!/usr/bin/env python
+import os
+import imp
 import sys
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Command
 from setuptools.command.test import test as TestCommand
+from setuptools.command.build_py import build_py
 from pip.req import parse_requirements
 from pip.download import PipSession
 
@@ -24,6 +27,36 @@ class PyTest(TestCommand):
         sys.exit(errno)
 
 
+def build_enums_snapshot(package_dir):
+    # load the module on its own, the egasub package needs the install requirements
+    ega_enums = imp.load_source('ega_enums', os.path.join('egasub', 'ega', 'entities', 'ega_enums.py'))
+    ega_enums.build_snapshot(
+                    os.path.join('egasub', 'ega', 'data', 'enums'),
+                    os.path.join(package_dir, 'egasub', 'ega', 'data', 'enums.snapshot')
+                )
+
+
+class BuildEnums(Command):
+    description = "compile the EGA enum JSON files into egasub/ega/data/enums.snapshot"
+    user_options = []
+
+    def initialize_options(self):
+        pass
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        build_enums_snapshot('.')
+
+
+class BuildPy(build_py):
+    def run(self):
+        build_py.run(self)
+        if not self.dry_run:
+            build_enums_snapshot(self.build_lib)
+
+
 install_reqs = parse_requirements('requirements.txt', session=PipSession())
 tests_require = parse_requirements('requirements-test.txt', session=PipSession())
 
@@ -34,7 +67,7 @@ setup(
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
     install_requires = [str(ir.req) for ir in install_reqs],
     tests_require = [str(ir.req) for ir in tests_require],
-    cmdclass = {'test': PyTest},
+    cmdclass = {'test': PyTest, 'build_enums': BuildEnums, 'build_py': BuildPy},
     package_data={'egasub': [
                                 'ega/data/policy/*.xml',
                                 'ega/data/enums/*.json',
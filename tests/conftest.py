@@ -18,6 +18,62 @@ test_ctx = test_ctx()
 def ctx():
     return test_ctx
 
+
+class _fake_ctx(object):
+    """ click context with an obj dict of its own, SETTINGS and LOGGER plus the given entries """
+    def __init__(self, settings=None, **obj):
+        self.obj = {
+            'SETTINGS': dict(settings or {}),
+            'LOGGER': logging.getLogger('ega_submission')
+        }
+        self.obj.update(obj)
+
+
+class _fake_obj(object):
+    """ EGA object of a submittable, with the given attributes """
+    def __init__(self, alias, id_=None, **attributes):
+        self.alias = alias
+        self.id = id_
+        self.status = None
+        self.__dict__.update(attributes)
+
+
+class _fake_submittable(object):
+    """ submission directory of sample, experiment and run, recording the object statuses written """
+    def __init__(self, name, sample=None, experiment=None, run=None):
+        self.submission_dir = name
+        self.sample = sample or _fake_obj(name)
+        self.experiment = experiment or _fake_obj(name)
+        self.run = run or _fake_obj(name)
+        self.recorded = []
+
+    def record_object_status(self, obj_type):
+        obj = getattr(self, obj_type)
+        self.recorded.append((obj_type, obj.id, obj.status))
+
+
+class _fake_response(object):
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+@pytest.fixture
+def fake_ctx():
+    return _fake_ctx
+
+@pytest.fixture
+def fake_obj():
+    return _fake_obj
+
+@pytest.fixture
+def fake_submittable():
+    return _fake_submittable
+
+@pytest.fixture
+def fake_response():
+    return _fake_response
+
 @pytest.fixture(scope="session")
 def mock_server(ctx):
     httpretty.enable()
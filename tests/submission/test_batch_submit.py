@@ -0,0 +1,72 @@
+import json
+import httpretty
+from egasub.ega.entities import Submission, SubmissionSubsetData
+from egasub.ega.services import submit_submission
+from egasub.submission import submitter as submitter_module
+from egasub.submission.submitter import Submitter
+
+
+SETTINGS = {'apiUrl': 'http://example.com/', 'ega_study_id': 'EGAS1'}
+
+
+def test_submit_submission(mock_server, fake_ctx):
+    httpretty.register_uri(httpretty.PUT, 'http://example.com/submissions/B1',
+                           body=json.dumps({'header': {'code': '200'}, 'response': {'result': [
+                                    {'id': 'B1', 'status': 'SUBMITTED', 'samples': [
+                                        {'id': 'EGAN1', 'status': 'SUBMITTED'},
+                                        {'id': 'EGAN2', 'status': 'VALIDATED_WITH_ERRORS'}]}]}}))
+    # runs are not reported on, they are looked up among the submitted runs
+    httpretty.register_uri(httpretty.GET, 'http://example.com/runs',
+                           body=json.dumps({'header': {'code': '200'}, 'response': {'result': [
+                                    {'id': 'EGAR1', 'alias': 'run_1', 'status': 'SUBMITTED'}]}}))
+
+    subset = SubmissionSubsetData.create_empty()
+    subset.sample_ids = ['EGAN1', 'EGAN2']
+    subset.run_ids = ['EGAR1', 'EGAR2']
+    ctx = fake_ctx(SETTINGS, SUBMISSION={'id': 'B1', 'sessionToken': 'abcdefg'}, CURRENT_DIR_TYPE='unaligned')
+    statuses = submit_submission(ctx, Submission('title', 'a description', subset))
+
+    assert statuses == {'EGAN1': 'SUBMITTED', 'EGAN2': 'VALIDATED_WITH_ERRORS', 'EGAR1': 'SUBMITTED'}
+    # the submitted submission is not to be reused
+    assert ctx.obj['SUBMISSION'] == {'sessionToken': 'abcdefg'}
+    put = [r for r in httpretty.httpretty.latest_requests if r.method == 'PUT'][-1]
+    assert put.querystring == {'action': ['SUBMIT']}
+    assert json.loads(put.body)['submissionSubset']['runIds'] == ['EGAR1', 'EGAR2']
+
+
+def test_batch_submit(monkeypatch, fake_ctx, fake_submittable):
+    def object_submission(ctx, obj, obj_type, dry_run=True, deletions=None):
+        assert dry_run  # objects are only validated
+        obj.id = '%s_%s' % (obj_type, obj.alias)
+        obj.status = 'VALIDATED_WITH_ERRORS' if obj.alias == 'sample_bad' and obj_type == 'run' else 'VALIDATED'
+
+    submitted = []
+    def submit_submission(ctx, submission):
+        submitted.append(submission.submission_subset)
+        return dict((i, 'SUBMITTED') for i in submission.submission_subset.sample_ids +
+                                              submission.submission_subset.experiment_ids +
+                                              submission.submission_subset.run_ids)
+
+    deleted = []
+    monkeypatch.setattr(submitter_module, 'object_submission', object_submission)
+    monkeypatch.setattr(submitter_module, 'submit_submission', submit_submission)
+    monkeypatch.setattr(submitter_module, 'delete_obj', lambda ctx, t, i: deleted.append(i))
+    monkeypatch.setattr(Submitter, 'set_icgc_ids', lambda self, sample: None)
+
+    submitter = Submitter(fake_ctx(dict(SETTINGS, batch_submit=True, two_phase_submission=False),
+                                   SUBMISSION={'id': 'B1', 'sessionToken': 'abcdefg'}, CURRENT_DIR_TYPE='unaligned'))
+    good, bad = fake_submittable('sample_good'), fake_submittable('sample_bad')
+    submitter.submit_all([good, bad], dry_run=False, jobs=2)
+    assert deleted == []  # validated objects are kept for the batch
+
+    submitter.submit_batch(Submission('title', 'a description', SubmissionSubsetData.create_empty()))
+
+    # one submission level SUBMIT for all objects of the complete directories
+    assert len(submitted) == 1
+    assert submitted[0].sample_ids == ['sample_sample_good']
+    assert submitted[0].run_ids == ['run_sample_good']
+    assert [(t, status) for t, _, status in good.recorded[-3:]] == \
+                [('sample', 'SUBMITTED'), ('experiment', 'SUBMITTED'), ('run', 'SUBMITTED')]
+
+    # objects of the directory not submitted are cleaned up
+    assert sorted(deleted) == ['experiment_sample_bad', 'run_sample_bad', 'sample_sample_bad']
@@ -0,0 +1,72 @@
+import shutil
+from egasub.icgc import services as icgc_services
+from egasub.icgc.services.id_cache import IcgcIdCache
+from egasub.submission.icgc_ids import perform_icgc_ids, preresolve_icgc_ids
+from egasub.submission.submitter import Submitter
+
+
+SETTINGS = {'icgc_project_code': 'PACA-CA', 'icgc_id_service_token': 'token'}
+
+
+def fake_id_service(monkeypatch, fake_response, requests_made):
+    def id_request(ctx, type_, project_code, submitter_id, create=True, is_test=False):
+        requests_made.append((type_, submitter_id))
+        if submitter_id == 'sample_bad':
+            return fake_response('Internal Server Error', 500)
+        return fake_response('%s_%s' % (type_, submitter_id))
+    monkeypatch.setattr(icgc_services, '_id_request', id_request)
+
+
+def test_perform_icgc_ids(tmpdir, monkeypatch, fake_ctx, fake_response):
+    tmpdir.mkdir('.egasub')
+    shutil.copytree('tests/data/workspace/unaligned.20170110', str(tmpdir.join('unaligned.20170110')))
+    dirs = [str(tmpdir.join('unaligned.20170110', d)) for d in ('sample_x', 'sample_y', 'sample_bad')]
+    requests_made = []
+    fake_id_service(monkeypatch, fake_response, requests_made)
+
+    ctx = fake_ctx(SETTINGS, WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='unaligned')
+    assert perform_icgc_ids(ctx, dirs, jobs=4) == 1
+    # every distinct sample and donor looked up once
+    assert sorted(requests_made) == sorted(set(requests_made))
+
+    del requests_made[:]
+    assert perform_icgc_ids(ctx, dirs, jobs=4) == 1
+    assert requests_made == [('sample', 'sample_bad')]
+
+
+def make_submittable(fake_submittable, fake_obj, alias, subject_id):
+    return fake_submittable(alias, fake_obj(alias, subject_id=subject_id, attributes=[]))
+
+
+def test_preresolved_ids_used_by_submission(tmpdir, monkeypatch, fake_ctx, fake_obj, fake_submittable, fake_response):
+    lookups = []
+
+    def id_request(ctx, type_, project_code, submitter_id, create=True, is_test=False):
+        lookups.append((type_, create, is_test))
+        return fake_response('%s_%s' % (type_, submitter_id))
+    monkeypatch.setattr(icgc_services, '_id_request', id_request)
+
+    submittable = make_submittable(fake_submittable, fake_obj, 'tumour', 'donor_1')
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        ctx = fake_ctx(SETTINGS, WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='unaligned', ICGC_ID_CACHE=cache)
+        preresolve_icgc_ids(ctx, [submittable])
+        # the same service and options as the lookups while submitting, which are answered from the cache
+        assert sorted(lookups) == [('donor', True, True), ('sample', True, True)]
+        Submitter(ctx).set_icgc_ids(submittable.sample)
+        assert len(lookups) == 2
+        assert [a.value for a in submittable.sample.attributes[:2]] == ['sample_tumour', 'donor_donor_1']
+
+
+def test_preresolve_icgc_ids(tmpdir, monkeypatch, fake_ctx, fake_obj, fake_submittable, fake_response):
+    requests_made = []
+    fake_id_service(monkeypatch, fake_response, requests_made)
+    # tumour and normal of one donor, and a sample the service fails on
+    submittables = [make_submittable(fake_submittable, fake_obj, alias, subject_id)
+                        for alias, subject_id in (('tumour', 'donor_1'), ('normal', 'donor_1'), ('sample_bad', 'donor_2'))]
+
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        ctx = fake_ctx(SETTINGS, WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='unaligned', ICGC_ID_CACHE=cache)
+        resolved = preresolve_icgc_ids(ctx, submittables, jobs=4)
+        assert [s.sample.alias for s in resolved] == ['tumour', 'normal']
+        assert requests_made.count(('donor', 'donor_1')) == 1
+        assert cache.get(('donor', 'PACA-CA', 'donor_1', True), None) == 'donor_donor_1'
@@ -0,0 +1,132 @@
+import time
+import threading
+import pytest
+from egasub.submission import submitter as submitter_module
+from egasub.submission.submitter import Submitter
+from egasub.submission.scheduler import DagScheduler, DONE, FAILED, CANCELLED
+
+
+def test_dependencies_and_concurrency():
+    order = []
+    lock = threading.Lock()
+
+    def step(name):
+        def run():
+            time.sleep(0.05)
+            with lock:
+                order.append(name)
+        return run
+
+    scheduler = DagScheduler(jobs=4)
+    for d in range(4):
+        sample = scheduler.add('sample_%s' % d, step('sample_%s' % d))
+        experiment = scheduler.add('experiment_%s' % d, step('experiment_%s' % d), [sample])
+        scheduler.add('run_%s' % d, step('run_%s' % d), [sample, experiment])
+
+    start = time.time()
+    assert scheduler.run() == []
+    assert time.time() - start < 0.3  # 3 rounds of 4 concurrent steps, not 12 steps in a row
+
+    assert all(t.state == DONE for t in scheduler.tasks)
+    for d in range(4):
+        assert order.index('sample_%s' % d) < order.index('experiment_%s' % d) < order.index('run_%s' % d)
+
+
+def test_failure_cancels_downstream_only():
+    ran = []
+
+    def fail():
+        raise Exception('validation failed')
+
+    scheduler = DagScheduler(jobs=2)
+    sample_1 = scheduler.add('sample_1', fail)
+    experiment_1 = scheduler.add('experiment_1', lambda: ran.append('experiment_1'), [sample_1])
+    run_1 = scheduler.add('run_1', lambda: ran.append('run_1'), [sample_1, experiment_1])
+    finish_1 = scheduler.add('finish_1', lambda: ran.append('finish_1'), [sample_1, experiment_1, run_1], always=True)
+    sample_2 = scheduler.add('sample_2', lambda: ran.append('sample_2'))
+    experiment_2 = scheduler.add('experiment_2', lambda: ran.append('experiment_2'), [sample_2])
+
+    assert scheduler.run() == [sample_1]
+    assert str(sample_1.error) == 'validation failed'
+    assert experiment_1.state == CANCELLED and run_1.state == CANCELLED
+    assert finish_1.state == DONE
+    assert sorted(ran) == ['experiment_2', 'finish_1', 'sample_2']
+
+
+def test_requires_tasks_of_the_graph():
+    other = DagScheduler().add('sample', lambda: None)
+    scheduler = DagScheduler()
+    with pytest.raises(ValueError):
+        scheduler.add('experiment', lambda: None, [other])
+
+
+def test_submit_graph(monkeypatch, fake_ctx, fake_submittable):
+    registered = []
+
+    def object_submission(ctx, obj, obj_type, dry_run=True, deletions=None):
+        if obj_type == 'experiment' and obj.alias == 'sample_bad':
+            raise Exception('Error occurred while validating experiment')
+        obj.id = '%s_%s' % (obj_type, obj.alias)
+        obj.status = 'VALIDATED'
+        registered.append((obj_type, obj))
+
+    deleted = []
+    monkeypatch.setattr(submitter_module, 'object_submission', object_submission)
+    monkeypatch.setattr(submitter_module, 'delete_obj', lambda ctx, t, i: deleted.append(i))
+    monkeypatch.setattr(Submitter, 'set_icgc_ids', lambda self, sample: None)
+
+    ctx = fake_ctx({'submission_backend': 'dag', 'two_phase_submission': False, 'ega_study_id': 'EGAS1'},
+                   CURRENT_DIR_TYPE='unaligned')
+    good, bad = fake_submittable('sample_good'), fake_submittable('sample_bad')
+    assert Submitter(ctx).submit_all([good, bad], dry_run=True, jobs=4) == 2
+
+    assert [t for t, _, _ in good.recorded] == ['sample', 'experiment', 'run']
+    assert good.run.experiment_id == 'experiment_sample_good' and good.run.sample_id == 'sample_sample_good'
+    assert [t for t, _, _ in bad.recorded] == ['sample']
+    assert bad.run.id is None  # cancelled
+    # drafts of both directories are deleted, being a dry run
+    assert sorted(deleted) == ['experiment_sample_good', 'run_sample_good', 'sample_sample_bad', 'sample_sample_good']
+
+
+@pytest.mark.parametrize('dry_run', [True, False])
+def test_two_phase(monkeypatch, fake_ctx, fake_submittable, dry_run):
+    calls = []
+    lock = threading.Lock()
+
+    def object_registration(ctx, obj, obj_type, deletions=None):
+        with lock:
+            calls.append(('register', obj_type))
+        obj.id = '%s_%s' % (obj_type, obj.alias)
+        return True
+
+    def object_completion(ctx, obj, obj_type, dry_run=True):
+        with lock:
+            calls.append(('start', obj_type))
+        time.sleep(0.05)
+        obj.status = 'VALIDATED' if dry_run else 'SUBMITTED'
+        with lock:
+            calls.append(('end', obj_type))
+
+    monkeypatch.setattr(submitter_module, 'object_registration', object_registration)
+    monkeypatch.setattr(submitter_module, 'object_completion', object_completion)
+    monkeypatch.setattr(submitter_module, 'delete_obj', lambda ctx, t, i: None)
+    monkeypatch.setattr(Submitter, 'set_icgc_ids', lambda self, sample: None)
+
+    submittable = fake_submittable('sample_1')
+    Submitter(fake_ctx({'ega_study_id': 'EGAS1'}, CURRENT_DIR_TYPE='unaligned')).submit(submittable, dry_run)
+
+    # objects are validated or submitted once registered, registering goes on meanwhile
+    assert [c for c in calls if c[0] == 'register'] == [('register', 'sample'), ('register', 'experiment'), ('register', 'run')]
+    for obj_type in ('sample', 'experiment', 'run'):
+        assert calls.index(('register', obj_type)) < calls.index(('start', obj_type))
+    assert submittable.run.experiment_id == 'experiment_sample_1'
+    assert sorted(t for t, _, _ in submittable.recorded) == ['experiment', 'run', 'sample']
+
+    completion = [c for c in calls if not c[0] == 'register']
+    if dry_run:
+        # validations overlap
+        assert [c[0] for c in completion] == ['start'] * 3 + ['end'] * 3
+    else:
+        # an object is submitted after the objects it refers to
+        assert completion == [('start', 'sample'), ('end', 'sample'), ('start', 'experiment'),
+                              ('end', 'experiment'), ('start', 'run'), ('end', 'run')]
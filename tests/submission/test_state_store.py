@@ -0,0 +1,65 @@
+import shutil
+from egasub.utils import run_parallel
+from egasub.submission.state_store import StateStore, workspace_relpath
+from egasub.submission.submittable import Unaligned
+
+
+def test_record_and_latest(tmpdir):
+    tmpdir.mkdir('.egasub')
+    with StateStore(str(tmpdir)) as store:
+        submission_dir = str(tmpdir.join('unaligned.test', 'sample_x'))
+        assert store.latest(submission_dir, 'sample') is None
+
+        store.record(submission_dir, 'sample', 'EGAN1', 'sample_x', 'DRAFT', 1)
+        store.record(submission_dir, 'sample', 'EGAN1', 'sample_x', 'SUBMITTED', 2)
+        assert store.latest(submission_dir, 'sample') == ('EGAN1', 'sample_x', 'SUBMITTED', 2)
+        assert [h[2] for h in store.history(submission_dir, 'sample')] == ['DRAFT', 'SUBMITTED']
+        assert store.latest(submission_dir, 'run') is None
+
+    # keyed relative to the workspace, so the workspace can be moved
+    moved = tmpdir.dirpath().join(tmpdir.basename + '_moved')
+    shutil.move(str(tmpdir), str(moved))
+    with StateStore(str(moved)) as store:
+        assert store.latest(str(moved.join('unaligned.test', 'sample_x')), 'sample')[2] == 'SUBMITTED'
+
+
+def test_concurrent_writers(tmpdir):
+    tmpdir.mkdir('.egasub')
+    stores = [StateStore(str(tmpdir)) for _ in range(4)]
+    dirs = [str(tmpdir.join('unaligned.test', 'sample_%s' % i)) for i in range(40)]
+
+    run_parallel(lambda i: stores[i % 4].record(dirs[i], 'run', i, 'sample_%s' % i, 'VALIDATED'), range(40), 8)
+    assert all(stores[0].latest(d, 'run')[1] == 'sample_%s' % i for i, d in enumerate(dirs))
+    for store in stores:
+        store.close()
+
+
+def test_migrate_status_logs(tmpdir):
+    tmpdir.mkdir('.egasub')
+    submission_dir = tmpdir.mkdir('unaligned.test').join('sample_y')
+    shutil.copytree('tests/data/workspace/unaligned.20170110/sample_y', str(submission_dir))
+    submission_dir.mkdir('.status').join('run.log').write('EGAR1\tsample_y\tDRAFT\t1\nEGAR1\tsample_y\tSUBMITTED\t2\n')
+
+    with StateStore(str(tmpdir)) as store:
+        unaligned = Unaligned(str(submission_dir), state_store=store)
+        assert unaligned.run.status == 'SUBMITTED'
+        assert len(store.history(str(submission_dir), 'run')) == 2
+
+        unaligned.sample.id = 'EGAN1'
+        unaligned.sample.status = 'VALIDATED'
+        unaligned.record_object_status('sample')
+
+    # logs are imported only once
+    with StateStore(str(tmpdir)) as store:
+        assert len(store.history(str(submission_dir), 'run')) == 2
+        assert store.latest(str(submission_dir), 'sample')[:3] == ('EGAN1', 'sample_y', 'VALIDATED')
+        assert not submission_dir.join('.status', 'sample.log').check()
+
+
+def test_workspace_relpath():
+    assert workspace_relpath('/ws/unaligned.1/sample_x', '/ws') == 'unaligned.1/sample_x'
+    assert workspace_relpath('/ws/unaligned.1/sample_x', '/ws/') == 'unaligned.1/sample_x'
+    assert workspace_relpath('/ws/unaligned.1/../unaligned.2/sample_x', '/ws') == 'unaligned.2/sample_x'
+    assert workspace_relpath('/ws/unaligned.1/sample_x/', '/ws') == 'unaligned.1/sample_x'
+    assert workspace_relpath('/ws/unaligned.1//sample_x', '/ws') == 'unaligned.1/sample_x'
+    assert workspace_relpath('/ws/./unaligned.1/sample_x', '/ws') == 'unaligned.1/sample_x'
@@ -0,0 +1,79 @@
+import json
+import sqlite3
+import pytest
+from egasub.submission.status import generate_report, _last_line
+from egasub.submission.state_store import StateStore
+
+
+def make_workspace(tmpdir):
+    tmpdir.mkdir('.egasub')
+    unaligned = tmpdir.mkdir('unaligned.20170110')
+    for name in ('sample_x', 'sample_y', 'sample_z'):
+        unaligned.mkdir(name)
+    alignment = tmpdir.mkdir('alignment.20170110')
+    alignment.mkdir('sample_x')
+    tmpdir.mkdir('other').mkdir('sample_x')
+
+    unaligned.join('sample_x').mkdir('.status').join('run.log').write('EGAR1\tsample_x\tVALIDATED\t1\nEGAR1\tsample_x\tSUBMITTED\t2\n')
+    unaligned.join('sample_y').mkdir('.status').join('run.log').write('EGAR2\tsample_y\tVALIDATED\t1\n')
+    return unaligned
+
+
+def test_report_workspace(tmpdir, capsys, fake_ctx):
+    make_workspace(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR=str(tmpdir), CURRENT_DIR_TYPE=None)
+
+    summary = generate_report(ctx, [], output_format='json')
+    assert summary == {'unaligned': {'SUBMITTED': 1, 'VALIDATED': 1, 'NEW': 1}, 'alignment': {'NEW': 1}}
+
+    report = json.loads(capsys.readouterr()[0])
+    assert [r['submission_dir'] for r in report['submissions']] == \
+            ['alignment.20170110/sample_x', 'unaligned.20170110/sample_x', 'unaligned.20170110/sample_y', 'unaligned.20170110/sample_z']
+    assert report['submissions'][1]['objects'] == {'sample': None, 'experiment': None, 'run': 'SUBMITTED'}
+
+    # reporting does not create the state store
+    assert not tmpdir.join('.egasub', 'state.db').check()
+
+
+def test_report_from_state_store_read_only(tmpdir, capsys, fake_ctx):
+    unaligned = make_workspace(tmpdir)
+    with StateStore(str(tmpdir)) as store:
+        store.record(str(unaligned.join('sample_x')), 'run', 'EGAR1', 'sample_x', 'VALIDATED_WITH_ERRORS')
+
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR=str(unaligned), CURRENT_DIR_TYPE='unaligned')
+    summary = generate_report(ctx, [], output_format='json')
+    # sample_x from the store, sample_y from its .status log which is not imported
+    assert summary == {'unaligned': {'VALIDATED_WITH_ERRORS': 1, 'VALIDATED': 1, 'NEW': 1}}
+    with StateStore(str(tmpdir), read_only=True) as store:
+        assert store.migrated(str(unaligned.join('sample_x')))
+        assert not store.migrated(str(unaligned.join('sample_y')))
+        with pytest.raises(sqlite3.OperationalError):
+            store.record(str(unaligned.join('sample_y')), 'run', 'EGAR2', 'sample_y', 'SUBMITTED')
+
+
+def test_report_batch_from_status_logs(tmpdir, capsys, fake_ctx):
+    unaligned = make_workspace(tmpdir)
+    ctx = fake_ctx({'state_store': False}, WORKSPACE_PATH=str(tmpdir), CURRENT_DIR=str(unaligned),
+                   CURRENT_DIR_TYPE='unaligned')
+
+    generate_report(ctx, [], output_format='tsv', jobs=2)
+    lines = capsys.readouterr()[0].splitlines()
+    assert lines[0] == 'submission_dir\ttype\tstatus\tsample\texperiment\trun\tanalysis'
+    assert lines[1:] == ['unaligned.20170110/sample_x\tunaligned\tSUBMITTED\t\t\tSUBMITTED\t',
+                         'unaligned.20170110/sample_y\tunaligned\tVALIDATED\t\t\tVALIDATED\t',
+                         'unaligned.20170110/sample_z\tunaligned\tNEW\t\t\t\t']
+    assert not tmpdir.join('.egasub', 'state.db').check()
+
+    generate_report(ctx, [str(unaligned.join('sample_x'))], summary_only=True)
+    assert capsys.readouterr()[0].splitlines()[-1].split() == ['unaligned', 'SUBMITTED', '1']
+
+
+def test_last_line(tmpdir):
+    log = tmpdir.join('run.log')
+    assert _last_line(str(log)) is None
+    log.write('')
+    assert _last_line(str(log)) is None
+    log.write(''.join('line %s\n' % i for i in range(1000)))
+    assert _last_line(str(log), block_size=16) == 'line 999'
+    log.write('only line')
+    assert _last_line(str(log)) == 'only line'
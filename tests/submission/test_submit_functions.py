@@ -1,6 +1,7 @@
 import os, yaml
-from egasub.ega.services import login,logout,prepare_submission, object_submission
+from egasub.ega.services import login,logout,prepare_submission, object_submission, prefetch_aliases, query_by_id
 import pytest
+import httpretty
 import requests
 from egasub.ega.entities.submission_subset_data import SubmissionSubsetData
 from egasub.ega.entities.submission import Submission
@@ -22,6 +23,17 @@ def test_prepare_submission(ctx):
     
     prepare_submission(ctx,submission)
     assert ctx.obj['SUBMISSION']['id'] == "12345"
+
+def test_prepare_fresh_submission(ctx, mock_server):
+    submission = ctx.obj['SUBMISSION']
+    ctx.obj['SUBMISSION'] = {'sessionToken': 'abcdefg', 'id': 'cached'}
+    try:
+        prepare_submission(ctx, Submission('title', 'a description', SubmissionSubsetData.create_empty()))
+        assert ctx.obj['SUBMISSION']['id'] == 'cached'
+        prepare_submission(ctx, Submission('title', 'a description', SubmissionSubsetData.create_empty()), fresh=True)
+        assert ctx.obj['SUBMISSION']['id'] == '12345'
+    finally:
+        ctx.obj['SUBMISSION'] = submission
     
 """
 def test_submit_obj(ctx):
@@ -41,4 +53,114 @@ def test_submit_obj(ctx):
 
 def test_logout_function(ctx):
     logout(ctx)
-    assert not 'sessionToken' in ctx.obj['SUBMISSION']
\ No newline at end of file
+    assert not 'sessionToken' in ctx.obj['SUBMISSION']
+
+def test_session_token_header(ctx):
+    login(ctx)
+    assert ctx.obj['EGA_SESSION'].headers['X-Token'] == "abcdefg"
+    logout(ctx)
+    assert not 'X-Token' in ctx.obj['EGA_SESSION'].headers
+
+
+def test_prefetch_aliases(ctx, mock_server):
+    login(ctx)
+
+    def samples(request, uri, headers):
+        if request.querystring['status'][0] != 'DRAFT':
+            return (200, headers, '{"header" : {"code" : "200"}, "response" : {"result" : []}}')
+        if request.querystring['skip'][0] == '0':
+            result = '[{"id": "1", "alias": "a", "status": "DRAFT"}, {"id": "2", "alias": "b", "status": "DRAFT"}]'
+        else:
+            result = '[{"id": "3", "alias": "a", "status": "DRAFT"}]'
+        return (200, headers, '{"header" : {"code" : "200"}, "response" : {"result" : %s}}' % result)
+
+    httpretty.register_uri(httpretty.GET, "%ssamples" % ctx.obj['SETTINGS']['apiUrl'], body=samples)
+
+    index = prefetch_aliases(ctx, ['sample'], page_size=2)
+    assert ctx.obj['ALIAS_INDEX'] is index
+    assert [o['id'] for o in index.lookup('sample', 'a')] == ['1', '3']
+    assert [o['id'] for o in index.lookup('sample', 'b')] == ['2']
+
+    del ctx.obj['ALIAS_INDEX']
+    logout(ctx)
+
+
+def test_session_cache(ctx, mock_server, tmpdir):
+    tmpdir.mkdir('.egasub')
+    ctx.obj['WORKSPACE_PATH'] = str(tmpdir)
+    ctx.obj['SETTINGS']['session_cache'] = True
+
+    httpretty.register_uri(httpretty.GET, "%ssubmissions/12345" % ctx.obj['SETTINGS']['apiUrl'],
+                           responses=[
+                               httpretty.Response('{"header" : {"code" : "200"}, "response" : {"result" : [{"id": "12345"}]}}'),
+                               httpretty.Response('{"header" : {"code" : "401"}}', status=401)
+                           ])
+    try:
+        login(ctx)
+        prepare_submission(ctx, Submission('title', 'a description', SubmissionSubsetData.create_empty()))
+        logout(ctx)
+        assert oct(os.stat(str(tmpdir.join('.egasub', 'session.json'))).st_mode & 0777) == '0600'
+        assert not httpretty.last_request().method == 'DELETE'
+
+        # token still accepted, no login
+        login(ctx)
+        assert httpretty.last_request().path == '/submissions/12345'
+        assert ctx.obj['SUBMISSION'] == {'sessionToken': 'abcdefg', 'id': '12345'}
+        logout(ctx)
+
+        # token rejected, log in again
+        login(ctx)
+        assert httpretty.last_request().path == '/login'
+        assert not 'id' in ctx.obj['SUBMISSION']
+        logout(ctx)
+    finally:
+        del ctx.obj['SETTINGS']['session_cache']
+        del ctx.obj['WORKSPACE_PATH']
+
+
+def test_expired_session_token(ctx, mock_server):
+    login(ctx)
+    ctx.obj['SUBMISSION']['id'] = '12345'
+    ctx.obj['EGA_SESSION'].token = ctx.obj['SUBMISSION']['sessionToken'] = 'expired'
+
+    def samples(request, uri, headers):
+        if request.headers.get('X-Token') == 'expired':
+            return (200, headers, '{"header" : {"code" : "401", "userMessage" : "Session expired"}}')
+        return (200, headers, '{"header" : {"code" : "200"}, "response" : {"result" : [{"id": "1"}]}}')
+
+    httpretty.register_uri(httpretty.GET, "%ssamples/a" % ctx.obj['SETTINGS']['apiUrl'], body=samples)
+
+    assert query_by_id(ctx, 'sample', 'a', 'ALIAS') == [{'id': '1'}]
+    assert ctx.obj['SUBMISSION'] == {'sessionToken': 'abcdefg', 'id': '12345'}
+    logout(ctx)
+
+def test_submission_cleanup_on_error(tmpdir, monkeypatch, fake_ctx):
+    from egasub.submission import submit as submit_module
+
+    calls = []
+
+    class fake_queue(object):
+        def __init__(self, ctx, jobs, mode):
+            pass
+
+        def flush(self):
+            calls.append('flush')
+            return 0
+
+    def ftp_session(*args):
+        raise IOError('FTP server unreachable')
+
+    monkeypatch.setattr(submit_module, 'login', lambda ctx: None)
+    monkeypatch.setattr(submit_module, 'logout', lambda ctx: calls.append('logout'))
+    monkeypatch.setattr(submit_module, 'prepare_submission', lambda ctx, submission, fresh=False: None)
+    monkeypatch.setattr(submit_module, 'DeletionQueue', fake_queue)
+    monkeypatch.setattr(submit_module, 'FtpSession', ftp_session)
+
+    tmpdir.mkdir('.egasub')
+    ctx = fake_ctx({'prefetch_aliases': False, 'metadata_cache': False, 'ega_submitter_account': 'account',
+                    'ega_submitter_password': 'password'}, WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='unaligned')
+    with pytest.raises(IOError):
+        submit_module.perform_submission(ctx, [], dry_run=True)
+    # the deletion queue is flushed, the caches closed and the session logged out all the same
+    assert calls == ['flush', 'logout']
+    assert not 'DELETION_QUEUE' in ctx.obj and not 'ICGC_ID_CACHE' in ctx.obj
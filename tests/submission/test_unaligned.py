@@ -85,3 +85,31 @@ def test_unaligned():
 #    with pytest.raises(Md5sumFileError):
 #        unaligned = Unaligned('tests/data/workspace/unaligned.20170110/sample_bad')
 
+
+
+class fake_enums(object):
+    def has_tag(self, field, tag):
+        return True
+
+
+class fake_ftp(object):
+    def __init__(self, missing=()):
+        self.missing = missing
+
+    def file_exists(self, file_path):
+        return not file_path in self.missing
+
+
+def test_prepare_submittable_ftp_file_missing(ctx):
+    from egasub.submission.submit import _prepare_submittable
+    ctx.obj['EGA_ENUMS'] = fake_enums()
+    submission_dir = 'tests/data/workspace/unaligned.20170110/sample_x'
+    try:
+        submittable = _prepare_submittable(ctx, Unaligned, submission_dir, fake_ftp())
+        assert submittable.sample.alias == 'sample_x'
+
+        # not submitted while a data file is missing on the FTP server
+        file_name = submittable.run.files[0].file_name
+        assert _prepare_submittable(ctx, Unaligned, submission_dir, fake_ftp(missing=[file_name])) is None
+    finally:
+        del ctx.obj['EGA_ENUMS']
@@ -0,0 +1,46 @@
+from egasub.ega.services.alias_index import AliasIndex
+
+index = AliasIndex()
+index.load('sample', [
+        {'id': 'EGAN1', 'alias': 'sample_x', 'status': 'SUBMITTED'},
+        {'id': 'EGAN2', 'alias': 'sample_y', 'status': 'DRAFT'},
+        {'id': 'EGAN3', 'alias': 'sample_y', 'status': 'VALIDATED'},
+        {'id': 'EGAN4', 'alias': None, 'status': 'DRAFT'}
+    ])
+
+def test_covers():
+    assert index.covers('sample')
+    assert not index.covers('run')
+
+def test_lookup():
+    assert index.lookup('sample', 'sample_x') == [{'id': 'EGAN1', 'status': 'SUBMITTED'}]
+    assert len(index.lookup('sample', 'sample_y')) == 2
+    assert index.lookup('sample', 'sample_z') == []
+
+def test_add_update_remove():
+    index.add('sample', 'sample_z', 'EGAN5', 'DRAFT')
+    index.add('run', 'run_z', 'EGAR1', 'DRAFT')  # not covered, ignored
+    assert index.lookup('sample', 'sample_z') == [{'id': 'EGAN5', 'status': 'DRAFT'}]
+    assert not index.covers('run')
+
+    index.update_status('sample', 'EGAN5', 'SUBMITTED')
+    assert index.lookup('sample', 'sample_z') == [{'id': 'EGAN5', 'status': 'SUBMITTED'}]
+
+    index.remove('sample', 'EGAN2')
+    assert index.lookup('sample', 'sample_y') == [{'id': 'EGAN3', 'status': 'VALIDATED'}]
+    index.remove('sample', 'EGAN5')
+    assert index.lookup('sample', 'sample_z') == []
+
+def test_submitted_object(fake_ctx, fake_obj):
+    from egasub.ega.services import submitted_object
+
+    ctx = fake_ctx(ALIAS_INDEX=AliasIndex())
+    ctx.obj['ALIAS_INDEX'].load('sample', [
+            {'id': 'a1', 'alias': 'sample_x', 'status': 'SUBMITTED', 'egaAccessionId': 'EGAN00001000001'},
+            {'id': 'a2', 'alias': 'sample_x', 'status': 'SUBMITTED', 'egaAccessionId': 'EGAN00001000002'},
+            {'id': 'a3', 'alias': 'sample_y', 'status': 'VALIDATED'}
+        ])
+    assert submitted_object(ctx, 'sample', fake_obj('sample_x'))['egaAccessionId'] == 'EGAN00001000001'
+    assert submitted_object(ctx, 'sample', fake_obj('sample_x', 'a2')) == \
+                {'id': 'a2', 'status': 'SUBMITTED', 'egaAccessionId': 'EGAN00001000002'}
+    assert submitted_object(ctx, 'sample', fake_obj('sample_y')) is None
@@ -75,3 +75,13 @@ def test_to_dict():
         'status': None
     }, analysis.to_dict()) == 0
 
+def test_to_xml():
+    element = analysis.to_xml()
+    assert element.get('center_name') == 'analysis center'
+    assert [(r.get('refname'), r.get('label')) for r in element.findall('SAMPLE_REF')] == \
+                [('a value 1', 'a label 1'), ('a value 2', 'a label 2')]
+    # without enums, ids are written as they are
+    assert element.find('ANALYSIS_TYPE/REFERENCE_ALIGNMENT/ASSEMBLY/STANDARD').get('refname') == '4'
+    assert len(element.findall('ANALYSIS_TYPE/REFERENCE_ALIGNMENT/SEQUENCE')) == 2
+    assert [f.get('filename') for f in element.findall('FILES/FILE')] == ['file name1', 'file name2']
+    assert len(element.findall('ANALYSIS_ATTRIBUTES/ANALYSIS_ATTRIBUTE')) == 3  # platform and attributes
@@ -12,4 +12,10 @@ def test_unit():
     assert 'an unit' == attribute.unit
     
 def test_to_dict():
-    assert cmp({'tag':'The tag','value':'The value','unit':'an unit'}, attribute.to_dict()) == 0
\ No newline at end of file
+    assert cmp({'tag':'The tag','value':'The value','unit':'an unit'}, attribute.to_dict()) == 0
+
+def test_to_xml():
+    element = attribute.to_xml('ANALYSIS_ATTRIBUTE')
+    assert element.tag == 'ANALYSIS_ATTRIBUTE'
+    assert [(e.tag, e.text) for e in element] == [('TAG', 'The tag'), ('VALUE', 'The value'), ('UNIT', 'an unit')]
+    assert [e.tag for e in Attribute('gender', 'male').to_xml()] == ['TAG', 'VALUE']
@@ -0,0 +1,143 @@
+import os
+import glob
+import hashlib
+import yaml
+import pytest
+from egasub import checksum as checksum_module
+from egasub.checksum import md5sum, md5sums, md5sum_file, write_md5sum_file, ChecksumCache
+from egasub.submission import checksum as checksum_command
+from egasub.submission.checksum import perform_checksum
+from egasub.submission.submittable import Alignment
+
+
+def make_submission_dir(tmpdir):
+    tmpdir.mkdir('.egasub')
+    submission_dir = tmpdir.mkdir('sample_x')
+    submission_dir.join('analysis.yaml').write(yaml.safe_dump({
+            'sample': {'alias': 'sample_x'},
+            'analysis': {'title': 'a title'},
+            'files': [{'fileName': 'alignment.1/sample_x/reads.bam.gpg'}]
+        }))
+    submission_dir.join('reads.bam').write('unencrypted')
+    submission_dir.join('reads.bam.gpg').write('encrypted')
+    return str(submission_dir)
+
+
+def test_md5sum(tmpdir):
+    data_file = tmpdir.join('data')
+    data_file.write('x' * 1000)
+    assert md5sum(str(data_file), chunk_size=64) == hashlib.md5('x' * 1000).hexdigest()
+
+def test_md5sums(tmpdir):
+    paths = []
+    for i in range(4):
+        tmpdir.join(str(i)).write(str(i))
+        paths.append(str(tmpdir.join(str(i))))
+    assert md5sums(paths, jobs=2) == dict((p, hashlib.md5(os.path.basename(p)).hexdigest()) for p in paths)
+    assert md5sums([], jobs=2) == {}
+
+    # unreadable files
+    missing = str(tmpdir.join('missing'))
+    errors = {}
+    assert md5sums(paths[:1] + [missing], jobs=2, errors=errors) == {paths[0]: hashlib.md5('0').hexdigest()}
+    assert errors.keys() == [missing]
+    with pytest.raises(IOError):
+        md5sums([missing], jobs=1)
+
+def test_write_md5sum_file(tmpdir):
+    data_file = str(tmpdir.join('data'))
+    write_md5sum_file(data_file, 'abc')
+    assert open(md5sum_file(data_file)).read() == 'abc\n'
+
+def test_perform_checksum(tmpdir, fake_ctx):
+    submission_dir = make_submission_dir(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='alignment')
+
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 0
+    for name, content in (('reads.bam', 'unencrypted'), ('reads.bam.gpg', 'encrypted')):
+        assert open(os.path.join(submission_dir, name + '.md5')).read().strip() == hashlib.md5(content).hexdigest()
+
+    assert perform_checksum(ctx, [submission_dir], verify=True, jobs=1) == 0
+
+    with open(os.path.join(submission_dir, 'reads.bam'), 'a') as f:
+        f.write('changed')
+    assert perform_checksum(ctx, [submission_dir], verify=True, jobs=1) == 1
+
+def test_verify_missing_md5sum_file(tmpdir, fake_ctx):
+    submission_dir = make_submission_dir(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='alignment')
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 0
+
+    os.remove(os.path.join(submission_dir, 'reads.bam.gpg.md5'))
+    assert perform_checksum(ctx, [submission_dir], verify=True, jobs=1) == 1
+
+def test_missing_data_files(tmpdir, fake_ctx):
+    submission_dir = make_submission_dir(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='alignment')
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 0
+
+    # the unencrypted original may be gone once its md5sum file is written, but not when verifying
+    os.remove(os.path.join(submission_dir, 'reads.bam'))
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 0
+    assert perform_checksum(ctx, [submission_dir], verify=True, jobs=1) == 1
+
+    os.remove(os.path.join(submission_dir, 'reads.bam.md5'))
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 1
+
+def test_unreadable_data_file(tmpdir, monkeypatch, fake_ctx):
+    submission_dir = make_submission_dir(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='alignment')
+    md5sum = checksum_module.md5sum
+
+    def unreadable(path, *args):
+        if path.endswith('.gpg'):
+            raise IOError(5, 'Input/output error', path)
+        return md5sum(path, *args)
+    monkeypatch.setattr(checksum_module, 'md5sum', unreadable)
+
+    # the other files are still done
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 1
+    assert os.path.isfile(os.path.join(submission_dir, 'reads.bam.md5'))
+    assert not os.path.isfile(os.path.join(submission_dir, 'reads.bam.gpg.md5'))
+
+def test_checksum_cache(tmpdir):
+    data_file = tmpdir.join('reads.bam')
+    data_file.write('data')
+
+    with ChecksumCache(str(tmpdir.join('cache.db'))) as cache:
+        assert cache.get(str(data_file)) is None
+        cache.put(str(data_file), 'abc')
+        assert cache.get(str(data_file)) == 'abc'
+
+        # moved to another submission directory
+        moved = tmpdir.mkdir('sample_y').join('reads.bam')
+        data_file.rename(moved)
+        assert cache.get(str(moved)) == 'abc'
+        assert cache.prune() == 0
+
+        # changed
+        moved.write('other data')
+        assert cache.get(str(moved)) is None
+        assert cache.prune() == 1
+
+def test_perform_checksum_uses_cache(tmpdir, monkeypatch, fake_ctx):
+    submission_dir = make_submission_dir(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='alignment')
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 0
+
+    hashed = []
+    monkeypatch.setattr(checksum_command, 'md5sums', lambda paths, jobs, errors=None: hashed.extend(paths) or {})
+    assert perform_checksum(ctx, [submission_dir], verify=True, jobs=1) == 0
+    assert hashed == []
+
+def test_submittable_md5sum_from_cache(tmpdir, fake_ctx):
+    submission_dir = make_submission_dir(tmpdir)
+    ctx = fake_ctx(WORKSPACE_PATH=str(tmpdir), CURRENT_DIR_TYPE='alignment')
+    assert perform_checksum(ctx, [submission_dir], jobs=1) == 0
+    for md5_file in glob.glob(os.path.join(submission_dir, '*.md5')):
+        os.remove(md5_file)
+
+    with ChecksumCache(str(tmpdir.join('.egasub', 'checksum_cache.db'))) as cache:
+        alignment = Alignment(submission_dir, checksum_cache=cache)
+    assert alignment.files[0].checksum == hashlib.md5('encrypted').hexdigest()
+    assert alignment.files[0].unencrypted_checksum == hashlib.md5('unencrypted').hexdigest()
@@ -0,0 +1,35 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+RUN_CLI = r"""
+import sys
+from egasub.cli import main
+try:
+    main(sys.argv[1:], standalone_mode=False)
+except SystemExit:
+    pass
+sys.stderr.write('\nloaded: ' + ' '.join(sorted(m for m in sys.modules if m.split('.')[0] in ('requests', 'ftplib'))))
+"""
+
+
+def loaded_modules(args, cwd):
+    p = subprocess.Popen([sys.executable, '-c', RUN_CLI] + args, cwd=cwd,
+                         env=dict(os.environ, PYTHONPATH=ROOT),
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = p.communicate()
+    assert 'loaded:' in err, err
+    return err.rsplit('loaded:', 1)[-1].split()
+
+
+def test_light_commands_skip_http_and_ftp(tmpdir):
+    tmpdir.mkdir('.egasub').join('config.yaml').write('ega_submitter_account: test\n')
+    submission_dir = tmpdir.mkdir('unaligned.test')
+    submission_dir.mkdir('sample_x')
+
+    assert loaded_modules(['--help'], str(tmpdir)) == []
+    assert loaded_modules(['status'], str(submission_dir)) == []
+    assert loaded_modules(['new', 'sample_x'], str(submission_dir)) == []
+    assert submission_dir.join('sample_x', 'experiment.yaml').check()
@@ -0,0 +1,80 @@
+import time
+import threading
+from egasub.ega.services import deletion_queue
+from egasub.ega.services.deletion_queue import DeletionQueue, deletion_chain
+from egasub.submission.submitter import Submitter
+
+
+def recording_delete(monkeypatch, delay=0, fail=()):
+    deleted = []
+    lock = threading.Lock()
+
+    def delete_obj(ctx, obj_type, obj_id):
+        time.sleep(delay)
+        if obj_id in fail:
+            raise ValueError('No JSON object could be decoded')
+        with lock:
+            deleted.append((obj_type, obj_id))
+
+    monkeypatch.setattr(deletion_queue, 'delete_obj', delete_obj)
+    return deleted
+
+
+def test_deletion_chain():
+    assert deletion_chain([('sample', 'S1'), ('experiment', 'E1'), ('run', 'R1'), ('experiment', 'E0')]) == \
+                [('run', 'R1'), ('experiment', 'E1'), ('experiment', 'E0'), ('sample', 'S1')]
+    assert deletion_chain([('sample', 'S1'), ('analysis', 'A1')]) == [('analysis', 'A1'), ('sample', 'S1')]
+
+
+def test_background(monkeypatch, fake_ctx):
+    deleted = recording_delete(monkeypatch, delay=0.05)
+    queue = DeletionQueue(fake_ctx(), jobs=4)
+
+    start = time.time()
+    for i in range(4):
+        queue.delete([('experiment', 'E%s' % i), ('run', 'R%s' % i), ('sample', None)])
+    assert time.time() - start < 0.05  # delete() does not wait
+
+    assert queue.flush() == 0
+    assert time.time() - start < 0.3  # chains deleted concurrently
+    assert len(deleted) == 8
+    for i in range(4):
+        assert deleted.index(('run', 'R%s' % i)) < deleted.index(('experiment', 'E%s' % i))
+
+    # after flush deletions are held for the next flush
+    queue.delete([('sample', 'S9')])
+    assert not ('sample', 'S9') in deleted
+    queue.flush()
+    assert ('sample', 'S9') in deleted
+
+
+def test_deferred(monkeypatch, fake_ctx):
+    deleted = recording_delete(monkeypatch, fail=('R1',))
+    with DeletionQueue(fake_ctx(), jobs=2, mode='deferred') as queue:
+        queue.delete([('experiment', 'E1'), ('run', 'R1')])
+        queue.delete([('analysis', 'A2'), ('sample', 'S2')])
+        assert deleted == []
+
+    assert sorted(deleted) == [('analysis', 'A2'), ('experiment', 'E1'), ('sample', 'S2')]
+    assert queue.failed == 1
+
+
+def test_submitter_clean_up(monkeypatch, fake_ctx):
+    from egasub.submission import submitter as submitter_module
+    deleted = []
+    monkeypatch.setattr(submitter_module, 'delete_obj', lambda ctx, t, i: deleted.append((t, i)))
+
+    ctx = fake_ctx()
+    submitter = Submitter(ctx)
+    submitter.clean_up([('sample', 'S1'), ('run', 'R1'), ('experiment', 'E1')])
+    assert deleted == [('run', 'R1'), ('experiment', 'E1'), ('sample', 'S1')]
+
+    class fake_queue(object):
+        def __init__(self):
+            self.chains = []
+        def delete(self, deletions):
+            self.chains.append(deletions)
+    queue = ctx.obj['DELETION_QUEUE'] = fake_queue()
+    submitter.clean_up([('sample', 'S2')])
+    assert queue.chains == [[('sample', 'S2')]]
+    assert len(deleted) == 3
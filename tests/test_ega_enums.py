@@ -0,0 +1,58 @@
+import os
+import shutil
+import pytest
+from egasub.ega.entities import EgaEnums
+from egasub.ega.entities.ega_enums import build_snapshot, ENUMS_DIR
+
+
+def test_loaded_on_first_use():
+    ega_enums = EgaEnums()
+    assert ega_enums._enums == {}
+    ega_enums.lookup('genders')
+    assert ega_enums._enums.keys() == ['genders']
+
+def test_lookup():
+    assert [g['tag'] for g in EgaEnums().lookup('genders')] == ['0', '1', '2']
+
+def test_has_tag():
+    ega_enums = EgaEnums()
+    assert ega_enums.has_tag('genders', 1)
+    assert ega_enums.has_tag('genders', '1')
+    assert not ega_enums.has_tag('genders', 5)
+    assert not ega_enums.has_tag('genders', None)
+
+def test_value_and_tag():
+    ega_enums = EgaEnums()
+    assert ega_enums.value_of('genders', 0) == 'female'
+    assert ega_enums.value_of('genders', 5) is None
+    assert ega_enums.tag_of('genders', 'male') == '1'
+
+def test_unknown_enum():
+    with pytest.raises(KeyError):
+        EgaEnums().lookup('colors')
+
+def test_snapshot(tmpdir):
+    snapshot_file = str(tmpdir.join('enums.snapshot'))
+    build_snapshot(snapshot_file=snapshot_file)
+
+    ega_enums = EgaEnums(snapshot_file)
+    assert ega_enums.value_of('genders', 0) == 'female'
+    assert 'signature' in ega_enums._enums['genders']
+
+def test_stale_snapshot(tmpdir):
+    enums_dir = tmpdir.mkdir('enums')
+    for name in os.listdir(ENUMS_DIR):
+        shutil.copy(os.path.join(ENUMS_DIR, name), str(enums_dir))
+    enums_dir.join('genders.json').write(enums_dir.join('genders.json').read().replace('female', 'f'))
+    snapshot_file = str(tmpdir.join('enums.snapshot'))
+    build_snapshot(str(enums_dir), snapshot_file)
+
+    ega_enums = EgaEnums(snapshot_file)
+    assert ega_enums.value_of('genders', 0) == 'female'
+    assert not 'signature' in ega_enums._enums['genders']
+    assert 'signature' in ega_enums._enum('case_control')
+
+def test_broken_snapshot(tmpdir):
+    snapshot_file = tmpdir.join('enums.snapshot')
+    snapshot_file.write('not a snapshot')
+    assert EgaEnums(str(snapshot_file)).value_of('genders', 0) == 'female'
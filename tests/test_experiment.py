@@ -67,4 +67,15 @@ def test_alias():
     
 def test_id():
     assert 22 == experiment.id
-    
\ No newline at end of file
+
+def test_to_xml():
+    from egasub.ega.entities import EgaEnums
+    experiment = Experiment('an alias', 'The title', 12, 0, 1, 2, 'design', 'lib', None, 0, 300, 20,
+                            'sample_x', 'EGAS00001000001', None)
+    element = experiment.to_xml(EgaEnums())
+    assert element.find('STUDY_REF').get('accession') == 'EGAS00001000001'
+    # the sample is sent along, referred to by alias
+    assert element.find('DESIGN/SAMPLE_DESCRIPTOR').get('refname') == 'sample_x'
+    assert element.findtext('DESIGN/LIBRARY_DESCRIPTOR/LIBRARY_SOURCE') == 'GENOMIC'
+    assert element.find('DESIGN/LIBRARY_DESCRIPTOR/LIBRARY_LAYOUT/PAIRED').get('NOMINAL_LENGTH') == '300'
+    assert element.findtext('PLATFORM/ION_TORRENT/INSTRUMENT_MODEL') == 'Ion Torrent Proton'
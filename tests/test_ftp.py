@@ -0,0 +1,135 @@
+import pytest
+from ftplib import error_temp, error_perm
+from egasub.ega.services import ftp as ftp_module
+from egasub.ega.services.ftp import FtpSession, FtpInventory
+
+
+class FakeFTP(object):
+    connections = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.commands = []
+        self.drop_next = False
+        FakeFTP.connections.append(self)
+
+    def login(self, username, password):
+        self.commands.append('login')
+
+    def size(self, path):
+        if self.drop_next:
+            self.drop_next = False
+            raise error_temp('421 Timeout.')
+        self.commands.append('size')
+        if path == 'missing':
+            raise error_perm('550 No such file.')
+        return 10
+
+    def retrlines(self, command, callback):
+        self.commands.append(command)
+        if command == 'MLSD missing_dir':
+            raise error_perm('550 No such directory.')
+        callback('type=cdir;modify=20170110120000; .')
+        callback('type=file;size=42;modify=20170110120000; reads.fq.gz.gpg')
+
+    def quit(self):
+        self.commands.append('quit')
+
+
+@pytest.fixture
+def fake_ftp(monkeypatch):
+    FakeFTP.connections = []
+    monkeypatch.setattr(ftp_module, 'FTP', FakeFTP)
+    return FakeFTP
+
+
+def test_one_login_for_many_commands(fake_ftp):
+    with FtpSession('host', 'user', 'password') as ftp:
+        assert ftp.file_exists('a')
+        assert ftp.file_exists('b')
+
+    assert len(fake_ftp.connections) == 1
+    assert fake_ftp.connections[0].commands == ['login', 'size', 'size', 'quit']
+
+def test_reconnect_when_dropped(fake_ftp):
+    with FtpSession('host', 'user', 'password') as ftp:
+        ftp.size('a')
+        fake_ftp.connections[0].drop_next = True
+        assert ftp.size('b') == 10
+
+    assert len(fake_ftp.connections) == 2
+    assert fake_ftp.connections[1].commands == ['login', 'size', 'quit']
+
+def test_missing_file(fake_ftp):
+    with FtpSession('host', 'user', 'password') as ftp:
+        assert not ftp.file_exists('missing')
+
+def test_listdir_mlsd(fake_ftp):
+    with FtpSession('host', 'user', 'password') as ftp:
+        assert ftp.listdir('sample_x') == {'reads.fq.gz.gpg': {'size': 42, 'modify': '20170110120000'}}
+        assert ftp.listdir('missing_dir') == {}
+
+
+class FakeSession(object):
+    def __init__(self, names=('reads.fq.gz.gpg',)):
+        self.listed = []
+        self.names = list(names)
+
+    def listdir(self, path):
+        self.listed.append(path)
+        return dict((name, {'size': 42, 'modify': None}) for name in self.names)
+
+
+def test_inventory_lists_each_dir_once():
+    session = FakeSession()
+    inventory = FtpInventory(session, ttl=0)
+    assert inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+    assert not inventory.file_exists('batch/sample_x/other.fq.gz.gpg')
+    assert inventory.stat('/batch/sample_x/reads.fq.gz.gpg')['size'] == 42
+    assert session.listed == ['batch/sample_x']
+
+def test_inventory_cache(tmpdir):
+    cache_file = str(tmpdir.join('ftp_index.json'))
+
+    session = FakeSession()
+    with FtpInventory(session, cache_file, ttl=3600) as inventory:
+        assert inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+
+    # a second run within the ttl does not list again
+    session = FakeSession()
+    with FtpInventory(session, cache_file, ttl=3600) as inventory:
+        assert inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+    assert session.listed == []
+
+    # expired entries are listed again
+    session = FakeSession()
+    with FtpInventory(session, cache_file, ttl=-1) as inventory:
+        assert inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+    assert session.listed == ['batch/sample_x']
+
+def test_no_connection_until_used(fake_ftp):
+    with FtpSession('host', 'user', 'password'):
+        pass
+    assert not fake_ftp.connections
+
+def test_inventory_file_uploaded_after_cached_listing(tmpdir):
+    cache_file = str(tmpdir.join('ftp_index.json'))
+
+    # dry run before the upload
+    session = FakeSession(names=[])
+    with FtpInventory(session, cache_file, ttl=3600) as inventory:
+        assert not inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+    assert session.listed == ['batch/sample_x']
+
+    # the cached listing does not have the uploaded file, it is listed again once
+    session = FakeSession()
+    with FtpInventory(session, cache_file, ttl=3600) as inventory:
+        assert inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+        assert not inventory.file_exists('batch/sample_x/other.fq.gz.gpg')
+    assert session.listed == ['batch/sample_x']
+
+    # and the new listing is cached
+    session = FakeSession()
+    with FtpInventory(session, cache_file, ttl=3600) as inventory:
+        assert inventory.file_exists('batch/sample_x/reads.fq.gz.gpg')
+    assert session.listed == []
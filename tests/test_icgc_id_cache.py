@@ -0,0 +1,92 @@
+import time
+import pytest
+from egasub.utils import run_parallel
+from egasub.icgc import services as icgc_services
+from egasub.icgc.services import icgc_id
+from egasub.icgc.services.id_cache import IcgcIdCache
+
+
+def test_single_flight(tmpdir):
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.1)
+        return 'DO1', True
+
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        ids = run_parallel(lambda _: cache.get(('donor', 'PACA-CA', 'donor_1', False), fetch), range(8), 8)
+        assert ids == ['DO1'] * 8
+        assert len(fetches) == 1
+
+    # persisted
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        assert ('donor', 'PACA-CA', 'donor_1', False) in cache
+        assert cache.get(('donor', 'PACA-CA', 'donor_1', False), None) == 'DO1'
+
+
+def test_failed_lookups_not_cached(tmpdir):
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        assert cache.get(('sample', 'PACA-CA', 's1', False), lambda: ('Not found', False)) == 'Not found'
+        assert not ('sample', 'PACA-CA', 's1', False) in cache
+
+        def fail():
+            raise IOError('connection refused')
+        with pytest.raises(IOError):
+            cache.get(('sample', 'PACA-CA', 's1', False), fail)
+        assert cache.get(('sample', 'PACA-CA', 's1', False), lambda: ('SA1', True)) == 'SA1'
+
+
+def test_icgc_id_donor_looked_up_once(tmpdir, monkeypatch, fake_ctx, fake_response):
+    requests_made = []
+
+    def id_request(ctx, type_, project_code, submitter_id, create=True, is_test=False):
+        requests_made.append((type_, submitter_id))
+        if submitter_id == 'unknown':
+            return fake_response('{"error": "Unauthorized"}', 401)
+        return fake_response('DO250183')
+
+    monkeypatch.setattr(icgc_services, '_id_request', id_request)
+
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        ctx = fake_ctx({'icgc_id_service_token': 'token'}, ICGC_ID_CACHE=cache)
+        # tumour and normal sample of the same donor
+        assert icgc_id(ctx, 'donor', 'PACA-CA', 'donor_1') == 'DO250183'
+        assert icgc_id(ctx, 'donor', 'PACA-CA', 'donor_1') == 'DO250183'
+        assert requests_made == [('donor', 'donor_1')]
+
+        # errors are returned as before, and asked again next time
+        assert icgc_id(ctx, 'donor', 'PACA-CA', 'unknown') == '{"error": "Unauthorized"}'
+        icgc_id(ctx, 'donor', 'PACA-CA', 'unknown')
+        assert len(requests_made) == 3
+
+
+def test_icgc_id_test_and_production_apart(tmpdir, monkeypatch, fake_ctx, fake_response):
+    def id_request(ctx, type_, project_code, submitter_id, create=True, is_test=False):
+        return fake_response('DO_TEST' if is_test else 'DO250183')
+
+    monkeypatch.setattr(icgc_services, '_id_request', id_request)
+
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        ctx = fake_ctx({'icgc_id_service_token': 'token'}, ICGC_ID_CACHE=cache)
+        assert icgc_id(ctx, 'donor', 'PACA-CA', 'donor_1', True, True) == 'DO_TEST'
+        assert icgc_id(ctx, 'donor', 'PACA-CA', 'donor_1', True, False) == 'DO250183'
+
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        assert cache.get(('donor', 'PACA-CA', 'donor_1', True), None) == 'DO_TEST'
+        assert cache.get(('donor', 'PACA-CA', 'donor_1', False), None) == 'DO250183'
+
+
+def test_cache_without_is_test_dropped(tmpdir):
+    import sqlite3
+    db = sqlite3.connect(str(tmpdir.join('icgc_ids.db')))
+    db.execute("CREATE TABLE icgc_ids (entity_type TEXT, project_code TEXT, submitter_id TEXT, response TEXT, "
+               "fetched_at INTEGER, PRIMARY KEY (entity_type, project_code, submitter_id))")
+    db.execute("INSERT INTO icgc_ids VALUES ('donor', 'PACA-CA', 'donor_1', 'DO1', 0)")
+    db.commit()
+    db.close()
+
+    # it is not known whether the IDs came from the test or the production service
+    with IcgcIdCache(str(tmpdir.join('icgc_ids.db'))) as cache:
+        assert not ('donor', 'PACA-CA', 'donor_1', False) in cache
+        assert cache.get(('donor', 'PACA-CA', 'donor_1', False), lambda: ('DO2', True)) == 'DO2'
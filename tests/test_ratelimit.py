@@ -0,0 +1,103 @@
+import threading
+import httpretty
+from egasub.ratelimit import AimdLimiter, RetryingSession, backoff_delay, session_options
+
+
+def test_backoff_delay():
+    assert all(0 <= backoff_delay(3, 0.5) <= 4 for _ in range(100))
+    assert all(backoff_delay(20, 0.5, max_backoff=30) <= 30 for _ in range(100))
+
+
+def test_aimd_limiter():
+    limiter = AimdLimiter(initial=4, maximum=8, cooldown=60)
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(latency=0.01)
+    assert 6 < limiter.limit <= 8
+
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limit = limiter.limit
+    assert 3 < limit <= 4
+
+    # within the cooldown further failures do not decrease again
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == limit
+
+    # a latency spike counts as throttled
+    limiter = AimdLimiter(initial=4, cooldown=0)
+    limiter.acquire()
+    limiter.release(latency=0.01)
+    limit = limiter.limit
+    limiter.acquire()
+    limiter.release(latency=1)
+    assert limiter.limit == limit / 2
+
+
+def test_aimd_limiter_blocks_at_limit():
+    limiter = AimdLimiter(initial=2)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def third():
+        limiter.acquire()
+        acquired.set()
+
+    t = threading.Thread(target=third)
+    t.start()
+    assert not acquired.wait(0.1)
+    limiter.release(latency=0.01)
+    assert acquired.wait(1)
+    t.join()
+
+
+def test_retry_idempotent(mock_server):
+    url = 'http://example.com/ratelimit/samples'
+    httpretty.register_uri(httpretty.GET, url, responses=[
+                                httpretty.Response('busy', status=503),
+                                httpretty.Response('error', status=500),
+                                httpretty.Response('ok')
+                            ])
+    session = RetryingSession(backoff=0, limiter=AimdLimiter())
+    assert session.get(url).text == 'ok'
+    assert session.limiter.inflight == 0
+
+    session = RetryingSession(retries=0, backoff=0)
+    httpretty.register_uri(httpretty.GET, url, status=500, body='error')
+    assert session.get(url).status_code == 500
+
+
+def test_retry_non_idempotent(mock_server):
+    url = 'http://example.com/ratelimit/submissions'
+    session = RetryingSession(backoff=0)
+
+    # a failed POST may have been processed, not retried
+    httpretty.register_uri(httpretty.POST, url, responses=[httpretty.Response('error', status=500),
+                                                           httpretty.Response('ok')])
+    assert session.post(url).status_code == 500
+
+    # throttled calls were not processed, retried
+    httpretty.register_uri(httpretty.POST, url, responses=[httpretty.Response('slow down', status=429),
+                                                           httpretty.Response('ok')])
+    assert session.post(url).text == 'ok'
+
+    httpretty.register_uri(httpretty.PUT, url, responses=[httpretty.Response('error', status=502),
+                                                          httpretty.Response('ok')])
+    assert session.put(url, idempotent=True).text == 'ok'
+
+
+def test_timeouts():
+    session = RetryingSession(timeout=60, timeouts={'login': 10, 'samples': 30, 'samples?status': 120})
+    assert session._timeout_for('https://ega.crg.eu/submitterportal/v1/login') == 10
+    assert session._timeout_for('https://ega.crg.eu/submitterportal/v1/samples/1') == 30
+    assert session._timeout_for('https://ega.crg.eu/submitterportal/v1/samples?status=DRAFT') == 120
+    assert session._timeout_for('https://ega.crg.eu/submitterportal/v1/runs') == 60
+
+
+def test_session_options():
+    options = session_options({'ega_timeout': 5, 'ega_retries': 1}, 'ega', jobs=8)
+    assert (options['timeout'], options['retries']) == (5, 1)
+    assert options['limiter'].maximum == 32
+    assert not 'limiter' in session_options({'icgc_adaptive_concurrency': False}, 'icgc')
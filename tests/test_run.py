@@ -32,4 +32,12 @@ def test_to_dict():
         }, run.to_dict()) == 0
     
 def test_alias():
-    assert 'an alias' == run.alias
\ No newline at end of file
+    assert 'an alias' == run.alias
+
+def test_to_xml():
+    from egasub.ega.entities import EgaEnums
+    run = Run('an alias', None, 0, 'EGAX00001000001', files, None)
+    element = run.to_xml(EgaEnums())
+    assert element.find('EXPERIMENT_REF').get('accession') == 'EGAX00001000001'
+    f = element.find('DATA_BLOCK/FILES/FILE')
+    assert (f.get('filename'), f.get('filetype'), f.get('checksum')) == ('file name 1', 'bam', 'checksum1')
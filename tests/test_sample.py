@@ -74,4 +74,13 @@ def test_to_dict():
             'status': None
         }, sample.to_dict()) == 0
 
-        
\ No newline at end of file
+def test_to_xml():
+    from egasub.ega.entities import EgaEnums
+    element = sample.to_xml(EgaEnums())
+    assert element.tag == 'SAMPLE'
+    assert element.get('alias') == 'an alias' and element.get('accession') == '33'
+    assert element.findtext('SAMPLE_NAME/TAXON_ID') == '9606'
+    attrs = dict((a.findtext('TAG'), a.findtext('VALUE')) for a in element.findall('SAMPLE_ATTRIBUTES/SAMPLE_ATTRIBUTE'))
+    assert attrs['gender'] == 'unknown'  # enum value of gender 2
+    assert attrs['subject_id'] == '33'
+    assert attrs['tag1'] == 'value1'
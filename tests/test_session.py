@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import httpretty
+from egasub.utils import run_parallel
+from egasub.ega.services.session import EgaSession, TokenCache, get_session
+
+
+def test_get_session_reused(fake_ctx):
+    ctx = fake_ctx()
+    session = get_session(ctx)
+    assert isinstance(session, EgaSession)
+    assert get_session(ctx) is session
+    assert ctx.obj['EGA_SESSION'] is session
+
+def test_pool_size_setting(fake_ctx):
+    session = get_session(fake_ctx({'http_pool_size': 3}))
+    adapter = session.get_adapter('https://ega.crg.eu/')
+    assert adapter._pool_maxsize == 3
+
+def test_keep_alive_setting(fake_ctx):
+    assert get_session(fake_ctx()).headers['Connection'] == 'keep-alive'
+    assert get_session(fake_ctx({'http_keep_alive': False})).headers['Connection'] == 'close'
+
+def test_token_header():
+    session = EgaSession()
+    assert session.token is None
+    session.token = 'abcdefg'
+    assert session.headers['X-Token'] == 'abcdefg'
+    session.token = None
+    assert 'X-Token' not in session.headers
+
+def test_max_inflight_per_host():
+    session = EgaSession(max_inflight=2)
+    slot = session._host_slot('https://ega.crg.eu/submitterportal/v1/login')
+    assert slot is session._host_slot('https://ega.crg.eu/submitterportal/v1/samples')
+    assert not slot is session._host_slot('http://example.com/')
+    assert slot.acquire(False) and slot.acquire(False)
+    assert not slot.acquire(False)
+
+def test_token_cache(tmpdir):
+    cache_file = str(tmpdir.join('session.json'))
+    cache = TokenCache(cache_file, ttl=60)
+    assert cache.get('account', 'http://example.com/') is None
+
+    cache.put('account', 'http://example.com/', {'sessionToken': 'abcdefg', 'id': '12345'})
+    assert oct(os.stat(cache_file).st_mode & 0777) == '0600'
+    assert cache.get('account', 'http://example.com/') == {'sessionToken': 'abcdefg', 'id': '12345'}
+    assert cache.get('other', 'http://example.com/') is None
+    assert cache.get('account', 'https://ega.crg.eu/') is None
+    assert TokenCache(cache_file, ttl=0).get('account', 'http://example.com/') is None
+
+    cache.remove('account', 'http://example.com/')
+    assert cache.get('account', 'http://example.com/') is None
+
+def test_token_refresh(mock_server):
+    url = 'http://example.com/refresh/samples'
+    httpretty.register_uri(httpretty.GET, url,
+            body=lambda request, uri, headers: (200, headers,
+                    '{"header": {"code": "%s"}}' % ('200' if request.headers.get('X-Token') == 'new' else '401')))
+
+    session = EgaSession()
+    session.token = 'old'
+    logins = []
+
+    def relogin():
+        time.sleep(0.1)  # let the other workers hit the expired token too
+        logins.append(1)
+        session.token = 'new'
+
+    session.relogin = relogin
+    responses = run_parallel(lambda _: session.get(url), range(8), 8)
+    assert len(logins) == 1
+    assert all(json.loads(r.text)['header']['code'] == '200' for r in responses)
+
+    # own token and failed relogin are not retried
+    session.token = 'old'
+    assert session.get(url, headers={'X-Token': 'old'}).json()['header']['code'] == '401'
+    session.relogin = lambda: None
+    assert session.get(url).json()['header']['code'] == '401'
+
+def test_token_not_rejected_by_other_errors(mock_server):
+    url = 'http://example.com/refresh/submissions'
+    posts = []
+
+    def forbidden(request, uri, headers):
+        posts.append(request.body)
+        if request.body == 'forbidden':
+            return (403, headers, '{"header": {"code": "403", "userMessage": "Not allowed"}}')
+        return (200, headers, '{"header": {"code": "200", "userMessage": "Sample 401 of the study"}}')
+    httpretty.register_uri(httpretty.POST, url, body=forbidden)
+
+    session = EgaSession()
+    session.token = 'old'
+    logins = []
+    session.relogin = lambda: logins.append(1)
+
+    # a submission is not sent again for errors other than a rejected token
+    assert session.post(url, data='forbidden').status_code == 403
+    assert session.post(url, data='ok').json()['header']['code'] == '200'
+    assert posts == ['forbidden', 'ok']
+    assert logins == []
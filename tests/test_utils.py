@@ -0,0 +1,69 @@
+import yaml
+import marshal
+import datetime
+import threading
+import pytest
+from egasub.utils import run_parallel, run_pipelined, load_yaml, MetadataCache
+
+
+def test_run_parallel_keeps_order():
+    assert run_parallel(lambda x: x * 2, range(20), jobs=4) == [x * 2 for x in range(20)]
+
+def test_run_parallel_serial():
+    threads = run_parallel(lambda x: threading.current_thread().name, range(3), jobs=1)
+    assert set(threads) == set([threading.current_thread().name])
+
+def test_run_parallel_uses_workers():
+    threads = run_parallel(lambda x: threading.current_thread().name, range(3), jobs=3)
+    assert not threading.current_thread().name in threads
+
+def test_run_pipelined_back_pressure():
+    produced = []
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    seen = []
+    def consume(x):
+        # the producer can never get further ahead than the workers plus the backlog
+        assert len(produced) - len(seen) <= 2 + 2 + 1
+        seen.append(x)
+
+    assert run_pipelined(consume, items(), jobs=2, backlog=2) == 10
+    assert sorted(seen) == range(10)
+
+def test_run_pipelined_raises_worker_error():
+    def fail(x):
+        raise ValueError(x)
+
+    with pytest.raises(ValueError):
+        run_pipelined(fail, range(3), jobs=2)
+
+
+def test_load_yaml():
+    assert load_yaml('a: 1\nb: [x, y]\n') == {'a': 1, 'b': ['x', 'y']}
+    with pytest.raises(yaml.YAMLError):
+        load_yaml('!!python/object/apply:os.system ["true"]')
+
+
+def test_metadata_cache(tmpdir):
+    yaml_file = tmpdir.join('experiment.yaml')
+    yaml_file.write('sample:\n  alias: a\n')
+    cache = MetadataCache(str(tmpdir.join('.egasub', 'cache')))
+
+    assert cache.load(str(yaml_file)) == {'sample': {'alias': 'a'}}
+    assert len(tmpdir.join('.egasub', 'cache').listdir()) == 1
+
+    # loaded from the cache entry, not the YAML
+    cache_file = tmpdir.join('.egasub', 'cache').listdir()[0]
+    cache_file.write(marshal.dumps(((str(yaml_file), yaml_file.size(), yaml_file.stat().mtime), {'cached': True})), 'wb')
+    assert cache.load(str(yaml_file)) == {'cached': True}
+
+    # changed YAML is parsed again
+    yaml_file.write('sample:\n  alias: bb\n')
+    assert cache.load(str(yaml_file)) == {'sample': {'alias': 'bb'}}
+
+    # timestamps can not be marshalled, still loaded
+    yaml_file.write('date: 2017-01-10\n')
+    assert cache.load(str(yaml_file)) == {'date': datetime.date(2017, 1, 10)}
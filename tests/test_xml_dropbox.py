@@ -0,0 +1,148 @@
+import cgi
+import httpretty
+from StringIO import StringIO
+from egasub.ega.entities import Sample, Experiment, Run, File
+from egasub.ega.entities.xml_utils import ET
+from egasub.ega.services.xml_dropbox import xml_submission, submission_manifest, iter_document, \
+                                            XmlBatchWriter, MultipartBody, Receipt
+from egasub.submission import submitter as submitter_module
+from egasub.submission.submitter import Submitter
+
+
+RECEIPT = """<?xml version="1.0" encoding="UTF-8"?>
+<RECEIPT receiptDate="2017-02-01T10:00:00.000Z" submissionFile="submission.xml" success="%s">
+     <SAMPLE accession="EGAN00001000001" alias="sample_x" status="PRIVATE"/>
+     <EXPERIMENT accession="EGAX00001000001" alias="sample_x_experiment" status="PRIVATE"/>
+     <RUN accession="EGAR00001000001" alias="sample_x_run" status="PRIVATE"/>
+     <SUBMISSION accession="EGAB00001000001" alias="batch"/>
+     <MESSAGES>
+          <INFO>Submission has been committed.</INFO>
+          %s
+     </MESSAGES>
+     <ACTIONS>ADD</ACTIONS>
+</RECEIPT>"""
+
+
+SETTINGS = {'xmlApiUrl': 'http://example.com/drop-box/submit/', 'ega_study_id': 'EGAS00001000001',
+            'ega_submitter_account': 'ega-box-1', 'ega_submitter_password': 'secret'}
+
+
+def make_sample(alias):
+    return Sample(alias, 'title', None, 0, 1, None, None, None, 'phenotype', 'donor_1', None, None, None, None, [], None)
+
+
+def test_submission_manifest():
+    manifest = submission_manifest(['sample', 'run'], dry_run=True)
+    assert [(a.tag, a.get('source'), a.get('schema')) for a in manifest.findall('ACTIONS/ACTION/*')] == \
+                [('VALIDATE', 'sample.xml', 'sample'), ('VALIDATE', 'run.xml', 'run')]
+    manifest = submission_manifest(['sample'], dry_run=False)
+    assert [a.tag for a in manifest.findall('ACTIONS/ACTION/*')] == ['ADD', 'PROTECT']
+
+
+def test_iter_document():
+    chunks = iter_document('SAMPLE_SET', (make_sample('sample_%s' % i).to_xml() for i in range(3)))
+    document = ET.fromstring(''.join(chunks))
+    assert document.tag == 'SAMPLE_SET'
+    assert [s.get('alias') for s in document] == ['sample_0', 'sample_1', 'sample_2']
+
+
+def test_batch_writer():
+    with XmlBatchWriter() as batch:
+        batch.add('run', Run('sample_x_run', 'sample_x', 0, 'sample_x_experiment',
+                             [File(None, 'a.bam.gpg', 'abc', 'def', 'MD5')], None))
+        batch.add('sample', make_sample(u'sample_\xe9'))
+        batch.add('sample', make_sample('sample_y'))
+        assert batch.counts == {'sample': 2, 'run': 1}
+
+        documents = batch.close()
+        assert [t for t, _ in documents] == ['sample', 'run']  # in the order EGA processes them
+        f = documents[0][1]
+        f.seek(0)
+        samples = ET.parse(f).getroot()
+        assert [s.get('alias') for s in samples] == [u'sample_\xe9', 'sample_y']
+
+
+def test_multipart_body():
+    body = MultipartBody([('SAMPLE', 'sample.xml', StringIO('<SAMPLE_SET />'))])
+    content = ''.join(body)
+    assert len(body) == len(content)
+    # sent by blocks up to the end, then read again from the start when a request is retried
+    for _ in range(2):
+        assert ''.join(iter(lambda: body.read(10), '')) == content
+    fields = cgi.parse_multipart(StringIO(content), {'boundary': body.boundary})
+    assert fields == {'SAMPLE': ['<SAMPLE_SET />']}
+
+
+def test_receipt():
+    receipt = Receipt.from_xml(RECEIPT % ('true', ''))
+    assert receipt.success
+    assert receipt.accession('sample', 'sample_x') == 'EGAN00001000001'
+    assert receipt.accession('run', 'sample_x_run') == 'EGAR00001000001'
+    assert receipt.accession('run', 'sample_y_run') is None
+    assert receipt.infos == ['Submission has been committed.']
+
+    receipt = Receipt.from_xml(RECEIPT % ('false', '<ERROR>In sample, alias:"sample_x": Invalid gender.</ERROR>'))
+    assert not receipt.success
+    assert receipt.errors == ['In sample, alias:"sample_x": Invalid gender.']
+
+
+def test_xml_submission(mock_server, fake_ctx):
+    httpretty.register_uri(httpretty.POST, 'http://example.com/drop-box/submit/', body=RECEIPT % ('true', ''))
+
+    with XmlBatchWriter() as batch:
+        batch.add('sample', make_sample('sample_x'))
+        batch.add('sample', make_sample('sample_y'))
+        receipt = xml_submission(fake_ctx(SETTINGS, SUBMISSION={}), batch, dry_run=False)
+    assert receipt.success
+
+    request = httpretty.last_request()
+    assert request.querystring['auth'] == ['EGA ega-box-1 secret']
+    content_type, params = cgi.parse_header(request.headers['Content-Type'])
+    assert content_type == 'multipart/form-data'
+    fields = cgi.parse_multipart(StringIO(request.body), {'boundary': params['boundary']})
+    assert sorted(fields) == ['SAMPLE', 'SUBMISSION']
+    assert fields['SAMPLE'][0].count('<SAMPLE alias=') == 2
+    assert '<ADD schema="sample" source="sample.xml" />' in fields['SUBMISSION'][0]
+
+
+def make_submittable(fake_submittable, name):
+    return fake_submittable(name, make_sample(name),
+                            Experiment(None, 'title', 12, 0, 1, 2, 'design', None, None, 0, 300, 20, None, None, None),
+                            Run(None, None, 0, None, [File(None, 'a.bam.gpg', 'abc', 'def', 'MD5')], None))
+
+
+def test_submit_xml(monkeypatch, fake_ctx, fake_submittable):
+    requests = []
+
+    def xml_submission(ctx, batch, dry_run=True):
+        requests.append(dict(batch.counts))
+        return Receipt.from_xml(RECEIPT % ('true', ''))
+
+    def submitted_object(ctx, obj_type, obj):
+        if (obj_type, obj.alias) == ('sample', 'sample_y'):
+            return {'id': '5a1f0d3e', 'status': 'SUBMITTED', 'egaAccessionId': 'EGAN00001000009'}
+        if (obj_type, obj.alias) == ('sample', 'sample_w'):
+            return {'id': '5a1f0d3f', 'status': 'SUBMITTED'}  # not accessioned yet
+
+    monkeypatch.setattr(submitter_module, 'xml_submission', xml_submission)
+    monkeypatch.setattr(submitter_module, 'submitted_object', submitted_object)
+    monkeypatch.setattr(Submitter, 'set_icgc_ids', lambda self, sample: None)
+
+    submittables = [make_submittable(fake_submittable, name) for name in ('sample_x', 'sample_y', 'sample_z', 'sample_w')]
+    ctx = fake_ctx(dict(SETTINGS, submission_backend='xml', xml_batch_size=2), SUBMISSION={}, CURRENT_DIR_TYPE='unaligned')
+    assert Submitter(ctx).submit_all(submittables, dry_run=False, jobs=2) == 4
+
+    # one request per batch of directories, not per object
+    assert len(requests) == 2
+    assert sorted(r['sample'] for r in requests) == [1, 1]  # sample_y has been submitted already
+    assert sorted(r['run'] for r in requests) == [1, 2]
+
+    x, y, _, w = submittables
+    # accessions are not taken for REST ids
+    assert x.recorded == [('sample', None, 'SUBMITTED'), ('experiment', None, 'SUBMITTED'), ('run', None, 'SUBMITTED')]
+    assert x.run.experiment_id == 'sample_x_experiment'
+    # submitted objects are referred to by accession, and keep their REST id
+    assert y.experiment.sample_id == 'EGAN00001000009'
+    assert y.recorded[0] == ('sample', '5a1f0d3e', 'SUBMITTED')
+    # nothing to refer to a submitted sample by yet
+    assert w.recorded == []